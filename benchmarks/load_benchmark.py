@@ -0,0 +1,284 @@
+# benchmarks/load_benchmark.py
+#
+# End-to-end load benchmark. Starts the mock upstream server and a Notemd
+# server configured against it (or uses servers you started yourself),
+# drives the HTTP endpoints at the given concurrency levels, and reports
+# throughput and p50/p95/p99 latency per endpoint and level.
+#
+#   python benchmarks/load_benchmark.py --concurrency 1,8,32 --requests 100 --output before.json
+#   python benchmarks/load_benchmark.py --concurrency 1,8,32 --requests 100 --compare before.json
+
+import argparse
+import asyncio
+import base64
+import copy
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+import config  # noqa: E402
+from vault_generator import generate_vault, make_document  # noqa: E402
+
+SCENARIOS = ("process_content", "generate_title", "research_summarize", "rename", "delete", "batch_fix")
+VAULT_SCENARIOS = ("rename", "delete", "batch_fix")
+
+# Path on the mock server that each provider's baseUrl points to.
+PROVIDER_BASE_PATHS = {
+    "DeepSeek": "/v1", "OpenAI": "/v1", "Mistral": "/v1", "LMStudio": "/v1", "OpenRouter": "/v1",
+    "Azure OpenAI": "/azure", "Anthropic": "/anthropic", "Google": "/google", "Ollama": "/ollama",
+}
+
+# --- Requests ---
+def make_request_factory(scenario: str, args: argparse.Namespace, vault_root: str) -> Callable[[int], Tuple[str, str, Dict[str, Any]]]:
+    """Returns k -> (method, path, json body) for the k-th request of a scenario."""
+    content = make_document(args.content_words, seed=1)
+    if scenario == "process_content":
+        return lambda k: ("POST", "/process_content", {"content": content})
+    if scenario == "generate_title":
+        return lambda k: ("POST", "/generate_title", {"title": f"Benchmark Topic {k}"})
+    if scenario == "research_summarize":
+        return lambda k: ("POST", "/research_summarize", {"topic": f"Benchmark Topic {k}"})
+    if scenario == "rename":
+        return lambda k: ("POST", "/handle_file_rename", {"old_path": f"Note {k % args.notes}.md",
+                                                          "new_path": f"Note {k % args.notes} renamed.md"})
+    if scenario == "delete":
+        return lambda k: ("POST", "/handle_file_delete", {"path": f"Note {k % args.notes}.md"})
+    if scenario == "batch_fix":
+        # A forced dry run checks every file and leaves the vault and the manifest untouched.
+        return lambda k: ("POST", "/batch_fix_mermaid", {"folder_path": vault_root, "force": True, "dry_run": True})
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+# --- Servers ---
+def build_server_config(args: argparse.Namespace, mock_url: str, work_dir: str, vault_root: str) -> Dict[str, Any]:
+    providers = copy.deepcopy(config.DEFAULT_PROVIDERS)
+    for provider in providers:
+        provider["baseUrl"] = mock_url + PROVIDER_BASE_PATHS[provider["name"]]
+        provider["apiKey"] = provider.get("apiKey") or "mock"
+    server_config = {
+        "DEFAULT_PROVIDERS": providers,
+        "ACTIVE_PROVIDER": args.provider,
+        "VAULT_ROOT": vault_root,
+        "SEARCH_PROVIDER": args.search,
+        "TAVILY_API_KEY": "mock",
+        "TAVILY_SEARCH_URL": f"{mock_url}/tavily/search",
+        "DDG_SEARCH_URL": f"{mock_url}/ddg/html/",
+        "ENABLE_LLM_CACHE": args.cache,
+        "ENABLE_RESEARCH_CACHE": args.cache,
+        "LLM_CACHE_PATH": os.path.join(work_dir, "llm_cache.sqlite3"),
+        "JOB_QUEUE_PATH": "",
+        "WIKILINK_INDEX_PATH": "",
+        "MERMAID_FIX_MANIFEST_PATH": os.path.join(work_dir, "mermaid_fix_manifest.json"),
+    }
+    server_config.update(json.loads(args.server_config) if args.server_config else {})
+    return server_config
+
+def start_process(command: List[str], log_path: str, env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    log_file = open(log_path, "w", encoding="utf-8")
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+async def wait_until_ready(url: str, process: Optional[subprocess.Popen], timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Server for {url} exited with code {process.returncode}.")
+            try:
+                await client.get(url, timeout=1)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become ready within {timeout} seconds.")
+
+def stop_process(process: Optional[subprocess.Popen]) -> None:
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+# --- Load Generation ---
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+async def run_level(client: httpx.AsyncClient, make_request, concurrency: int, total: int) -> Dict[str, Any]:
+    """Sends `total` requests with `concurrency` requests in flight."""
+    latencies: List[float] = []
+    errors: Counter = Counter()
+    request_numbers = itertools.count()
+
+    async def worker() -> None:
+        while True:
+            k = next(request_numbers)
+            if k >= total:
+                return
+            method, path, body = make_request(k)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                if response.status_code >= 400:
+                    errors[str(response.status_code)] += 1
+                    continue
+            except httpx.HTTPError as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_time = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "concurrency": concurrency, "requests": total, "succeeded": len(latencies), "errors": dict(errors),
+        "wall_seconds": wall_time, "throughput_rps": len(latencies) / wall_time if wall_time else 0.0,
+        "p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95), "p99": percentile(latencies, 0.99),
+        "max": latencies[-1] if latencies else None,
+    }
+
+def _format_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+def _format_change(value: Optional[float], base: Optional[float]) -> str:
+    if not value or not base:
+        return "-"
+    return f"{(value / base - 1) * 100:+.1f}%"
+
+def print_results(results: List[Dict[str, Any]], baseline: Optional[Dict[Tuple[str, int], Dict[str, Any]]] = None) -> None:
+    header = f"{'scenario':<20}{'conc':>6}{'ok/total':>12}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+    if baseline:
+        header += f"{'rps vs base':>14}{'p95 vs base':>14}"
+    print(header)
+    for result in results:
+        line = (f"{result['scenario']:<20}{result['concurrency']:>6}{result['succeeded']:>6}/{result['requests']:<5}"
+                f"{result['throughput_rps']:>10.2f}{_format_seconds(result['p50']):>10}{_format_seconds(result['p95']):>10}"
+                f"{_format_seconds(result['p99']):>10}")
+        base = (baseline or {}).get((result["scenario"], result["concurrency"]))
+        if base:
+            line += f"{_format_change(result['throughput_rps'], base['throughput_rps']):>14}{_format_change(result['p95'], base.get('p95')):>14}"
+        print(line)
+        if result["errors"]:
+            print(f"{'':<26}errors: {result['errors']}")
+
+def load_baseline(path: str) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    return {(result["scenario"], result["concurrency"]): result for result in report["results"]}
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    work_dir = tempfile.mkdtemp(prefix="notemd-bench-")
+    vault_root = args.vault_root or os.path.join(work_dir, "vault")
+    mock_process = server_process = None
+    mock_url = args.mock_url or f"http://127.0.0.1:{args.mock_port}"
+    server_url = args.server_url or f"http://127.0.0.1:{args.server_port}"
+    try:
+        if not args.mock_url:
+            mock_process = start_process([sys.executable, os.path.join(REPO_ROOT, "benchmarks", "mock_upstream.py"), "--port", str(args.mock_port)],
+                                         os.path.join(work_dir, "mock.log"))
+        await wait_until_ready(f"{mock_url}/mock/stats", mock_process)
+        async with httpx.AsyncClient(base_url=mock_url) as mock_client:
+            mock_settings = {"latency": args.latency, "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate}
+            mock_settings.update(json.loads(args.mock_settings) if args.mock_settings else {})
+            (await mock_client.post("/mock/settings", json=mock_settings)).raise_for_status()
+
+        if not args.server_url:
+            server_config = build_server_config(args, mock_url, work_dir, vault_root)
+            env = dict(os.environ, NOTEMD_CONFIG=base64.b64encode(json.dumps(server_config).encode("utf-8")).decode("ascii"))
+            command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.server_port), "--log-level", "warning"]
+            server_process = start_process(command, os.path.join(work_dir, "server.log"), env)
+        await wait_until_ready(f"{server_url}/health", server_process)
+
+        scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+        levels = [int(level) for level in args.concurrency.split(",")]
+        results = []
+        limits = httpx.Limits(max_connections=max(levels) + 10, max_keepalive_connections=max(levels) + 10)
+        async with httpx.AsyncClient(base_url=server_url, timeout=args.timeout, limits=limits) as client:
+            for scenario in scenarios:
+                make_request = make_request_factory(scenario, args, vault_root)
+                for level in levels:
+                    if scenario in VAULT_SCENARIOS:
+                        # Rename and delete rewrite links, so every level starts from the same vault.
+                        generate_vault(vault_root, args.notes, links_per_note=args.links_per_note)
+                    if args.warmup:
+                        await run_level(client, make_request, min(level, args.warmup), args.warmup)
+                    print(f"Running {scenario} at concurrency {level} ({args.requests} requests)...")
+                    result = await run_level(client, make_request, level, args.requests)
+                    results.append({"scenario": scenario, **result})
+
+        async with httpx.AsyncClient(base_url=mock_url) as mock_client:
+            mock_stats = (await mock_client.get("/mock/stats")).json()
+        return {"revision": git_revision(), "timestamp": time.time(), "provider": args.provider, "search": args.search,
+                "mock_settings": mock_settings, "mock_stats": mock_stats, "results": results}
+    finally:
+        stop_process(server_process)
+        stop_process(mock_process)
+        if args.keep_work_dir:
+            print(f"Logs and vault kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="End-to-end load benchmark for the Notemd MCP server.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per scenario and level")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests before each level")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--provider", default="OpenAI", choices=sorted(PROVIDER_BASE_PATHS), help="Wire format the server talks to the mock in")
+    parser.add_argument("--search", default="duckduckgo", choices=("duckduckgo", "tavily"))
+    parser.add_argument("--cache", action="store_true", help="Keep the LLM and research caches enabled")
+    parser.add_argument("--content-words", type=int, default=1500, help="Words in the /process_content note")
+    parser.add_argument("--notes", type=int, default=1000, help="Notes in the generated vault")
+    parser.add_argument("--links-per-note", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock LLM latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock calls answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of mock calls answered with a 429")
+    parser.add_argument("--mock-settings", help="JSON object of further mock_upstream settings")
+    parser.add_argument("--server-config", help="JSON object of config.py overrides for the started server")
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--server-port", type=int, default=8100)
+    parser.add_argument("--mock-url", help="Use a running mock server instead of starting one")
+    parser.add_argument("--server-url", help="Use a running Notemd server instead of starting one")
+    parser.add_argument("--vault-root", help="Vault used by the vault scenarios; must match the server's VAULT_ROOT. It is regenerated!")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Show changes against the results in this JSON file")
+    parser.add_argument("--keep-work-dir", action="store_true", help="Keep server logs and the generated vault")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    unknown = [s for s in args.scenarios.split(",") if s.strip() and s.strip() not in SCENARIOS]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}")
+    if args.server_url and not args.vault_root and any(s in args.scenarios for s in VAULT_SCENARIOS):
+        sys.exit("--vault-root is required for the vault scenarios when --server-url is used.")
+
+    report = asyncio.run(run_benchmark(args))
+    print()
+    print_results(report["results"], load_baseline(args.compare) if args.compare else None)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# benchmarks/microbenchmarks.py
+#
+# Reproducible microbenchmarks for the text-processing hot paths, at several
+# note sizes, and for the vault-wide link operations, at several vault sizes.
+# Inputs come from vault_generator.py with fixed seeds. Results are written
+# as JSON; --compare fails (exit code 1) when a benchmark got slower than
+# --threshold times its baseline median, so CI can flag regressions.
+#
+#   python benchmarks/microbenchmarks.py --output baseline.json
+#   python benchmarks/microbenchmarks.py --compare baseline.json --threshold 1.25
+#   python benchmarks/microbenchmarks.py --vault-sizes 1000,10000,100000 --filter vault.
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+import config  # noqa: E402
+import notemd_core  # noqa: E402
+from vault_generator import generate_vault, make_document, note_name  # noqa: E402
+
+Benchmark = Tuple[str, Callable[[], Any], Optional[int]]  # name, function, fixed number of calls per sample
+
+def configure_core(vault_root: str = "") -> None:
+    settings = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    settings.update({"USE_MULTI_MODEL_SETTINGS": False, "VAULT_ROOT": vault_root, "ENABLE_WIKILINK_INDEX": True,
+                     "WIKILINK_INDEX_PATH": "", "ENABLE_MERMAID_FIX_MANIFEST": False})
+    notemd_core.set_settings(settings)
+
+# --- Benchmarks ---
+def text_benchmarks(word_counts: List[int]) -> List[Benchmark]:
+    benchmarks = []
+    single_rename = {note_name(1): "Note 1 renamed"}
+    batch_renames = {note_name(i): f"{note_name(i)} renamed" for i in range(100)}
+    delete_regex = notemd_core.delete_link_regex(note_name(1))
+    for words in word_counts:
+        document = make_document(words, seed=words)
+        processed = notemd_core.refine_mermaid_blocks(notemd_core.cleanup_latex_delimiters(document))
+        benchmarks += [
+            (f"split_content[{words}]", lambda d=document: notemd_core.split_content(d), None),
+            (f"refine_mermaid_blocks[{words}]", lambda d=document: notemd_core.refine_mermaid_blocks(d), None),
+            (f"cleanup_latex_delimiters[{words}]", lambda d=document: notemd_core.cleanup_latex_delimiters(d), None),
+            (f"find_duplicates[{words}]", lambda d=document: notemd_core.find_duplicates(d), None),
+            (f"markdown_postprocessor[{words}]", lambda d=document: notemd_core.create_add_links_postprocessor().process(d), None),
+            (f"rename_link_rewrite[{words}]", lambda d=processed: notemd_core.rewrite_renamed_links(d, single_rename), None),
+            (f"rename_link_rewrite_batch100[{words}]", lambda d=processed: notemd_core.rewrite_renamed_links(d, batch_renames), None),
+            (f"delete_link_removal[{words}]", lambda d=processed: notemd_core.remove_deleted_links(d, delete_regex), None),
+        ]
+    return benchmarks
+
+def vault_benchmarks(vault_sizes: List[int], work_dir: str) -> List[Benchmark]:
+    """Each vault is generated lazily, right before its first benchmark runs."""
+    benchmarks = []
+    for size in vault_sizes:
+        vault_root = os.path.join(work_dir, f"vault-{size}")
+        state: Dict[str, Any] = {}
+
+        def ensure_vault(vault_root: str = vault_root, size: int = size, state: Dict[str, Any] = state) -> None:
+            if state.get("ready"):
+                configure_core(vault_root)
+                return
+            print(f"Generating a vault of {size} notes...", file=sys.stderr)
+            generate_vault(vault_root, size)
+            configure_core(vault_root)
+            state["ready"] = True
+
+        def index_build(vault_root: str = vault_root, ensure=ensure_vault) -> None:
+            ensure()
+            notemd_core.WikilinkIndex(vault_root, "").refresh()
+
+        def index_refresh(ensure=ensure_vault) -> None:
+            ensure()
+            notemd_core.get_wikilink_index().refresh()
+
+        def rename_round_trip(index: int, ensure=ensure_vault) -> None:
+            ensure()
+            asyncio.run(notemd_core.handle_file_rename(f"{note_name(index)}.md", f"{note_name(index)} renamed.md"))
+            asyncio.run(notemd_core.handle_file_rename(f"{note_name(index)} renamed.md", f"{note_name(index)}.md"))
+
+        def rename_batch_round_trip(count: int, ensure=ensure_vault) -> None:
+            ensure()
+            renames = [(f"{note_name(i)}.md", f"{note_name(i)} renamed.md") for i in range(count)]
+            asyncio.run(notemd_core.handle_file_renames(renames))
+            asyncio.run(notemd_core.handle_file_renames([(new, old) for old, new in renames]))
+
+        def batch_fix_dry_run(vault_root: str = vault_root, ensure=ensure_vault) -> None:
+            ensure()
+            asyncio.run(notemd_core.batch_fix_mermaid_syntax_in_folder(vault_root, force=True, dry_run=True))
+
+        benchmarks += [
+            (f"vault.index_build[{size}]", index_build, 1),
+            (f"vault.index_refresh_unchanged[{size}]", index_refresh, 1),
+            # "Note 0" is the most linked note, "Note {size - 1}" one of the least.
+            (f"vault.rename_popular[{size}]", lambda f=rename_round_trip: f(0), 1),
+            (f"vault.rename_rare[{size}]", lambda f=rename_round_trip, s=size: f(s - 1), 1),
+            (f"vault.rename_batch100[{size}]", lambda f=rename_batch_round_trip, s=size: f(min(100, s)), 1),
+            (f"vault.batch_fix_dry_run[{size}]", batch_fix_dry_run, 1),
+        ]
+    return benchmarks
+
+# --- Measurement ---
+def measure(function: Callable[[], Any], repeat: int, number: Optional[int], min_sample_time: float) -> Dict[str, Any]:
+    """Seconds per call over `repeat` samples. Without a fixed `number`, each
+    sample makes as many calls as fit in about `min_sample_time` seconds."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()  # Warm up caches and lazy setup outside the measurement.
+        timer = timeit.Timer(function)
+        if number is None:
+            number = 1
+            while True:
+                elapsed = timer.timeit(number)
+                if elapsed >= min_sample_time or number >= 1_000_000:
+                    break
+                number = max(number * 2, int(number * min_sample_time / max(elapsed, 1e-9)))
+        samples = [elapsed / number for elapsed in timer.repeat(repeat, number)]
+    return {"median": statistics.median(samples), "min": min(samples), "max": max(samples),
+            "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0, "number": number, "repeat": repeat}
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Names of the benchmarks whose median exceeds `threshold` times the baseline median."""
+    return [name for name, result in results.items()
+            if name in baseline and result["median"] > baseline[name]["median"] * threshold]
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def parse_sizes(value: str) -> List[int]:
+    return [int(size) for size in value.split(",") if size.strip()]
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for Notemd's text processing and vault operations.")
+    parser.add_argument("--sizes", type=parse_sizes, default=[1000, 10000, 100000], help="Note sizes in words")
+    parser.add_argument("--vault-sizes", type=parse_sizes, default=[1000, 10000], help="Vault sizes in notes, e.g. 1000,10000,100000")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=7, help="Samples per text benchmark")
+    parser.add_argument("--vault-repeat", type=int, default=3, help="Samples per vault benchmark")
+    parser.add_argument("--min-sample-time", type=float, default=0.2, help="Seconds each text benchmark sample should take")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown factor against the baseline that fails the run")
+    parser.add_argument("--work-dir", help="Where generated vaults go (default: a temporary directory, removed afterwards)")
+    args = parser.parse_args(argv)
+
+    configure_core()
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="notemd-microbench-")
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        benchmarks = text_benchmarks(args.sizes) + vault_benchmarks(args.vault_sizes, work_dir)
+        for name, function, number in benchmarks:
+            if args.filter not in name:
+                continue
+            repeat = args.repeat if number is None else args.vault_repeat
+            result = measure(function, repeat, number, args.min_sample_time)
+            results[name] = result
+            line = f"{name:<44}{_format_seconds(result['median']):>12}  ±{_format_seconds(result['stdev']):>10}"
+            if baseline and name in baseline:
+                line += f"{(result['median'] / baseline[name]['median'] - 1) * 100:>+10.1f}%"
+            print(line)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        report = {"revision": git_revision(), "timestamp": time.time(), "python": platform.python_version(),
+                  "platform": platform.platform(), "cpu_count": os.cpu_count(), "results": results}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print(f"Slower than {args.threshold}x the baseline: {', '.join(slower)}")
+            sys.exit(1)
+        print(f"No benchmark is slower than {args.threshold}x the baseline.")
+
+if __name__ == "__main__":
+    main()
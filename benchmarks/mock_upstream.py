@@ -0,0 +1,303 @@
+# benchmarks/mock_upstream.py
+#
+# Local stand-in for the LLM providers and search engines notemd_core talks
+# to. It answers in the OpenAI-compatible, Anthropic, Google and Ollama wire
+# formats used by the execute_*_api functions (streamed when the request asks
+# for it, as the stream_*_api functions do), and in the Tavily JSON and
+# DuckDuckGo HTML formats used by the search functions, with configurable
+# latency, error rates and 429s. Streamed answers start after `latency` and
+# then deliver a few words at a time at `seconds_per_token`.
+#
+# Base URLs to configure (see load_benchmark.py, which does this for you):
+#   OpenAI-compatible (DeepSeek, OpenAI, Mistral, LMStudio, OpenRouter): http://HOST:PORT/v1
+#   Azure OpenAI: http://HOST:PORT/azure
+#   Anthropic:    http://HOST:PORT/anthropic
+#   Google:       http://HOST:PORT/google
+#   Ollama:       http://HOST:PORT/ollama
+#   TAVILY_SEARCH_URL: http://HOST:PORT/tavily/search
+#   DDG_SEARCH_URL:    http://HOST:PORT/ddg/html/
+
+import argparse
+import asyncio
+import html
+import json
+import random
+import re
+from collections import Counter
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from urllib.parse import quote
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+
+# --- Behaviour ---
+MOCK_SETTINGS: Dict[str, Any] = {
+    "latency": 0.5,              # Base seconds before an LLM answer
+    "jitter": 0.2,               # Extra uniformly random seconds
+    "seconds_per_token": 0.0,    # Extra seconds per output token, to mimic generation speed
+    "tail_rate": 0.0,            # Fraction of LLM calls that are slow...
+    "tail_multiplier": 10.0,     # ...by this factor
+    "error_rate": 0.0,           # Fraction of calls answered with a 500
+    "rate_limit_rate": 0.0,      # Fraction of calls answered with a 429
+    "retry_after": 1.0,          # Retry-After seconds sent with a 429
+    "search_latency": 0.2,
+    "page_latency": 0.1,
+    "search_results": 5,
+    "page_paragraphs": 40,
+}
+
+STATS: Counter = Counter()
+
+app = FastAPI(title="Notemd Mock Upstream")
+
+_WORD_REGEX = re.compile(r'\b[A-Za-z][A-Za-z-]{4,}\b')
+_PIECE_REGEX = re.compile(r'(?:\S+\s*){1,4}|\s+')
+_FILLER = ("Notes link related concepts so that a vault can be browsed as a graph. "
+           "Each paragraph below is generated text used to give fetched pages a realistic size.")
+
+def _estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+def _add_links(text: str) -> str:
+    """A cheap imitation of the add-links task: wraps a few words in [[...]]."""
+    seen = set()
+
+    def link(match: re.Match) -> str:
+        word = match.group(0)
+        if len(seen) >= 20 or word.lower() in seen:
+            return word
+        seen.add(word.lower())
+        return f"[[{word}]]"
+    return _WORD_REGEX.sub(link, text, count=200)
+
+def _completion_text(system_prompt: str, user_content: str) -> str:
+    if user_content:
+        return _add_links(user_content)
+    # Title generation and research summaries come with an empty user message.
+    return "\n\n".join(f"## Section {i + 1}\n\n{_FILLER}" for i in range(6))
+
+async def _simulate(kind: str, base_delay: float, output_tokens: int = 0) -> Optional[JSONResponse]:
+    """Sleeps like the real service would and returns an error response when a fault is injected."""
+    STATS[f"{kind}_calls"] += 1
+    roll = random.random()
+    if roll < MOCK_SETTINGS["rate_limit_rate"]:
+        STATS[f"{kind}_429"] += 1
+        return JSONResponse({"error": {"message": "Rate limit exceeded (mock)"}}, status_code=429,
+                            headers={"retry-after": str(MOCK_SETTINGS["retry_after"])})
+    if roll < MOCK_SETTINGS["rate_limit_rate"] + MOCK_SETTINGS["error_rate"]:
+        STATS[f"{kind}_500"] += 1
+        await asyncio.sleep(base_delay * random.random())
+        return JSONResponse({"error": {"message": "Internal error (mock)"}}, status_code=500)
+
+    delay = base_delay + random.uniform(0, MOCK_SETTINGS["jitter"]) + output_tokens * MOCK_SETTINGS["seconds_per_token"]
+    if random.random() < MOCK_SETTINGS["tail_rate"]:
+        delay *= MOCK_SETTINGS["tail_multiplier"]
+    await asyncio.sleep(delay)
+    return None
+
+def _chat_messages(payload: Dict[str, Any]) -> tuple:
+    system_prompt, user_content = "", ""
+    for message in payload.get("messages", []):
+        if message.get("role") == "system":
+            system_prompt = message.get("content", "")
+        elif message.get("role") == "user":
+            user_content = message.get("content", "")
+    return system_prompt, user_content
+
+def _split_joined_prompt(prompt: str) -> tuple:
+    """Anthropic and Google calls send f"{prompt}\\n\\n{content}" as one message;
+    an empty content leaves the trailing blank line."""
+    if prompt.endswith("\n\n"):
+        return prompt, ""
+    return "", prompt
+
+def _usage(prompt_text: str, output_text: str) -> Dict[str, int]:
+    prompt_tokens, completion_tokens = _estimate_tokens(prompt_text), _estimate_tokens(output_text)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+async def _stream_pieces(text: str, render: Callable[[str], str]) -> AsyncIterator[str]:
+    """Yields `text` a few words at a time, paced by seconds_per_token."""
+    STATS["llm_streams"] += 1
+    for piece in _PIECE_REGEX.findall(text):
+        if MOCK_SETTINGS["seconds_per_token"]:
+            await asyncio.sleep(_estimate_tokens(piece) * MOCK_SETTINGS["seconds_per_token"])
+        yield render(piece)
+
+# --- LLM Wire Formats ---
+async def _openai_chat(request: Request, model: Optional[str] = None):
+    payload = await request.json()
+    system_prompt, user_content = _chat_messages(payload)
+    text = _completion_text(system_prompt, user_content)
+    stream = bool(payload.get("stream"))
+    error = await _simulate("llm", MOCK_SETTINGS["latency"], 0 if stream else _estimate_tokens(text))
+    if error is not None:
+        return error
+    if stream:
+        model = model or payload.get("model", "mock")
+
+        async def events() -> AsyncIterator[str]:
+            async for piece in _stream_pieces(text, lambda piece: _sse({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model,
+                                                                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})):
+                yield piece
+            yield _sse({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                yield _sse({"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model, "choices": [],
+                            "usage": _usage(system_prompt + user_content, text)})
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(events(), media_type="text/event-stream")
+    return {"id": "chatcmpl-mock", "object": "chat.completion", "model": model or payload.get("model", "mock"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": _usage(system_prompt + user_content, text)}
+
+@app.post("/v1/chat/completions")
+async def openai_chat(request: Request):
+    return await _openai_chat(request)
+
+@app.post("/azure/openai/deployments/{deployment}/chat/completions")
+async def azure_chat(deployment: str, request: Request):
+    return await _openai_chat(request, deployment)
+
+@app.post("/anthropic/v1/messages")
+async def anthropic_messages(request: Request):
+    payload = await request.json()
+    _, prompt = _chat_messages(payload)
+    text = _completion_text(*_split_joined_prompt(prompt))
+    stream = bool(payload.get("stream"))
+    error = await _simulate("llm", MOCK_SETTINGS["latency"], 0 if stream else _estimate_tokens(text))
+    if error is not None:
+        return error
+    usage = _usage(prompt, text)
+    if stream:
+        async def events() -> AsyncIterator[str]:
+            yield _sse({"type": "message_start", "message": {"id": "msg_mock", "type": "message", "role": "assistant", "content": [],
+                        "model": payload.get("model", "mock"), "usage": {"input_tokens": usage["prompt_tokens"], "output_tokens": 1}}}, "message_start")
+            yield _sse({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}, "content_block_start")
+            yield ": ping\n\n"
+            async for piece in _stream_pieces(text, lambda piece: _sse({"type": "content_block_delta", "index": 0,
+                                                                        "delta": {"type": "text_delta", "text": piece}}, "content_block_delta")):
+                yield piece
+            yield _sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+            yield _sse({"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": usage["completion_tokens"]}}, "message_delta")
+            yield _sse({"type": "message_stop"}, "message_stop")
+        return StreamingResponse(events(), media_type="text/event-stream")
+    return {"id": "msg_mock", "type": "message", "role": "assistant", "model": payload.get("model", "mock"),
+            "content": [{"type": "text", "text": text}], "stop_reason": "end_turn",
+            "usage": {"input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"]}}
+
+@app.post("/google/models/{model_action}")
+async def google_generate(model_action: str, request: Request):
+    payload = await request.json()
+    prompt = "".join(part.get("text", "") for content in payload.get("contents", []) for part in content.get("parts", []))
+    text = _completion_text(*_split_joined_prompt(prompt))
+    stream = model_action.endswith(":streamGenerateContent")
+    error = await _simulate("llm", MOCK_SETTINGS["latency"], 0 if stream else _estimate_tokens(text))
+    if error is not None:
+        return error
+    usage = _usage(prompt, text)
+    if stream:
+        async def events() -> AsyncIterator[str]:
+            async for piece in _stream_pieces(text, lambda piece: _sse({"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}],
+                                                                        "usageMetadata": {"promptTokenCount": usage["prompt_tokens"]}})):
+                yield piece
+            yield _sse({"candidates": [{"content": {"role": "model", "parts": [{"text": ""}]}, "finishReason": "STOP"}],
+                        "usageMetadata": {"promptTokenCount": usage["prompt_tokens"], "candidatesTokenCount": usage["completion_tokens"],
+                                          "totalTokenCount": usage["total_tokens"]}})
+        return StreamingResponse(events(), media_type="text/event-stream")
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": usage["prompt_tokens"], "candidatesTokenCount": usage["completion_tokens"],
+                              "totalTokenCount": usage["total_tokens"]}}
+
+@app.post("/ollama/chat")
+async def ollama_chat(request: Request):
+    payload = await request.json()
+    system_prompt, user_content = _chat_messages(payload)
+    text = _completion_text(system_prompt, user_content)
+    stream = payload.get("stream", True)  # Ollama streams unless told otherwise.
+    error = await _simulate("llm", MOCK_SETTINGS["latency"], 0 if stream else _estimate_tokens(text))
+    if error is not None:
+        return error
+    usage = _usage(system_prompt + user_content, text)
+    if stream:
+        model = payload.get("model", "mock")
+
+        async def lines() -> AsyncIterator[str]:
+            async for piece in _stream_pieces(text, lambda piece: json.dumps({"model": model, "message": {"role": "assistant", "content": piece}, "done": False}) + "\n"):
+                yield piece
+            yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+                              "prompt_eval_count": usage["prompt_tokens"], "eval_count": usage["completion_tokens"]}) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    return {"model": payload.get("model", "mock"), "message": {"role": "assistant", "content": text}, "done": True,
+            "prompt_eval_count": usage["prompt_tokens"], "eval_count": usage["completion_tokens"]}
+
+# --- Search and Pages ---
+def _search_results(request: Request, query: str) -> List[Dict[str, str]]:
+    base = str(request.base_url).rstrip("/")
+    return [{"title": f"{query} - result {i + 1}", "url": f"{base}/pages/{i + 1}?q={quote(query)}",
+             "content": f"Snippet {i + 1} about {query}. {_FILLER}"} for i in range(MOCK_SETTINGS["search_results"])]
+
+@app.post("/tavily/search")
+async def tavily_search(request: Request):
+    payload = await request.json()
+    error = await _simulate("search", MOCK_SETTINGS["search_latency"])
+    if error is not None:
+        return error
+    return {"query": payload.get("query", ""), "results": _search_results(request, payload.get("query", ""))}
+
+@app.get("/ddg/html/")
+async def duckduckgo_html(request: Request, q: str = ""):
+    error = await _simulate("search", MOCK_SETTINGS["search_latency"])
+    if error is not None:
+        return error
+    results = "".join(
+        f'<div class="result results_links result--html"><h2 class="result__title">'
+        f'<a class="result__a" href="/l/?uddg={quote(result["url"], safe="")}">{html.escape(result["title"])}</a></h2>'
+        f'<a class="result__snippet">{html.escape(result["content"])}</a></div>'
+        for result in _search_results(request, q))
+    return HTMLResponse(f"<html><body><div id=\"links\">{results}</div></body></html>")
+
+@app.get("/pages/{page_id}")
+async def page(page_id: int, q: str = ""):
+    STATS["page_calls"] += 1
+    await asyncio.sleep(MOCK_SETTINGS["page_latency"])
+    paragraphs = "".join(f"<p>{html.escape(q)} paragraph {i + 1}. {_FILLER}</p>" for i in range(MOCK_SETTINGS["page_paragraphs"]))
+    return HTMLResponse(f"<html><head><title>Page {page_id}</title><style>p {{}}</style><script>var x = 1;</script></head>"
+                        f"<body><h1>{html.escape(q)} ({page_id})</h1>{paragraphs}</body></html>")
+
+# --- Control ---
+@app.get("/mock/stats")
+async def mock_stats():
+    """Calls and injected faults seen so far."""
+    return dict(STATS)
+
+@app.post("/mock/settings")
+async def update_mock_settings(request: Request):
+    """Changes latency and fault injection at runtime."""
+    updates = await request.json()
+    unknown = [key for key in updates if key not in MOCK_SETTINGS]
+    if unknown:
+        return JSONResponse({"detail": f"Unknown settings: {', '.join(unknown)}"}, status_code=400)
+    MOCK_SETTINGS.update(updates)
+    return MOCK_SETTINGS
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Mock LLM provider and search server for Notemd benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    for key, value in MOCK_SETTINGS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    for key in MOCK_SETTINGS:
+        MOCK_SETTINGS[key] = getattr(args, key)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# benchmarks/vault_generator.py
+#
+# Deterministic synthetic notes and vaults for the benchmarks. Notes have
+# paragraphs, headings and lists, wikilinks to other notes (a few notes are
+# linked from many, most from few, as in real vaults), Mermaid diagrams in
+# the shapes LLMs tend to get wrong, and inline and display LaTeX.
+#
+#   python benchmarks/vault_generator.py /tmp/vault-10k --notes 10000
+
+import argparse
+import itertools
+import os
+import random
+import shutil
+from typing import Any, Dict, List, Optional
+
+_WORDS = ("graph", "entropy", "lattice", "vector", "kernel", "spectrum", "tensor", "manifold", "operator", "gradient",
+          "boundary", "symmetry", "momentum", "catalyst", "protein", "enzyme", "circuit", "voltage", "algorithm", "theorem",
+          "the", "of", "and", "a", "to", "in", "is", "that", "for", "as", "with", "by", "on", "are", "this", "which",
+          "model", "system", "energy", "field", "process", "function", "structure", "method", "analysis", "network",
+          "quantum", "thermal", "neural", "signal", "matrix", "integral", "derivative", "stochastic", "bayesian", "fourier")
+
+_MERMAID_BLOCKS = (
+    # Well-formed.
+    "```mermaid\ngraph TD\n    A[Input] --> B[Process]\n    B --> C[Output]\n```",
+    # Quoted labels and a subgraph.
+    "```mermaid\nflowchart LR\n    subgraph \"Stage 1\"\n    A[\"Load (raw)\"] --> B[\"Clean\"]\n    end\n    B --> C{\"Valid?\"}\n    C -- yes --> D[\"Store\"]\n```",
+    # Fence written as ```(mermaid) and no closing fence.
+    "```(mermaid)\ngraph TD\n    X[Start] --> Y[Middle]\n    Y --> Z[End]\n\nThe diagram above shows the flow.",
+    # Sequence diagram.
+    "```mermaid\nsequenceDiagram\n    Client->>Server: request\n    Server-->>Client: response\n```",
+)
+
+_LATEX_SNIPPETS = (
+    "The energy is $ E = mc^2 $ for a body at rest.",
+    "Its density is $\\rho(x) = \\frac{1}{\\sqrt{2\\pi}} e^{-x^2/2}$ everywhere.",
+    "$$\nP(f) = \\int_{-\\infty}^{\\infty} p(t) e^{-i2\\pi ft} dt\n$$",
+    "A price of \\$5 is not math, but $ a_i + b_i $ is.",
+    "$$ \\nabla \\cdot \\mathbf{E} = \\frac{\\rho}{\\varepsilon_0} $$",
+)
+
+def note_name(index: int) -> str:
+    return f"Note {index}"
+
+def make_paragraph(rng: random.Random, word_count: int) -> str:
+    words = [rng.choice(_WORDS) for _ in range(word_count)]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+class LinkTargets:
+    """Picks link targets with Zipf-like popularity: note i is linked with weight 1/(i+1)."""
+    def __init__(self, note_count: int):
+        self.note_count = note_count
+        self._cum_weights = list(itertools.accumulate(1.0 / (i + 1) for i in range(note_count)))
+
+    def pick(self, rng: random.Random, count: int) -> List[str]:
+        return [note_name(i) for i in rng.choices(range(self.note_count), cum_weights=self._cum_weights, k=count)]
+
+def make_note(rng: random.Random, word_count: int, links: List[str], mermaid_ratio: float = 0.2, latex_ratio: float = 0.3) -> str:
+    """One note of about `word_count` words with the given wikilinks spread through it."""
+    sections = []
+    links = list(links)
+    words_left = word_count
+    while words_left > 0:
+        kind = rng.random()
+        if kind < 0.1:
+            sections.append(f"## {make_paragraph(rng, rng.randint(2, 5)).rstrip('.')}")
+            continue
+        if kind < 0.2:
+            items = [f"- {make_paragraph(rng, rng.randint(3, 10))}" for _ in range(rng.randint(2, 5))]
+            if links:
+                items.append(f"- [[{links.pop()}]]")
+            sections.append("\n".join(items))
+            words_left -= 20
+            continue
+        size = min(words_left, rng.randint(30, 120))
+        paragraph = make_paragraph(rng, size)
+        while links and rng.random() < 0.5:
+            link = links.pop()
+            if rng.random() < 0.15:
+                link = f"{link}|{rng.choice(_WORDS)}"
+            paragraph += f" See [[{link}]]."
+        sections.append(paragraph)
+        words_left -= size
+    if links:
+        sections.append("Related: " + ", ".join(f"[[{link}]]" for link in links))
+    if rng.random() < mermaid_ratio:
+        sections.insert(rng.randrange(len(sections) + 1), rng.choice(_MERMAID_BLOCKS))
+    if rng.random() < latex_ratio:
+        for _ in range(rng.randint(1, 3)):
+            sections.insert(rng.randrange(len(sections) + 1), rng.choice(_LATEX_SNIPPETS))
+    return "\n\n".join(sections) + "\n"
+
+def make_document(word_count: int, seed: int = 0, links_per_thousand_words: int = 10, link_targets: int = 1000) -> str:
+    """A single large note, for benchmarks that scale with note size."""
+    rng = random.Random(seed)
+    targets = LinkTargets(link_targets)
+    return make_note(rng, word_count, targets.pick(rng, max(1, word_count * links_per_thousand_words // 1000)),
+                     mermaid_ratio=0, latex_ratio=0) + _sprinkle_blocks(rng, word_count)
+
+def _sprinkle_blocks(rng: random.Random, word_count: int) -> str:
+    # One Mermaid block and a few LaTeX snippets per ~1000 words, so they scale with the note.
+    blocks = []
+    for _ in range(max(1, word_count // 1000)):
+        blocks.append(rng.choice(_MERMAID_BLOCKS))
+        blocks.extend(rng.choice(_LATEX_SNIPPETS) for _ in range(3))
+    return "\n\n" + "\n\n".join(blocks) + "\n"
+
+def generate_vault(vault_root: str, note_count: int, seed: int = 0, links_per_note: int = 8,
+                   min_words: int = 100, max_words: int = 1200, notes_per_folder: int = 500,
+                   mermaid_ratio: float = 0.2, latex_ratio: float = 0.3) -> Dict[str, Any]:
+    """(Re)creates a vault of `note_count` notes named "Note 0" ... and returns its statistics.
+    Note sizes are skewed towards short notes, as in real vaults."""
+    if os.path.isdir(vault_root):
+        shutil.rmtree(vault_root)
+    rng = random.Random(seed)
+    targets = LinkTargets(note_count)
+    total_links = total_bytes = 0
+    for index in range(note_count):
+        folder = os.path.join(vault_root, f"Folder {index // notes_per_folder}")
+        if index % notes_per_folder == 0:
+            os.makedirs(folder, exist_ok=True)
+        word_count = int(min_words + (max_words - min_words) * rng.random() ** 2)
+        link_count = max(0, int(rng.gauss(links_per_note, links_per_note / 3)))
+        links = [link for link in targets.pick(rng, link_count) if link != note_name(index)]
+        content = make_note(rng, word_count, links, mermaid_ratio, latex_ratio)
+        with open(os.path.join(folder, f"{note_name(index)}.md"), "w", encoding="utf-8") as f:
+            f.write(content)
+        total_links += len(links)
+        total_bytes += len(content.encode("utf-8"))
+    return {"notes": note_count, "links": total_links, "bytes": total_bytes}
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic Obsidian vault for benchmarks.")
+    parser.add_argument("vault_root", help="Directory to create; it is replaced if it exists")
+    parser.add_argument("--notes", type=int, default=1000, help="e.g. 1000, 10000 or 100000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--links-per-note", type=int, default=8)
+    parser.add_argument("--mermaid-ratio", type=float, default=0.2, help="Fraction of notes with a Mermaid block")
+    parser.add_argument("--latex-ratio", type=float, default=0.3, help="Fraction of notes with LaTeX")
+    args = parser.parse_args(argv)
+    stats = generate_vault(args.vault_root, args.notes, args.seed, args.links_per_note,
+                           mermaid_ratio=args.mermaid_ratio, latex_ratio=args.latex_ratio)
+    print(f"Generated {stats['notes']} notes with {stats['links']} links ({stats['bytes'] / 1e6:.1f} MB) in {args.vault_root}")
+
+if __name__ == "__main__":
+    main()
@@ -71,6 +71,38 @@ DEFAULT_PROVIDERS = [
 ACTIVE_PROVIDER = "DeepSeek"
 CHUNK_WORD_COUNT = 3000
 MAX_TOKENS = 8192
+CHUNK_OUTPUT_TOKEN_RATIO = 1.2 # Expected add-links output tokens per input token when sizing chunks
+CHUNK_TOKEN_RESERVE = 256 # Tokens kept free for message framing when sizing chunks
+MIN_CHUNK_TOKENS = 256 # Lower bound for the computed chunk budget
+
+# Model capabilities, used to size add-links chunks per model. Keys are
+# "Provider/model", "model" or "Provider"; model names may use * wildcards and
+# the first matching key wins. Values are {"context_window": tokens,
+# "max_output": tokens, "tokenizer": family}. A smaller max_output also lowers
+# MAX_TOKENS for that model. Models without an entry fall back to MAX_TOKENS and
+# CHUNK_WORD_COUNT.
+ENABLE_ADAPTIVE_CHUNK_SIZE = True
+MODEL_CAPABILITIES = {
+    "gpt-4o*": {"context_window": 128000, "max_output": 16384, "tokenizer": "o200k"},
+    "gpt-4.1*": {"context_window": 1047576, "max_output": 32768, "tokenizer": "o200k"},
+    "gpt-4-turbo*": {"context_window": 128000, "max_output": 4096, "tokenizer": "cl100k"},
+    "gpt-3.5-turbo*": {"context_window": 16385, "max_output": 4096, "tokenizer": "cl100k"},
+    "claude-3-5-*": {"context_window": 200000, "max_output": 8192, "tokenizer": "claude"},
+    "claude-3-7-*": {"context_window": 200000, "max_output": 8192, "tokenizer": "claude"},
+    "claude-sonnet-4*": {"context_window": 200000, "max_output": 32000, "tokenizer": "claude"},
+    "claude-opus-4*": {"context_window": 200000, "max_output": 32000, "tokenizer": "claude"},
+    "gemini-2.5-*": {"context_window": 1048576, "max_output": 65536, "tokenizer": "gemini"},
+    "gemini-2.0-*": {"context_window": 1048576, "max_output": 8192, "tokenizer": "gemini"},
+    "gemini-1.5-*": {"context_window": 1048576, "max_output": 8192, "tokenizer": "gemini"},
+    "deepseek-chat": {"context_window": 64000, "max_output": 8192, "tokenizer": "deepseek"},
+    "deepseek-reasoner": {"context_window": 64000, "max_output": 8192, "tokenizer": "deepseek"},
+    "mistral-large*": {"context_window": 131072, "max_output": 16384, "tokenizer": "mistral"},
+    "gryphe/mythomax-l2-13b": {"context_window": 4096, "max_output": 1024, "tokenizer": "llama2"},
+    # Local servers run whatever context they were started with, so they are not
+    # listed; add e.g. "Ollama/llama3*" with the num_ctx your model is served with.
+}
+# Approximate English characters per token of each tokenizer family (estimates assume 4)
+TOKENIZER_CHARS_PER_TOKEN = {"o200k": 4.0, "cl100k": 3.8, "claude": 3.5, "gemini": 4.0, "deepseek": 3.6, "mistral": 3.5, "llama3": 3.8, "llama2": 3.3}
 ENABLE_DUPLICATE_DETECTION = True
 
 # File Paths
@@ -80,20 +112,112 @@ PROCESSED_FILE_FOLDER = "Processed"
 CONCEPT_LOG_FOLDER = "Logs/Notemd"
 CONCEPT_LOG_FILE_NAME = "Generate.log"
 
+# Wikilink index used by rename/delete link updates
+ENABLE_WIKILINK_INDEX = True
+WIKILINK_INDEX_PATH = ".notemd_cache/wikilink_index.json" # Empty keeps the index in memory only
+
+# Batch Mermaid/LaTeX fix manifest (lets repeated runs skip unchanged files)
+ENABLE_MERMAID_FIX_MANIFEST = True
+MERMAID_FIX_MANIFEST_PATH = ".notemd_cache/mermaid_fix_manifest.json"
+BATCH_FIX_WORKERS = 0 # Worker processes for batch fixing; 0 uses one per CPU core
+
 # Search settings
 TAVILY_API_KEY = "" # Your Tavily API key
 SEARCH_PROVIDER = "tavily" # "tavily" or "duckduckgo"
 DDG_MAX_RESULTS = 5
 DDG_FETCH_TIMEOUT = 15
+FETCH_MAX_BYTES = 2 * 1024 * 1024 # Bytes read from a fetched page before the download is stopped; 0 disables the cap
+FETCH_MAX_CHARS = 15000 # Characters of page text kept per fetched page
 MAX_RESEARCH_CONTENT_TOKENS = 3000
 ENABLE_RESEARCH_IN_GENERATE_CONTENT = False
 TAVILY_MAX_RESULTS = 5
 TAVILY_SEARCH_DEPTH = "basic" # "basic" or "advanced"
+TAVILY_SEARCH_URL = "https://api.tavily.com/search"
+DDG_SEARCH_URL = "https://html.duckduckgo.com/html/"
 
 # Stable API Call Settings
 ENABLE_STABLE_API_CALL = False
-API_CALL_INTERVAL = 5
+API_CALL_INTERVAL = 5 # Base delay in seconds; doubles with each retry
 API_CALL_MAX_RETRIES = 3
+API_CALL_MAX_BACKOFF = 60 # Upper bound in seconds for a single backoff delay
+API_CALL_BACKOFF_JITTER = 0.5 # Fraction of each delay that is randomised (0 = none, 1 = full jitter)
+API_CALL_MAX_RETRY_AFTER = 120 # Longest Retry-After / rate-limit reset wait honoured, in seconds
+RETRY_BUDGET_RATIO = 0.2 # Retries allowed per provider as a fraction of recent calls
+RETRY_BUDGET_MIN_RETRIES = 10 # Retries always allowed per provider within the window
+RETRY_BUDGET_WINDOW = 60 # Seconds
+
+# HTTP connection pool settings (shared clients for LLM, search and fetch calls)
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_KEEPALIVE_EXPIRY = 30 # Seconds an idle keep-alive connection is kept open
+HTTP_ENABLE_HTTP2 = False # Requires the 'h2' package (pip install httpx[http2])
+
+# Provider routing: failover, circuit breaking and hedged requests
+TASK_FALLBACK_PROVIDERS = {"addLinks": [], "research": [], "generateTitle": []} # e.g. {"addLinks": ["OpenAI", "Ollama/llama3"]}
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5 # Consecutive failures (5xx, timeouts, connection errors) before a provider is skipped
+CIRCUIT_BREAKER_RESET_TIMEOUT = 30 # Seconds before a skipped provider gets a trial call
+ENABLE_HEDGED_REQUESTS = False
+HEDGE_LATENCY_PERCENTILE = 0.95 # Send a second request once the first is slower than this percentile of recent calls
+HEDGE_MIN_SAMPLES = 20 # Successful calls needed before hedging starts
+HEDGE_MIN_DELAY = 1.0 # Never hedge sooner than this many seconds
+LATENCY_WINDOW = 200 # Recent calls per provider and model used for latency percentiles
+
+# LLM call timeouts
+LLM_CONNECT_TIMEOUT = 10
+LLM_READ_TIMEOUT = 60 # Used until enough latency samples exist for the adaptive timeout
+ENABLE_ADAPTIVE_TIMEOUTS = True
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = 20
+ADAPTIVE_TIMEOUT_MULTIPLIER = 3 # Read timeout is this multiple of the recent p99 latency...
+LLM_MIN_READ_TIMEOUT = 30 # ...but never below this
+LLM_MAX_READ_TIMEOUT = 300 # ...or above this
+
+# Provider rate limits, paced just under the quotas to avoid 429s.
+# Keys are "Provider/model" or "Provider"; values are {"rpm": ..., "tpm": ...}.
+# "rpm" / "tpm" may also be set directly on an entry of DEFAULT_PROVIDERS.
+RATE_LIMITS = {} # e.g. {"OpenAI": {"rpm": 500, "tpm": 200000}, "OpenAI/gpt-4o": {"rpm": 500, "tpm": 30000}}
+RATE_LIMIT_HEADROOM = 0.9 # Fraction of the configured limits actually used
+
+# Parallel chunk processing settings
+ENABLE_PARALLEL_CHUNK_PROCESSING = False
+CHUNK_CONCURRENCY = 4 # Default maximum concurrent chunk calls per provider
+PROVIDER_CONCURRENCY = {} # Per-provider overrides, e.g. {"Ollama": 1, "OpenAI": 8}
+CHUNK_MAX_RETRIES = 1 # Extra attempts for chunks that failed while others succeeded
+
+# LLM response cache settings
+ENABLE_LLM_CACHE = False
+LLM_CACHE_MEMORY_ENTRIES = 512 # Entries kept in the in-memory LRU tier
+LLM_CACHE_PATH = ".notemd_cache/llm_cache.sqlite3" # SQLite file for the disk tier; empty disables it
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024 # Size limit of the disk tier
+LLM_CACHE_TTL = 7 * 24 * 3600 # Seconds before a cached response expires; 0 keeps entries forever
+
+# Research cache settings (search results per query, extracted page text per URL)
+ENABLE_RESEARCH_CACHE = True
+RESEARCH_QUERY_CACHE_ENTRIES = 256
+RESEARCH_QUERY_CACHE_TTL = 3600 # Seconds search results are reused; 0 keeps them until evicted
+RESEARCH_URL_CACHE_ENTRIES = 1024
+RESEARCH_URL_CACHE_TTL = 24 * 3600 # Seconds page text is used without revalidation (ETag / Last-Modified)
+
+# Stream provider responses token by token to the /stream endpoints
+ENABLE_PROVIDER_STREAMING = True
+
+# Concurrent identical generate-title and research requests share one computation
+ENABLE_REQUEST_COALESCING = True
+
+# Batch job queue settings
+JOB_QUEUE_PATH = ".notemd_cache/jobs.sqlite3" # SQLite file holding queued jobs; empty keeps the queue in memory only
+JOB_WORKERS = 4 # Number of job items processed at the same time
+JOB_POLL_INTERVAL = 2 # Seconds between checks for new items when idle
+
+# Cancellation
+DISCONNECT_POLL_INTERVAL = 1 # Seconds between checks whether the client of a running request has disconnected
+
+# Production server (python main.py --production)
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 8000
+SERVER_WORKERS = 0 # Worker processes; 0 uses one per CPU core
+SERVER_GRACEFUL_SHUTDOWN_TIMEOUT = 30 # Seconds in-flight requests get to finish on shutdown or worker restart
+SERVER_KEEPALIVE_TIMEOUT = 5 # Seconds an idle keep-alive connection stays open
+ADMIN_TOKEN = "" # Bearer token for /admin endpoints; empty allows them from direct loopback clients of the development server only
 
 # Multi-model settings (simplified for now, will use active provider)
 ADD_LINKS_PROVIDER = "DeepSeek"
@@ -1,12 +1,24 @@
 # main.py
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 import uvicorn
+import asyncio
 import json
 import base64
+import io
 import os
 import binascii
+import time
+import signal
+import argparse
+import importlib
+import importlib.util
+import ipaddress
+import secrets
 
 import config
 import notemd_core
@@ -28,120 +40,393 @@ def apply_user_config():
     else:
         print("No custom configuration found in environment variables.")
 
+def apply_config_file():
+    """Applies overrides from the JSON file named by NOTEMD_CONFIG_FILE. Unlike the
+    environment variable, the file is read again on every settings reload."""
+    config_path = os.environ.get('NOTEMD_CONFIG_FILE')
+    if not config_path:
+        return
+    with open(config_path, 'r', encoding='utf-8') as f:
+        user_config = json.load(f)
+    for key, value in user_config.items():
+        if hasattr(config, key):
+            print(f"Overriding config from {config_path}: {key} = {value}")
+            setattr(config, key, value)
+
+def load_config(reload_module: bool = False):
+    """Applies config.py and the user overrides on top of it. With `reload_module`,
+    config.py is re-read from disk first."""
+    if reload_module:
+        importlib.reload(config)
+    apply_user_config()
+    apply_config_file()
+
+def build_settings():
+    """The notemd_core settings snapshot for the current config values."""
+    return {
+        "DEFAULT_PROVIDERS": config.DEFAULT_PROVIDERS,
+        "ACTIVE_PROVIDER": config.ACTIVE_PROVIDER,
+        "CHUNK_WORD_COUNT": config.CHUNK_WORD_COUNT,
+        "MAX_TOKENS": config.MAX_TOKENS,
+        "CHUNK_OUTPUT_TOKEN_RATIO": config.CHUNK_OUTPUT_TOKEN_RATIO,
+        "CHUNK_TOKEN_RESERVE": config.CHUNK_TOKEN_RESERVE,
+        "MIN_CHUNK_TOKENS": config.MIN_CHUNK_TOKENS,
+        "ENABLE_ADAPTIVE_CHUNK_SIZE": config.ENABLE_ADAPTIVE_CHUNK_SIZE,
+        "MODEL_CAPABILITIES": config.MODEL_CAPABILITIES,
+        "TOKENIZER_CHARS_PER_TOKEN": config.TOKENIZER_CHARS_PER_TOKEN,
+        "ENABLE_DUPLICATE_DETECTION": config.ENABLE_DUPLICATE_DETECTION,
+        "VAULT_ROOT": config.VAULT_ROOT,
+        "CONCEPT_NOTE_FOLDER": config.CONCEPT_NOTE_FOLDER,
+        "PROCESSED_FILE_FOLDER": config.PROCESSED_FILE_FOLDER,
+        "CONCEPT_LOG_FOLDER": config.CONCEPT_LOG_FOLDER,
+        "CONCEPT_LOG_FILE_NAME": config.CONCEPT_LOG_FILE_NAME,
+        "ENABLE_WIKILINK_INDEX": config.ENABLE_WIKILINK_INDEX,
+        "WIKILINK_INDEX_PATH": config.WIKILINK_INDEX_PATH,
+        "ENABLE_MERMAID_FIX_MANIFEST": config.ENABLE_MERMAID_FIX_MANIFEST,
+        "MERMAID_FIX_MANIFEST_PATH": config.MERMAID_FIX_MANIFEST_PATH,
+        "BATCH_FIX_WORKERS": config.BATCH_FIX_WORKERS,
+        "TAVILY_API_KEY": config.TAVILY_API_KEY,
+        "SEARCH_PROVIDER": config.SEARCH_PROVIDER,
+        "DDG_MAX_RESULTS": config.DDG_MAX_RESULTS,
+        "DDG_FETCH_TIMEOUT": config.DDG_FETCH_TIMEOUT,
+        "FETCH_MAX_BYTES": config.FETCH_MAX_BYTES,
+        "FETCH_MAX_CHARS": config.FETCH_MAX_CHARS,
+        "MAX_RESEARCH_CONTENT_TOKENS": config.MAX_RESEARCH_CONTENT_TOKENS,
+        "ENABLE_RESEARCH_IN_GENERATE_CONTENT": config.ENABLE_RESEARCH_IN_GENERATE_CONTENT,
+        "TAVILY_MAX_RESULTS": config.TAVILY_MAX_RESULTS,
+        "TAVILY_SEARCH_DEPTH": config.TAVILY_SEARCH_DEPTH,
+        "TAVILY_SEARCH_URL": config.TAVILY_SEARCH_URL,
+        "DDG_SEARCH_URL": config.DDG_SEARCH_URL,
+        "ENABLE_STABLE_API_CALL": config.ENABLE_STABLE_API_CALL,
+        "API_CALL_INTERVAL": config.API_CALL_INTERVAL,
+        "API_CALL_MAX_RETRIES": config.API_CALL_MAX_RETRIES,
+        "API_CALL_MAX_BACKOFF": config.API_CALL_MAX_BACKOFF,
+        "API_CALL_BACKOFF_JITTER": config.API_CALL_BACKOFF_JITTER,
+        "API_CALL_MAX_RETRY_AFTER": config.API_CALL_MAX_RETRY_AFTER,
+        "RETRY_BUDGET_RATIO": config.RETRY_BUDGET_RATIO,
+        "RETRY_BUDGET_MIN_RETRIES": config.RETRY_BUDGET_MIN_RETRIES,
+        "RETRY_BUDGET_WINDOW": config.RETRY_BUDGET_WINDOW,
+        "HTTP_MAX_CONNECTIONS": config.HTTP_MAX_CONNECTIONS,
+        "HTTP_MAX_KEEPALIVE_CONNECTIONS": config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        "HTTP_KEEPALIVE_EXPIRY": config.HTTP_KEEPALIVE_EXPIRY,
+        "HTTP_ENABLE_HTTP2": config.HTTP_ENABLE_HTTP2,
+        "TASK_FALLBACK_PROVIDERS": config.TASK_FALLBACK_PROVIDERS,
+        "CIRCUIT_BREAKER_FAILURE_THRESHOLD": config.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        "CIRCUIT_BREAKER_RESET_TIMEOUT": config.CIRCUIT_BREAKER_RESET_TIMEOUT,
+        "ENABLE_HEDGED_REQUESTS": config.ENABLE_HEDGED_REQUESTS,
+        "HEDGE_LATENCY_PERCENTILE": config.HEDGE_LATENCY_PERCENTILE,
+        "HEDGE_MIN_SAMPLES": config.HEDGE_MIN_SAMPLES,
+        "HEDGE_MIN_DELAY": config.HEDGE_MIN_DELAY,
+        "LATENCY_WINDOW": config.LATENCY_WINDOW,
+        "LLM_CONNECT_TIMEOUT": config.LLM_CONNECT_TIMEOUT,
+        "LLM_READ_TIMEOUT": config.LLM_READ_TIMEOUT,
+        "ENABLE_ADAPTIVE_TIMEOUTS": config.ENABLE_ADAPTIVE_TIMEOUTS,
+        "ADAPTIVE_TIMEOUT_MIN_SAMPLES": config.ADAPTIVE_TIMEOUT_MIN_SAMPLES,
+        "ADAPTIVE_TIMEOUT_MULTIPLIER": config.ADAPTIVE_TIMEOUT_MULTIPLIER,
+        "LLM_MIN_READ_TIMEOUT": config.LLM_MIN_READ_TIMEOUT,
+        "LLM_MAX_READ_TIMEOUT": config.LLM_MAX_READ_TIMEOUT,
+        "RATE_LIMITS": config.RATE_LIMITS,
+        "RATE_LIMIT_HEADROOM": config.RATE_LIMIT_HEADROOM,
+        "ENABLE_PARALLEL_CHUNK_PROCESSING": config.ENABLE_PARALLEL_CHUNK_PROCESSING,
+        "CHUNK_CONCURRENCY": config.CHUNK_CONCURRENCY,
+        "PROVIDER_CONCURRENCY": config.PROVIDER_CONCURRENCY,
+        "CHUNK_MAX_RETRIES": config.CHUNK_MAX_RETRIES,
+        "ENABLE_LLM_CACHE": config.ENABLE_LLM_CACHE,
+        "LLM_CACHE_MEMORY_ENTRIES": config.LLM_CACHE_MEMORY_ENTRIES,
+        "LLM_CACHE_PATH": config.LLM_CACHE_PATH,
+        "LLM_CACHE_MAX_BYTES": config.LLM_CACHE_MAX_BYTES,
+        "LLM_CACHE_TTL": config.LLM_CACHE_TTL,
+        "ENABLE_RESEARCH_CACHE": config.ENABLE_RESEARCH_CACHE,
+        "RESEARCH_QUERY_CACHE_ENTRIES": config.RESEARCH_QUERY_CACHE_ENTRIES,
+        "RESEARCH_QUERY_CACHE_TTL": config.RESEARCH_QUERY_CACHE_TTL,
+        "RESEARCH_URL_CACHE_ENTRIES": config.RESEARCH_URL_CACHE_ENTRIES,
+        "RESEARCH_URL_CACHE_TTL": config.RESEARCH_URL_CACHE_TTL,
+        "ENABLE_PROVIDER_STREAMING": config.ENABLE_PROVIDER_STREAMING,
+        "ENABLE_REQUEST_COALESCING": config.ENABLE_REQUEST_COALESCING,
+        "JOB_QUEUE_PATH": config.JOB_QUEUE_PATH,
+        "JOB_WORKERS": config.JOB_WORKERS,
+        "JOB_POLL_INTERVAL": config.JOB_POLL_INTERVAL,
+        "DISCONNECT_POLL_INTERVAL": config.DISCONNECT_POLL_INTERVAL,
+        "USE_MULTI_MODEL_SETTINGS": False,
+        "ADD_LINKS_PROVIDER": config.ADD_LINKS_PROVIDER,
+        "RESEARCH_PROVIDER": config.RESEARCH_PROVIDER,
+        "GENERATE_TITLE_PROVIDER": config.GENERATE_TITLE_PROVIDER,
+        "ADD_LINKS_MODEL": config.ADD_LINKS_MODEL,
+        "RESEARCH_MODEL": config.RESEARCH_MODEL,
+        "GENERATE_TITLE_MODEL": config.GENERATE_TITLE_MODEL,
+        "REMOVE_CODE_FENCES_ON_ADD_LINKS": config.REMOVE_CODE_FENCES_ON_ADD_LINKS,
+        "LANGUAGE": config.LANGUAGE,
+        "AVAILABLE_LANGUAGES": config.AVAILABLE_LANGUAGES,
+        "ENABLE_GLOBAL_CUSTOM_PROMPTS": config.ENABLE_GLOBAL_CUSTOM_PROMPTS,
+        "CUSTOM_PROMPT_ADD_LINKS": config.CUSTOM_PROMPT_ADD_LINKS,
+        "CUSTOM_PROMPT_GENERATE_TITLE": config.CUSTOM_PROMPT_GENERATE_TITLE,
+        "CUSTOM_PROMPT_RESEARCH_SUMMARIZE": config.CUSTOM_PROMPT_RESEARCH_SUMMARIZE,
+    }
+
+def reload_settings():
+    """Re-reads the configuration and swaps it into notemd_core. A broken config raises
+    and leaves the running settings untouched."""
+    load_config(reload_module=True)
+    return notemd_core.reload_settings(build_settings())
+
+def _reload_settings_on_signal():
+    try:
+        reload_settings()
+    except Exception as e:
+        print(f"Error reloading settings, keeping the current ones: {e}")
+
 # Apply config when module is loaded
-apply_user_config()
+load_config()
 
 # Set settings in notemd_core after applying any user config
-notemd_core.set_settings({
-    "DEFAULT_PROVIDERS": config.DEFAULT_PROVIDERS,
-    "ACTIVE_PROVIDER": config.ACTIVE_PROVIDER,
-    "CHUNK_WORD_COUNT": config.CHUNK_WORD_COUNT,
-    "MAX_TOKENS": config.MAX_TOKENS,
-    "ENABLE_DUPLICATE_DETECTION": config.ENABLE_DUPLICATE_DETECTION,
-    "VAULT_ROOT": config.VAULT_ROOT,
-    "CONCEPT_NOTE_FOLDER": config.CONCEPT_NOTE_FOLDER,
-    "PROCESSED_FILE_FOLDER": config.PROCESSED_FILE_FOLDER,
-    "CONCEPT_LOG_FOLDER": config.CONCEPT_LOG_FOLDER,
-    "CONCEPT_LOG_FILE_NAME": config.CONCEPT_LOG_FILE_NAME,
-    "TAVILY_API_KEY": config.TAVILY_API_KEY,
-    "SEARCH_PROVIDER": config.SEARCH_PROVIDER,
-    "DDG_MAX_RESULTS": config.DDG_MAX_RESULTS,
-    "DDG_FETCH_TIMEOUT": config.DDG_FETCH_TIMEOUT,
-    "MAX_RESEARCH_CONTENT_TOKENS": config.MAX_RESEARCH_CONTENT_TOKENS,
-    "ENABLE_RESEARCH_IN_GENERATE_CONTENT": config.ENABLE_RESEARCH_IN_GENERATE_CONTENT,
-    "TAVILY_MAX_RESULTS": config.TAVILY_MAX_RESULTS,
-    "TAVILY_SEARCH_DEPTH": config.TAVILY_SEARCH_DEPTH,
-    "ENABLE_STABLE_API_CALL": config.ENABLE_STABLE_API_CALL,
-    "API_CALL_INTERVAL": config.API_CALL_INTERVAL,
-    "API_CALL_MAX_RETRIES": config.API_CALL_MAX_RETRIES,
-    "USE_MULTI_MODEL_SETTINGS": False,
-    "ADD_LINKS_PROVIDER": config.ADD_LINKS_PROVIDER,
-    "RESEARCH_PROVIDER": config.RESEARCH_PROVIDER,
-    "GENERATE_TITLE_PROVIDER": config.GENERATE_TITLE_PROVIDER,
-    "ADD_LINKS_MODEL": config.ADD_LINKS_MODEL,
-    "RESEARCH_MODEL": config.RESEARCH_MODEL,
-    "GENERATE_TITLE_MODEL": config.GENERATE_TITLE_MODEL,
-    "REMOVE_CODE_FENCES_ON_ADD_LINKS": config.REMOVE_CODE_FENCES_ON_ADD_LINKS,
-    "LANGUAGE": config.LANGUAGE,
-    "AVAILABLE_LANGUAGES": config.AVAILABLE_LANGUAGES,
-    "ENABLE_GLOBAL_CUSTOM_PROMPTS": config.ENABLE_GLOBAL_CUSTOM_PROMPTS,
-    "CUSTOM_PROMPT_ADD_LINKS": config.CUSTOM_PROMPT_ADD_LINKS,
-    "CUSTOM_PROMPT_GENERATE_TITLE": config.CUSTOM_PROMPT_GENERATE_TITLE,
-    "CUSTOM_PROMPT_RESEARCH_SUMMARIZE": config.CUSTOM_PROMPT_RESEARCH_SUMMARIZE,
-})
+notemd_core.set_settings(build_settings())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Starts the job workers and releases shared resources when the server shuts down."""
+    await notemd_core.start_job_workers()
+    if hasattr(signal, "SIGHUP") and _server_workers() <= 1:
+        # With several workers, SIGHUP goes to the uvicorn supervisor, which restarts them instead.
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _reload_settings_on_signal)
+        except (RuntimeError, NotImplementedError) as e:
+            print(f"Settings reload on SIGHUP is unavailable: {e}")
+    yield
+    await notemd_core.stop_job_workers()
+    await notemd_core.close_http_clients()
+    notemd_core.close_llm_cache()
+    notemd_core.shutdown_batch_fix_pool()
 
 app = FastAPI(
     title="Notemd MCP Server",
     description="MCP server for Notemd Obsidian plugin functionalities",
     version="0.5.0",
+    lifespan=lifespan,
 )
 
+@app.middleware("http")
+async def bind_settings_snapshot(request: Request, call_next):
+    """Serves each request from the settings snapshot current when it arrived."""
+    with notemd_core.settings_snapshot():
+        return await call_next(request)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Counts requests and records their latency per route template."""
+    started = time.monotonic()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route_label = getattr(route, "path", "unmatched")
+        notemd_core.HTTP_REQUESTS.labels(request.method, route_label, str(status)).inc()
+        notemd_core.HTTP_REQUEST_SECONDS.labels(request.method, route_label).observe(time.monotonic() - started)
+
 class ProcessContentRequest(BaseModel):
     content: str
     cancelled: bool = False
+    operation_id: Optional[str] = None
+
+class ProcessFileRequest(BaseModel):
+    path: str
+    output_path: Optional[str] = None
+    cancelled: bool = False
+    operation_id: Optional[str] = None
 
 class GenerateTitleRequest(BaseModel):
     title: str
     cancelled: bool = False
+    operation_id: Optional[str] = None
 
 class ResearchSummarizeRequest(BaseModel):
     topic: str
     cancelled: bool = False
+    operation_id: Optional[str] = None
 
 class FileRenameRequest(BaseModel):
     old_path: str
     new_path: str
 
+class FileRenamesRequest(BaseModel):
+    renames: List[FileRenameRequest]
+
 class FileDeleteRequest(BaseModel):
     path: str
 
 class BatchFixMermaidRequest(BaseModel):
     folder_path: str
+    force: bool = False
+    dry_run: bool = False
 
 class CustomPromptRequest(BaseModel):
     prompt: str
     content: str
     cancelled: bool = False
+    operation_id: Optional[str] = None
+
+class JobItem(BaseModel):
+    content: Optional[str] = None
+    path: Optional[str] = None
+    title: Optional[str] = None
+
+class JobSubmitRequest(BaseModel):
+    task: str = "process_content"
+    items: List[JobItem]
+
+OPERATION_ID_HEADER = "X-Operation-ID"
+CLIENT_CLOSED_REQUEST = 499
+
+async def _run_operation(http_request: Request, response: Response, operation_id: Optional[str], cancelled: bool, operation, *args):
+    """Runs a core operation under an operation ID (sent back in the
+    X-Operation-ID header) so it can be stopped through /cancel/{id}, and
+    cancels it when the client disconnects."""
+    operation_id = operation_id or notemd_core.new_operation_id()
+    response.headers[OPERATION_ID_HEADER] = operation_id
+    try:
+        return await notemd_core.run_cancellable(operation, *args, operation_id=operation_id, cancelled=cancelled,
+                                                 is_disconnected=http_request.is_disconnected)
+    except notemd_core.OperationCancelledError as e:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail=str(e))
 
 @app.post("/process_content", summary="Process Content (Add Links)")
-async def process_content_endpoint(request: ProcessContentRequest):
+async def process_content_endpoint(request: ProcessContentRequest, http_request: Request, response: Response):
     """Process content using Notemd core logic to add wiki-links."""
     try:
-        processed_text = await notemd_core.process_content(request.content, request.cancelled)
+        processed_text = await _run_operation(http_request, response, request.operation_id, request.cancelled,
+                                              notemd_core.process_content, request.content)
         return {"processed_content": processed_text}
+    except HTTPException:
+        raise
+    except notemd_core.ChunkProcessingError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except notemd_core.ProviderUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@app.post("/process_file", summary="Process Vault File (Add Links)")
+async def process_file_endpoint(request: ProcessFileRequest, http_request: Request, response: Response):
+    """Add wiki-links to a note in the vault and write the result under PROCESSED_FILE_FOLDER."""
+    try:
+        return await _run_operation(http_request, response, request.operation_id, request.cancelled,
+                                    notemd_core.process_vault_file, request.path, request.output_path)
+    except HTTPException:
+        raise
+    except notemd_core.ChunkProcessingError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except notemd_core.ProviderUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
+@app.post("/process_file/upload", summary="Process Uploaded File (Add Links)")
+async def process_file_upload_endpoint(http_request: Request, response: Response, file: UploadFile = File(...),
+                                       output_path: Optional[str] = Form(None), operation_id: Optional[str] = Form(None)):
+    """Add wiki-links to a note uploaded as multipart/form-data and write the result into the vault."""
+    output_path = output_path or notemd_core.processed_file_path(os.path.basename(file.filename or "upload.md"))
+    # The upload is spooled to disk by the server and read from there line by line.
+    source = io.TextIOWrapper(file.file, encoding="utf-8")
+    try:
+        return await _run_operation(http_request, response, operation_id, False, notemd_core.process_file, source, output_path)
+    except HTTPException:
+        raise
+    except notemd_core.ChunkProcessingError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except notemd_core.ProviderUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+    finally:
+        source.detach()  # The upload closes its own file.
+
 @app.post("/generate_title", summary="Generate Content from Title")
-async def generate_title_endpoint(request: GenerateTitleRequest):
+async def generate_title_endpoint(request: GenerateTitleRequest, http_request: Request, response: Response):
     """Generate content for a given title."""
     try:
-        generated_content = await notemd_core.generate_content_for_title(request.title, request.cancelled)
+        generated_content = await _run_operation(http_request, response, request.operation_id, request.cancelled,
+                                                 notemd_core.generate_content_for_title, request.title)
         return {"generated_content": generated_content}
+    except HTTPException:
+        raise
+    except notemd_core.ProviderUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
+STREAM_MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+def _format_stream_event(event: dict, stream_format: str) -> str:
+    if stream_format == "ndjson":
+        return json.dumps(event) + "\n"
+    return f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+def _stream_response(stream_format: str, operation_id: Optional[str], cancelled: bool, operation, *args) -> StreamingResponse:
+    """Streams the events of a core operation. The operation can be stopped
+    through /cancel/{id} and stops when the client disconnects."""
+    if stream_format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported stream format: {stream_format}. Use 'sse' or 'ndjson'.")
+    operation_id = operation_id or notemd_core.new_operation_id()
+
+    async def body():
+        try:
+            async for event in notemd_core.iter_cancellable(operation, *args, operation_id=operation_id, cancelled=cancelled):
+                yield _format_stream_event(event, stream_format)
+        except notemd_core.OperationCancelledError as e:
+            yield _format_stream_event({"event": "cancelled", "detail": str(e)}, stream_format)
+        except Exception as e:
+            yield _format_stream_event({"event": "error", "detail": str(e)}, stream_format)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no", OPERATION_ID_HEADER: operation_id}
+    return StreamingResponse(body(), media_type=STREAM_MEDIA_TYPES[stream_format], headers=headers)
+
+@app.post("/process_content/stream", summary="Process Content (Add Links), Streamed")
+async def process_content_stream_endpoint(request: ProcessContentRequest, format: str = "sse"):
+    """Stream processed chunks and progress events as Server-Sent Events (or NDJSON with `?format=ndjson`)."""
+    return _stream_response(format, request.operation_id, request.cancelled, notemd_core.process_content_stream, request.content)
+
+@app.post("/generate_title/stream", summary="Generate Content from Title, Streamed")
+async def generate_title_stream_endpoint(request: GenerateTitleRequest, format: str = "sse"):
+    """Stream generation progress and content as Server-Sent Events (or NDJSON with `?format=ndjson`)."""
+    return _stream_response(format, request.operation_id, request.cancelled, notemd_core.generate_content_for_title_stream, request.title)
+
 @app.post("/research_summarize", summary="Research and Summarize Topic")
-async def research_summarize_endpoint(request: ResearchSummarizeRequest):
+async def research_summarize_endpoint(request: ResearchSummarizeRequest, http_request: Request, response: Response):
     """Perform web research and summarize a topic."""
     try:
-        summary = await notemd_core.research_and_summarize(request.topic, request.cancelled)
+        summary = await _run_operation(http_request, response, request.operation_id, request.cancelled,
+                                       notemd_core.research_and_summarize, request.topic)
         return {"summary": summary}
+    except HTTPException:
+        raise
+    except notemd_core.ProviderUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
 @app.post("/execute_custom_prompt", summary="Execute Custom Prompt")
-async def execute_custom_prompt_endpoint(request: CustomPromptRequest):
+async def execute_custom_prompt_endpoint(request: CustomPromptRequest, http_request: Request, response: Response):
     """Execute a user-defined prompt with given content."""
     try:
-        response = await notemd_core.execute_custom_prompt(request.prompt, request.content, request.cancelled)
-        return {"response": response}
+        prompt_response = await _run_operation(http_request, response, request.operation_id, request.cancelled,
+                                               notemd_core.execute_custom_prompt, request.prompt, request.content)
+        return {"response": prompt_response}
+    except HTTPException:
+        raise
+    except notemd_core.ProviderUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -156,6 +441,17 @@ async def handle_file_rename_endpoint(request: FileRenameRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
+@app.post("/handle_file_renames", summary="Handle Batch File Rename")
+async def handle_file_renames_endpoint(request: FileRenamesRequest):
+    """Update backlinks for many renamed files in a single pass over the vault."""
+    try:
+        result = await notemd_core.handle_file_renames([(item.old_path, item.new_path) for item in request.renames])
+        return {"status": "success", **result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
 @app.post("/handle_file_delete", summary="Handle File Delete")
 async def handle_file_delete_endpoint(request: FileDeleteRequest):
     """Remove backlinks when a file is deleted."""
@@ -167,23 +463,181 @@ async def handle_file_delete_endpoint(request: FileDeleteRequest):
 
 @app.post("/batch_fix_mermaid", summary="Batch Fix Mermaid Syntax")
 async def batch_fix_mermaid_endpoint(request: BatchFixMermaidRequest):
-    """Fix Mermaid and LaTeX syntax in all Markdown files in a folder."""
+    """Fix Mermaid and LaTeX syntax in all Markdown files in a folder, or return unified diffs with `dry_run`."""
     try:
-        result = await notemd_core.batch_fix_mermaid_syntax_in_folder(request.folder_path)
+        result = await notemd_core.batch_fix_mermaid_syntax_in_folder(request.folder_path, request.force, request.dry_run)
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
+@app.post("/jobs", summary="Submit Batch Job")
+async def submit_job_endpoint(request: JobSubmitRequest):
+    """Queue a batch of notes (content or vault paths) or titles for background processing."""
+    try:
+        return await notemd_core.submit_job(request.task, [item.model_dump() for item in request.items])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
+
+@app.get("/jobs", summary="List Batch Jobs")
+async def list_jobs_endpoint(offset: int = 0, limit: int = 50):
+    """List batch jobs, newest first, with per-status item counts."""
+    store = notemd_core.get_job_store()
+    return {"jobs": await asyncio.to_thread(store.list_jobs, offset, limit)}
+
+@app.get("/jobs/{job_id}", summary="Get Batch Job")
+async def get_job_endpoint(job_id: str, include_items: bool = True, offset: int = 0, limit: int = 100):
+    """Report the status of a batch job and a page of its per-item results."""
+    store = notemd_core.get_job_store()
+    job = await asyncio.to_thread(store.get_job, job_id, include_items, offset, limit)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@app.post("/jobs/{job_id}/cancel", summary="Cancel Batch Job")
+async def cancel_job_endpoint(job_id: str):
+    """Cancel the queued and running items of a batch job."""
+    job = await notemd_core.cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+@app.post("/cancel/{operation_id}", summary="Cancel Operation")
+async def cancel_operation_endpoint(operation_id: str):
+    """Cancel a running request by its operation ID, or a batch job by its job ID."""
+    if notemd_core.cancel_operation(operation_id):
+        return {"operation_id": operation_id, "status": "cancelling"}
+    job = await notemd_core.cancel_job(operation_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Operation not found: {operation_id}")
+    return job
+
+@app.get("/usage", summary="Provider Usage and Rate Limits")
+async def usage_endpoint():
+    """Report token usage and rate limiter state per provider and model."""
+    return {"limiters": notemd_core.get_rate_limiter_states()}
+
+@app.get("/providers/status", summary="Provider Routing Status")
+async def provider_status_endpoint():
+    """Report circuit breaker states, recent latency percentiles and failover/hedging counters."""
+    return notemd_core.get_provider_status()
+
+@app.get("/cache/stats", summary="Cache Statistics")
+async def cache_stats_endpoint():
+    """Report hit and miss counters of the LLM response cache and the research cache."""
+    cache = notemd_core.get_llm_cache()
+    research_cache = notemd_core.get_research_cache()
+    stats = {"enabled": True, **cache.get_stats()} if cache is not None else {"enabled": False}
+    stats["research"] = {"enabled": True, **research_cache.get_stats()} if research_cache is not None else {"enabled": False}
+    return stats
+
+@app.post("/cache/clear", summary="Clear Caches")
+async def cache_clear_endpoint():
+    """Remove all entries from the LLM response cache and the research cache."""
+    cache = notemd_core.get_llm_cache()
+    if cache is not None:
+        cache.clear()
+    research_cache = notemd_core.get_research_cache()
+    if research_cache is not None:
+        research_cache.clear()
+    return {"status": "success"}
+
+@app.get("/metrics", summary="Prometheus Metrics")
+async def metrics_endpoint():
+    """Expose request, LLM call, chunking, research and vault operation metrics in the Prometheus text format."""
+    body, content_type = notemd_core.render_metrics()
+    return Response(content=body, media_type=content_type)
+
+def require_admin(request: Request) -> None:
+    """Admits a request to an /admin endpoint: with ADMIN_TOKEN set, it must send
+    `Authorization: Bearer <token>`; without one, only direct loopback clients of the
+    development server are allowed."""
+    admin_token = config.ADMIN_TOKEN
+    if admin_token:
+        scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not secrets.compare_digest(credentials.strip().encode(), admin_token.encode()):
+            raise HTTPException(status_code=401, detail="A valid admin token is required.", headers={"WWW-Authenticate": "Bearer"})
+        return
+    # Behind a reverse proxy on the same host every client looks like loopback.
+    if _is_production_server():
+        raise HTTPException(status_code=403, detail="Admin endpoints of the production server require ADMIN_TOKEN to be set.")
+    if any(header in request.headers for header in ("forwarded", "x-forwarded-for", "x-real-ip")):
+        raise HTTPException(status_code=403, detail="Admin endpoints cannot be reached through a proxy unless ADMIN_TOKEN is set.")
+    try:
+        is_loopback = request.client is not None and ipaddress.ip_address(request.client.host).is_loopback
+    except ValueError:
+        is_loopback = False
+    if not is_loopback:
+        raise HTTPException(status_code=403, detail="Admin endpoints are only available from loopback clients unless ADMIN_TOKEN is set.")
+
+@app.post("/admin/reload_settings", summary="Reload Settings")
+async def reload_settings_endpoint(request: Request):
+    """Re-read config.py and the configured overrides without dropping in-flight requests."""
+    require_admin(request)
+    if _server_workers() > 1:
+        if not hasattr(signal, "SIGHUP"):
+            raise HTTPException(status_code=501, detail="Reloading settings across several workers needs SIGHUP, which this platform does not have; restart the server instead.")
+        # Each worker holds its own snapshot; the supervisor replaces them one by one, each draining first.
+        os.kill(os.getppid(), signal.SIGHUP)
+        return {"status": "restarting_workers", "workers": _server_workers()}
+    try:
+        return {"status": "reloaded", **reload_settings()}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid configuration, keeping the current settings: {e}")
+
 @app.get("/health", summary="Health Check")
 async def health_check():
     """Check if the server is running."""
     return {"status": "ok"}
 
+def _server_workers() -> int:
+    """Worker processes of the running production server (1 in development)."""
+    return int(os.environ.get("NOTEMD_SERVER_WORKERS", "1"))
+
+def _is_production_server() -> bool:
+    """Whether this process was started by start_production_server."""
+    return "NOTEMD_SERVER_WORKERS" in os.environ
+
 def start_server():
-    """Starts the uvicorn server."""
+    """Starts the uvicorn server in development mode, reloading on code changes."""
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
 
+def start_production_server(host: Optional[str] = None, port: Optional[int] = None, workers: Optional[int] = None):
+    """Starts uvicorn without the file watcher, with several worker processes,
+    uvloop and httptools when installed, and a graceful drain on shutdown."""
+    workers = workers or config.SERVER_WORKERS or os.cpu_count() or 1
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    if loop == "asyncio" or http == "h11":
+        print("uvloop or httptools is not installed; using the pure Python event loop or HTTP parser. Install 'uvicorn[standard]' for both.")
+    if not config.ADMIN_TOKEN:
+        print("ADMIN_TOKEN is not set; the /admin endpoints are disabled. Reload settings by restarting or with SIGHUP.")
+    # Read by the worker processes, which inherit the environment.
+    os.environ["NOTEMD_SERVER_WORKERS"] = str(workers)
+    print(f"Starting production server with {workers} worker processes ({loop}, {http}).")
+    uvicorn.run(
+        "main:app",
+        host=host or config.SERVER_HOST,
+        port=port or config.SERVER_PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=config.SERVER_GRACEFUL_SHUTDOWN_TIMEOUT,
+        timeout_keep_alive=config.SERVER_KEEPALIVE_TIMEOUT,
+        proxy_headers=True,
+    )
+
 if __name__ == "__main__":
-    start_server()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Notemd MCP server.")
+    parser.add_argument("--production", action="store_true", help="Run with several workers and no file watcher")
+    parser.add_argument("--host", help="Defaults to SERVER_HOST")
+    parser.add_argument("--port", type=int, help="Defaults to SERVER_PORT")
+    parser.add_argument("--workers", type=int, help="Defaults to SERVER_WORKERS")
+    args = parser.parse_args()
+    if args.production:
+        start_production_server(args.host, args.port, args.workers)
+    else:
+        start_server()
\ No newline at end of file
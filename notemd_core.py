@@ -6,28 +6,85 @@ import json
 import time
 import os
 import asyncio
-from typing import List, Dict, Any, Optional
+import random
+import hashlib
+import sqlite3
+import threading
+import difflib
+import fnmatch
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque, OrderedDict
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple, Iterable
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
 from urllib.parse import urlparse, parse_qs, quote
 from selectolax.parser import HTMLParser
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
-# Placeholder for settings, will be imported from config.py
-SETTINGS = {}
+# Latest settings snapshot, will be imported from config.py
+_SETTINGS_SNAPSHOT: Dict[str, Any] = {}
+# Snapshot bound to the running request or job item, see settings_snapshot().
+_BOUND_SETTINGS: ContextVar[Optional[Dict[str, Any]]] = ContextVar("notemd_settings", default=None)
+
+class _SettingsView(Mapping):
+    """Read-only view of the settings snapshot bound to the current context, or of the latest one."""
+    def _snapshot(self) -> Dict[str, Any]:
+        bound = _BOUND_SETTINGS.get()
+        return _SETTINGS_SNAPSHOT if bound is None else bound
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._snapshot().get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._snapshot()[key]
+
+    def __iter__(self):
+        return iter(self._snapshot())
+
+    def __len__(self) -> int:
+        return len(self._snapshot())
+
+SETTINGS = _SettingsView()
 
 def set_settings(settings_dict):
-    global SETTINGS
-    SETTINGS = settings_dict
+    # Rebinding the whole dict is atomic: readers see the old or the new snapshot, never a mix.
+    global _SETTINGS_SNAPSHOT
+    _SETTINGS_SNAPSHOT = settings_dict
+
+def current_settings() -> Dict[str, Any]:
+    """The snapshot SETTINGS currently reads from."""
+    return SETTINGS._snapshot()
+
+@contextmanager
+def settings_snapshot():
+    """Binds the latest settings snapshot for the rest of the current request and the tasks it starts."""
+    token = _BOUND_SETTINGS.set(_SETTINGS_SNAPSHOT)
+    try:
+        yield
+    finally:
+        _BOUND_SETTINGS.reset(token)
 
 # --- Utility Functions (from utils.ts) ---
-def cancellable_delay(ms: int, cancelled: bool) -> None:
+async def cancellable_delay(ms: int, cancelled: bool) -> None:
     if cancelled:
         raise Exception("Processing cancelled")
-    time.sleep(ms / 1000.0)
+    await asyncio.sleep(ms / 1000.0)
     if cancelled:
         raise Exception("Processing cancelled")
 
+# CJK scripts (kana, CJK ideographs, Hangul, full-width forms) run at roughly
+# one token per character, against about four characters per token elsewhere.
+_CJK_CHAR_REGEX = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
 def estimate_tokens(text: str) -> int:
     if not text: return 0
-    return len(text) // 4
+    cjk_chars = len(_CJK_CHAR_REGEX.findall(text))
+    return (len(text) - cjk_chars + 3) // 4 + cjk_chars
 
 def get_provider_for_task(task_type: str) -> Optional[Dict[str, Any]]:
     provider_name = SETTINGS.get("ACTIVE_PROVIDER", "DeepSeek")
@@ -55,129 +112,394 @@ def get_model_for_task(task_type: str, provider_config: Dict[str, Any]) -> str:
             model_name = SETTINGS.get("GENERATE_TITLE_MODEL") or model_name
     return model_name or ""
 
+# --- Metrics ---
+# Prometheus metrics, served by the /metrics endpoint. Labels are kept to
+# route templates, provider/model names and fixed operation names so the
+# number of series stays bounded.
+METRICS_REGISTRY = CollectorRegistry()
+_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+HTTP_REQUESTS = Counter("notemd_http_requests_total", "HTTP requests by route and status.",
+                        ["method", "route", "status"], registry=METRICS_REGISTRY)
+HTTP_REQUEST_SECONDS = Histogram("notemd_http_request_duration_seconds", "HTTP request latency by route (until the response starts).",
+                                 ["method", "route"], buckets=_LATENCY_BUCKETS, registry=METRICS_REGISTRY)
+LLM_REQUEST_SECONDS = Histogram("notemd_llm_request_duration_seconds", "call_llm_api latency, including routing, retries and cache lookups.",
+                                ["task", "provider", "model", "cache"], buckets=_LATENCY_BUCKETS, registry=METRICS_REGISTRY)
+LLM_CALL_SECONDS = Histogram("notemd_llm_call_duration_seconds", "Latency of single provider calls.",
+                             ["provider", "model", "outcome"], buckets=_LATENCY_BUCKETS, registry=METRICS_REGISTRY)
+LLM_CALL_ERRORS = Counter("notemd_llm_call_errors_total", "Failed provider calls by error type.",
+                          ["provider", "model", "error"], registry=METRICS_REGISTRY)
+LLM_RETRIES = Counter("notemd_llm_retries_total", "Retries made by call_api_with_retry.",
+                      ["provider", "model"], registry=METRICS_REGISTRY)
+CHUNKS_PER_DOCUMENT = Histogram("notemd_split_chunks", "Chunks produced per split_content call.",
+                                buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100), registry=METRICS_REGISTRY)
+CHUNK_TOKENS = Histogram("notemd_split_chunk_tokens", "Estimated tokens per chunk from split_content.",
+                         buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536), registry=METRICS_REGISTRY)
+RESEARCH_SEARCH_SECONDS = Histogram("notemd_research_search_duration_seconds", "Search latency in _perform_research.",
+                                    ["provider"], buckets=_LATENCY_BUCKETS, registry=METRICS_REGISTRY)
+RESEARCH_FETCH_SECONDS = Histogram("notemd_research_fetch_duration_seconds", "Time to fetch all result pages in _perform_research.",
+                                   buckets=_LATENCY_BUCKETS, registry=METRICS_REGISTRY)
+PAGE_FETCH_SECONDS = Histogram("notemd_page_fetch_duration_seconds", "Latency of single page fetches by outcome.",
+                               ["outcome"], buckets=_LATENCY_BUCKETS, registry=METRICS_REGISTRY)
+VAULT_FILES_SCANNED = Counter("notemd_vault_files_scanned_total", "Files read by vault operations.",
+                              ["operation"], registry=METRICS_REGISTRY)
+VAULT_FILES_WRITTEN = Counter("notemd_vault_files_written_total", "Files rewritten by vault operations.",
+                              ["operation"], registry=METRICS_REGISTRY)
+LLM_TIME_TO_FIRST_TOKEN = Histogram("notemd_llm_time_to_first_token_seconds", "Time from sending a streamed provider call to its first text delta.",
+                                    ["provider", "model"], buckets=_LATENCY_BUCKETS, registry=METRICS_REGISTRY)
+COALESCED_REQUESTS = Counter("notemd_coalesced_requests_total", "Requests served by an identical computation already in flight.",
+                             ["task"], registry=METRICS_REGISTRY)
+
+def render_metrics() -> Tuple[bytes, str]:
+    """The current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(METRICS_REGISTRY), CONTENT_TYPE_LATEST
+
 # --- Content Splitting (from utils.ts) ---
-def split_content(content: str) -> List[str]:
-    max_words = SETTINGS.get("CHUNK_WORD_COUNT", 3000)
-    paragraphs = re.split(r'(\n\s*\n)', content)
-    chunks = []
-    current_chunk_parts = []
-    current_word_count = 0
-
-    def count_words(text: str) -> int:
-        return len(re.findall(r'\b\w+\b', text.strip()))
-
-    for part in paragraphs:
-        part_word_count = count_words(part)
-
-        if current_word_count + part_word_count > max_words and current_chunk_parts:
-            chunks.append(''.join(current_chunk_parts).strip())
-            current_chunk_parts = [part]
-            current_word_count = part_word_count
-        else:
-            current_chunk_parts.append(part)
-            current_word_count += part_word_count
+_PARAGRAPH_BREAK_REGEX = re.compile(r'\n\s*\n')
+_FENCE_LINE_REGEX = re.compile(r'^[ \t]*```', re.MULTILINE)
+_WORD_REGEX = re.compile(r'\b\w+\b')
 
-    if current_chunk_parts:
-        last_chunk = ''.join(current_chunk_parts).strip()
+def get_model_capabilities(provider_config: Optional[Dict[str, Any]], model_name: str) -> Optional[Dict[str, Any]]:
+    """The MODEL_CAPABILITIES entry for "Provider/model", the model or the provider, if any."""
+    if provider_config is None or not SETTINGS.get("ENABLE_ADAPTIVE_CHUNK_SIZE", True):
+        return None
+    table = SETTINGS.get("MODEL_CAPABILITIES", {}) or {}
+    provider_name = provider_config["name"]
+    for candidate in (f"{provider_name}/{model_name}".lower(), model_name.lower()):
+        for pattern, capabilities in table.items():
+            if fnmatch.fnmatchcase(candidate, pattern.lower()):
+                return capabilities
+    return table.get(provider_name)
+
+def get_max_output_tokens(provider_config: Optional[Dict[str, Any]], model_name: str) -> int:
+    """MAX_TOKENS, lowered to the model's max output when that is smaller."""
+    max_tokens = SETTINGS.get("MAX_TOKENS", 8192)
+    capabilities = get_model_capabilities(provider_config, model_name)
+    if capabilities and capabilities.get("max_output"):
+        return min(max_tokens, int(capabilities["max_output"]))
+    return max_tokens
+
+def _tokens_per_estimated_token(capabilities: Dict[str, Any]) -> float:
+    # estimate_tokens() assumes four characters per token.
+    chars_per_token = (SETTINGS.get("TOKENIZER_CHARS_PER_TOKEN", {}) or {}).get(capabilities.get("tokenizer"), 4.0)
+    return 4.0 / chars_per_token
+
+def get_chunk_token_budget(prompt: str, provider_config: Optional[Dict[str, Any]] = None, model_name: str = "") -> int:
+    """Largest add-links chunk, in estimated tokens, for the given prompt, provider and model."""
+    output_ratio = SETTINGS.get("CHUNK_OUTPUT_TOKEN_RATIO", 1.2)
+    reserve = SETTINGS.get("CHUNK_TOKEN_RESERVE", 256)
+    capabilities = get_model_capabilities(provider_config, model_name)
+    if not capabilities or not capabilities.get("context_window"):
+        available = SETTINGS.get("MAX_TOKENS", 8192) - estimate_tokens(prompt) - reserve
+        return max(SETTINGS.get("MIN_CHUNK_TOKENS", 256), int(available / (1 + output_ratio)))
+
+    scale = _tokens_per_estimated_token(capabilities)
+    max_output = get_max_output_tokens(provider_config, model_name)
+    available = capabilities["context_window"] - estimate_tokens(prompt) * scale - reserve - max_output
+    model_tokens = min(available, max_output / output_ratio)
+    return max(SETTINGS.get("MIN_CHUNK_TOKENS", 256), int(model_tokens / scale))
+
+def get_chunk_word_limit(provider_config: Optional[Dict[str, Any]] = None, model_name: str = "") -> Optional[int]:
+    """CHUNK_WORD_COUNT, which only applies to models sized by MAX_TOKENS."""
+    if get_model_capabilities(provider_config, model_name):
+        return None
+    return SETTINGS.get("CHUNK_WORD_COUNT", 3000)
+
+def _iter_paragraph_units(content: str):
+    """Yields paragraphs with their trailing blank lines, keeping fenced blocks whole."""
+    unit_start = 0
+    position = 0
+    in_fence = False
+    for match in _PARAGRAPH_BREAK_REGEX.finditer(content):
+        if len(_FENCE_LINE_REGEX.findall(content, position, match.start())) % 2:
+            in_fence = not in_fence
+        position = match.end()
+        if not in_fence:
+            yield content[unit_start:position]
+            unit_start = position
+    if unit_start < len(content):
+        yield content[unit_start:]
+
+def _iter_line_paragraph_units(lines: Iterable[str]):
+    """Line-by-line _iter_paragraph_units, for notes read from a file."""
+    unit: List[str] = []
+    in_fence = False
+    at_break = False
+    for line in lines:
+        blank = not line.strip()
+        if at_break and not (blank and line.endswith("\n")):
+            yield ''.join(unit)
+            unit, at_break = [], False
+        if _FENCE_LINE_REGEX.match(line):
+            in_fence = not in_fence
+        elif blank and unit and not in_fence and line.endswith("\n") and unit[-1].endswith("\n"):
+            at_break = True
+        unit.append(line)
+    if unit:
+        yield ''.join(unit)
+
+def _is_fenced(unit: str) -> bool:
+    return _FENCE_LINE_REGEX.search(unit) is not None
+
+def _split_oversized_unit(unit: str, token_budget: int):
+    """Splits an oversized paragraph at line boundaries, then at whitespace."""
+    pieces: List[str] = []
+    piece_tokens = 0
+    for line in unit.splitlines(keepends=True):
+        line_tokens = estimate_tokens(line)
+        if line_tokens > token_budget:
+            if pieces:
+                yield ''.join(pieces)
+                pieces, piece_tokens = [], 0
+            words = re.split(r'(\s+)', line)
+            for word in words:
+                word_tokens = estimate_tokens(word)
+                if piece_tokens + word_tokens > token_budget and pieces:
+                    yield ''.join(pieces)
+                    pieces, piece_tokens = [], 0
+                pieces.append(word)
+                piece_tokens += word_tokens
+            continue
+        if piece_tokens + line_tokens > token_budget and pieces:
+            yield ''.join(pieces)
+            pieces, piece_tokens = [], 0
+        pieces.append(line)
+        piece_tokens += line_tokens
+    if pieces:
+        yield ''.join(pieces)
+
+def iter_content_chunks(content: str, token_budget: int, max_words: Optional[int] = None):
+    """Lazily packs paragraphs into chunks within `token_budget` (and `max_words`, when given)."""
+    return _pack_paragraph_units(_iter_paragraph_units(content), token_budget, max_words)
+
+def iter_file_chunks(lines: Iterable[str], token_budget: int, max_words: Optional[int] = None):
+    """iter_content_chunks for an open text file or any iterable of lines."""
+    return _pack_paragraph_units(_iter_line_paragraph_units(lines), token_budget, max_words)
+
+def _pack_paragraph_units(paragraph_units: Iterable[str], token_budget: int, max_words: Optional[int]):
+    current_parts: List[str] = []
+    current_tokens = 0
+    current_words = 0
+
+    def measure(text: str) -> Tuple[int, int]:
+        return estimate_tokens(text), len(_WORD_REGEX.findall(text)) if max_words else 0
+
+    def fits(tokens: int, words: int) -> bool:
+        return current_tokens + tokens <= token_budget and (not max_words or current_words + words <= max_words)
+
+    for unit in paragraph_units:
+        unit_tokens, unit_words = measure(unit)
+        if unit_tokens > token_budget and not _is_fenced(unit):
+            units = [(piece, *measure(piece)) for piece in _split_oversized_unit(unit, token_budget)]
+        else:
+            if unit_tokens > token_budget:
+                print(f"Warning: a fenced block of ~{unit_tokens} tokens exceeds the chunk budget of {token_budget} tokens and is sent whole.")
+            units = [(unit, unit_tokens, unit_words)]
+
+        for piece, piece_tokens, piece_words in units:
+            if current_parts and not fits(piece_tokens, piece_words):
+                chunk = ''.join(current_parts).strip()
+                if chunk:
+                    yield chunk
+                current_parts, current_tokens, current_words = [], 0, 0
+            current_parts.append(piece)
+            current_tokens += piece_tokens
+            current_words += piece_words
+
+    if current_parts:
+        last_chunk = ''.join(current_parts).strip()
         if last_chunk:
-            chunks.append(last_chunk)
+            yield last_chunk
+
+def split_content(content: str, prompt: Optional[str] = None, provider_config: Optional[Dict[str, Any]] = None, model_name: str = "") -> List[str]:
+    """Add-links chunks of `content`, sized for the given provider and model."""
+    if prompt is None:
+        prompt = get_llm_processing_prompt()
+    chunks = list(iter_content_chunks(content, get_chunk_token_budget(prompt, provider_config, model_name), get_chunk_word_limit(provider_config, model_name)))
+    CHUNKS_PER_DOCUMENT.observe(len(chunks))
+    for chunk in chunks:
+        CHUNK_TOKENS.observe(estimate_tokens(chunk))
     return chunks
 
 # --- LLM Processing Prompt (from llmUtils.ts) ---
 def get_llm_processing_prompt() -> str:
     return SETTINGS.get("CUSTOM_PROMPT_ADD_LINKS", "")
 
+def fill_prompt_template(template: str, **values: str) -> str:
+    """Replaces {NAME} placeholders, leaving other braces (LaTeX) alone."""
+    for name, value in values.items():
+        template = template.replace("{" + name + "}", value)
+    return template
+
+# --- Shared HTTP Clients ---
+# One pooled AsyncClient per origin, reused across calls so that keep-alive
+# connections (and their TLS sessions) survive between chunks and requests.
+_HTTP_CLIENTS: Dict[str, httpx.AsyncClient] = {}
+_HTTP_CLIENT_LOOPS: Dict[str, Any] = {}
+# Clients replaced by a settings reload; requests already using them finish first.
+_RETIRED_HTTP_CLIENTS: List[httpx.AsyncClient] = []
+
+# Key for general web page fetches, which may hit any number of hosts.
+WEB_CLIENT_KEY = "__web__"
+
+def _http_client_key(base_url: str) -> str:
+    parsed = urlparse(base_url)
+    if not parsed.scheme or not parsed.netloc:
+        return base_url
+    return f"{parsed.scheme}://{parsed.netloc}".lower()
+
+def _create_http_client(key: str) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=SETTINGS.get("HTTP_MAX_CONNECTIONS", 100),
+        max_keepalive_connections=SETTINGS.get("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20),
+        keepalive_expiry=SETTINGS.get("HTTP_KEEPALIVE_EXPIRY", 30),
+    )
+    # The web client fetches arbitrary third-party pages, so it must not carry cookies between sites.
+    cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])) if key == WEB_CLIENT_KEY else None
+    if SETTINGS.get("HTTP_ENABLE_HTTP2", False):
+        try:
+            return httpx.AsyncClient(limits=limits, http2=True, cookies=cookies)
+        except ImportError:
+            print("HTTP/2 requested but the 'h2' package is not installed. Falling back to HTTP/1.1.")
+    return httpx.AsyncClient(limits=limits, cookies=cookies)
+
+def get_http_client(base_url: str) -> httpx.AsyncClient:
+    key = _http_client_key(base_url)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    client = _HTTP_CLIENTS.get(key)
+    # Pooled connections are bound to the event loop that opened them.
+    if client is None or client.is_closed or _HTTP_CLIENT_LOOPS.get(key) is not loop:
+        if client is not None and not client.is_closed:
+            _RETIRED_HTTP_CLIENTS.append(client)
+        client = _create_http_client(key)
+        _HTTP_CLIENTS[key] = client
+        _HTTP_CLIENT_LOOPS[key] = loop
+    return client
+
+def retire_http_clients() -> None:
+    """New requests get fresh clients; the old ones are closed with close_http_clients()."""
+    _RETIRED_HTTP_CLIENTS.extend(_HTTP_CLIENTS.values())
+    _HTTP_CLIENTS.clear()
+    _HTTP_CLIENT_LOOPS.clear()
+
+async def close_http_clients() -> None:
+    clients = list(_HTTP_CLIENTS.values()) + _RETIRED_HTTP_CLIENTS
+    _HTTP_CLIENTS.clear()
+    _HTTP_CLIENT_LOOPS.clear()
+    _RETIRED_HTTP_CLIENTS.clear()
+    for client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            print(f"Error closing HTTP client: {e}")
+
 # --- LLM API Call Implementations ---
+# Each provider's request is built once, by a (url, headers, payload) builder
+# shared by the execute_* functions below and by the streamed calls in
+# "LLM Token Streaming".
+LLMRequest = Tuple[str, Dict[str, str], Dict[str, Any]]
+
+# OpenAI-compatible providers that report usage on streams when asked to.
+_STREAM_USAGE_PROVIDERS = ("OpenAI", "Azure OpenAI", "DeepSeek")
+
+def _chat_messages(prompt: str, content: str) -> List[Dict[str, str]]:
+    return [{"role": "system", "content": prompt}, {"role": "user", "content": content}]
+
+def _openai_compatible_request(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, stream: bool = False,
+                               url: Optional[str] = None, headers: Optional[Dict[str, str]] = None) -> LLMRequest:
+    url = url or f"{provider_config['baseUrl']}/chat/completions"
+    headers = headers or {"Content-Type": "application/json", "Authorization": f"Bearer {provider_config['apiKey']}"}
+    payload = {"model": model_name, "messages": _chat_messages(prompt, content), "temperature": provider_config['temperature'], "max_tokens": get_max_output_tokens(provider_config, model_name)}
+    if stream:
+        payload["stream"] = True
+        if provider_config["name"] in _STREAM_USAGE_PROVIDERS:
+            payload["stream_options"] = {"include_usage": True}
+    return url, headers, payload
+
+def _azure_openai_request(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, stream: bool = False) -> LLMRequest:
+    if not provider_config.get("apiVersion") or not provider_config.get("baseUrl"): raise ValueError('API version and Base URL are required for Azure OpenAI')
+    url = f"{provider_config['baseUrl']}/openai/deployments/{model_name}/chat/completions?api-version={provider_config['apiVersion']}"
+    headers = {"Content-Type": "application/json", "api-key": provider_config['apiKey']}
+    url, headers, payload = _openai_compatible_request(provider_config, model_name, prompt, content, stream, url, headers)
+    del payload["model"]  # Azure addresses the model through the deployment in the URL.
+    return url, headers, payload
+
+def _lmstudio_request(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, stream: bool = False) -> LLMRequest:
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {provider_config.get('apiKey', 'EMPTY')}"}
+    return _openai_compatible_request(provider_config, model_name, prompt, content, stream, headers=headers)
+
+def _openrouter_request(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, stream: bool = False) -> LLMRequest:
+    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {provider_config['apiKey']}", 'HTTP-Referer': 'https://github.com/Jacobinwwey/obsidian-NotEMD', 'X-Title': 'Notemd Obsidian Plugin'}
+    return _openai_compatible_request(provider_config, model_name, prompt, content, stream, headers=headers)
+
+def _anthropic_request(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, stream: bool = False) -> LLMRequest:
+    url = f"{provider_config['baseUrl']}/v1/messages"
+    headers = {"Content-Type": "application/json", "x-api-key": provider_config['apiKey'], 'anthropic-version': '2023-06-01'}
+    payload = {"model": model_name, "messages": [{"role": "user", "content": f"{prompt}\n\n{content}"}], "temperature": provider_config['temperature'], "max_tokens": get_max_output_tokens(provider_config, model_name)}
+    if stream:
+        payload["stream"] = True
+    return url, headers, payload
+
+def _google_request(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, stream: bool = False) -> LLMRequest:
+    method = "streamGenerateContent?alt=sse&" if stream else "generateContent?"
+    url = f"{provider_config['baseUrl']}/models/{model_name}:{method}key={provider_config['apiKey']}"
+    headers = {"Content-Type": "application/json"}
+    payload = {"contents": [{"role": "user", "parts": [{"text": f"{prompt}\n\n{content}"}]}], "generationConfig": {"temperature": provider_config['temperature'], "maxOutputTokens": get_max_output_tokens(provider_config, model_name)}}
+    return url, headers, payload
+
+def _ollama_request(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, stream: bool = False) -> LLMRequest:
+    url = f"{provider_config['baseUrl']}/chat"
+    headers = {"Content-Type": "application/json"}
+    payload = {"model": model_name, "messages": _chat_messages(prompt, content), "options": {"temperature": provider_config['temperature'], "num_predict": get_max_output_tokens(provider_config, model_name)}, "stream": stream}
+    return url, headers, payload
+
+async def _post_llm_request(provider_config: Dict[str, Any], model_name: str, request: LLMRequest) -> Dict[str, Any]:
+    url, headers, payload = request
+    client = get_http_client(provider_config['baseUrl'])
+    response = await client.post(url, headers=headers, json=payload, timeout=get_llm_timeout(provider_config, model_name))
+    response.raise_for_status()
+    data = response.json()
+    _record_token_usage(data)
+    return data
+
 async def execute_deepseek_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
-    url = f"{provider_config['baseUrl']}/chat/completions"
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {provider_config['apiKey']}"}
-    payload = {"model": model_name, "messages": [{"role": "system", "content": prompt}, {"role": "user", "content": content}], "temperature": provider_config['temperature'], "max_tokens": SETTINGS.get("MAX_TOKENS", 8192)}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=payload, timeout=60.0)
-        response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"]["content"]
+    data = await _post_llm_request(provider_config, model_name, _openai_compatible_request(provider_config, model_name, prompt, content))
+    return data["choices"][0]["message"]["content"]
 
 async def execute_openai_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
-    url = f"{provider_config['baseUrl']}/chat/completions"
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {provider_config['apiKey']}"}
-    payload = {"model": model_name, "messages": [{"role": "system", "content": prompt}, {"role": "user", "content": content}], "temperature": provider_config['temperature'], "max_tokens": SETTINGS.get("MAX_TOKENS", 8192)}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=payload, timeout=60.0)
-        response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"]["content"]
+    data = await _post_llm_request(provider_config, model_name, _openai_compatible_request(provider_config, model_name, prompt, content))
+    return data["choices"][0]["message"]["content"]
 
 async def execute_anthropic_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
-    url = f"{provider_config['baseUrl']}/v1/messages"
-    headers = {"Content-Type": "application/json", "x-api-key": provider_config['apiKey'], 'anthropic-version': '2023-06-01'}
-    payload = {"model": model_name, "messages": [{"role": "user", "content": f"{prompt}\n\n{content}"}], "temperature": provider_config['temperature'], "max_tokens": SETTINGS.get("MAX_TOKENS", 8192)}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=payload, timeout=60.0)
-        response.raise_for_status()
-        data = response.json()
-        return data["content"][0]["text"]
+    data = await _post_llm_request(provider_config, model_name, _anthropic_request(provider_config, model_name, prompt, content))
+    return data["content"][0]["text"]
 
 async def execute_google_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
-    url = f"{provider_config['baseUrl']}/models/{model_name}:generateContent?key={provider_config['apiKey']}"
-    headers = {"Content-Type": "application/json"}
-    payload = {"contents": [{"role": "user", "parts": [{"text": f"{prompt}\n\n{content}"}]}], "generationConfig": {"temperature": provider_config['temperature'], "maxOutputTokens": SETTINGS.get("MAX_TOKENS", 8192)}}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=payload, timeout=60.0)
-        response.raise_for_status()
-        data = response.json()
-        return data["candidates"][0]["content"]["parts"][0]["text"]
+    data = await _post_llm_request(provider_config, model_name, _google_request(provider_config, model_name, prompt, content))
+    return data["candidates"][0]["content"]["parts"][0]["text"]
 
 async def execute_mistral_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
-    url = f"{provider_config['baseUrl']}/chat/completions"
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {provider_config['apiKey']}"}
-    payload = {"model": model_name, "messages": [{"role": "system", "content": prompt}, {"role": "user", "content": content}], "temperature": provider_config['temperature'], "max_tokens": SETTINGS.get("MAX_TOKENS", 8192)}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=payload, timeout=60.0)
-        response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"]["content"]
+    data = await _post_llm_request(provider_config, model_name, _openai_compatible_request(provider_config, model_name, prompt, content))
+    return data["choices"][0]["message"]["content"]
 
 async def execute_azure_openai_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
-    if not provider_config.get("apiVersion") or not provider_config.get("baseUrl"): raise ValueError('API version and Base URL are required for Azure OpenAI')
-    url = f"{provider_config['baseUrl']}/openai/deployments/{model_name}/chat/completions?api-version={provider_config['apiVersion']}"
-    headers = {"Content-Type": "application/json", "api-key": provider_config['apiKey']}
-    payload = {"messages": [{"role": "system", "content": prompt}, {"role": "user", "content": content}], "temperature": provider_config['temperature'], "max_tokens": SETTINGS.get("MAX_TOKENS", 8192)}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=payload, timeout=60.0)
-        response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"]["content"]
+    data = await _post_llm_request(provider_config, model_name, _azure_openai_request(provider_config, model_name, prompt, content))
+    return data["choices"][0]["message"]["content"]
 
 async def execute_lmstudio_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
-    url = f"{provider_config['baseUrl']}/chat/completions"
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {provider_config.get('apiKey', 'EMPTY')}"}
-    payload = {"model": model_name, "messages": [{"role": "system", "content": prompt}, {"role": "user", "content": content}], "temperature": provider_config['temperature'], "max_tokens": SETTINGS.get("MAX_TOKENS", 8192)}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=payload, timeout=60.0)
-        response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"]["content"]
+    data = await _post_llm_request(provider_config, model_name, _lmstudio_request(provider_config, model_name, prompt, content))
+    return data["choices"][0]["message"]["content"]
 
 async def execute_ollama_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
-    url = f"{provider_config['baseUrl']}/chat"
-    headers = {"Content-Type": "application/json"}
-    payload = {"model": model_name, "messages": [{"role": "system", "content": prompt}, {"role": "user", "content": content}], "options": {"temperature": provider_config['temperature'], "num_predict": SETTINGS.get("MAX_TOKENS", 8192)}, "stream": False}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=payload, timeout=60.0)
-        response.raise_for_status()
-        data = response.json()
-        return data["message"]["content"]
+    data = await _post_llm_request(provider_config, model_name, _ollama_request(provider_config, model_name, prompt, content))
+    return data["message"]["content"]
 
 async def execute_openrouter_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
-    url = f"{provider_config['baseUrl']}/chat/completions"
-    headers = {"Content-Type": "application/json", "Authorization": f"Bearer {provider_config['apiKey']}", 'HTTP-Referer': 'https://github.com/Jacobinwwey/obsidian-NotEMD', 'X-Title': 'Notemd Obsidian Plugin'}
-    payload = {"model": model_name, "messages": [{"role": "system", "content": prompt}, {"role": "user", "content": content}], "temperature": provider_config['temperature'], "max_tokens": SETTINGS.get("MAX_TOKENS", 8192)}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=payload, timeout=60.0)
-        response.raise_for_status()
-        data = response.json()
-        return data["choices"][0]["message"].get("content") or data["choices"][0]["message"].get("reasoning")
+    data = await _post_llm_request(provider_config, model_name, _openrouter_request(provider_config, model_name, prompt, content))
+    return data["choices"][0]["message"].get("content") or data["choices"][0]["message"].get("reasoning")
 
 API_CALL_FUNCTIONS = {
     "DeepSeek": execute_deepseek_api,
@@ -191,22 +513,336 @@ API_CALL_FUNCTIONS = {
     "OpenRouter": execute_openrouter_api,
 }
 
-async def call_api_with_retry(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, cancelled: bool) -> str:
+# --- Rate Limiting and Token Accounting ---
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        return max(0.0, (amount - self.tokens) / self.refill_per_second)
+
+class ProviderRateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one provider and model."""
+    def __init__(self, rpm: Optional[float], tpm: Optional[float], headroom: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_bucket = TokenBucket(max(1.0, rpm * headroom), rpm * headroom / 60) if rpm else None
+        self.token_bucket = TokenBucket(tpm * headroom, tpm * headroom / 60) if tpm else None
+        self._blocked_until = 0.0
+        self._loop = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._tokens_returned: Optional[asyncio.Event] = None
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "estimated_tokens": 0,
+                      "responses_without_usage": 0, "throttled_requests": 0, "throttled_seconds": 0.0}
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """Waits for capacity and returns the number of tokens reserved."""
+        reserved = min(estimated_tokens, self.token_bucket.capacity) if self.token_bucket else 0
+        self.usage["requests"] += 1
+        self.usage["estimated_tokens"] += estimated_tokens
+        if self.request_bucket is None and self.token_bucket is None:
+            return reserved
+        # The lock and event are bound to the event loop that first waits on them.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._lock, self._tokens_returned = loop, asyncio.Lock(), asyncio.Event()
+        throttled = False
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                wait = self._blocked_until - now
+                if self.request_bucket is not None:
+                    self.request_bucket.refill(now)
+                    wait = max(wait, self.request_bucket.seconds_until(1))
+                if self.token_bucket is not None:
+                    self.token_bucket.refill(now)
+                    wait = max(wait, self.token_bucket.seconds_until(reserved))
+                if wait <= 0:
+                    break
+                if not throttled:
+                    throttled = True
+                    self.usage["throttled_requests"] += 1
+                # Wake early if a finished call hands back over-reserved tokens.
+                self._tokens_returned.clear()
+                started = time.monotonic()
+                try:
+                    await asyncio.wait_for(self._tokens_returned.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                self.usage["throttled_seconds"] += time.monotonic() - started
+            if self.request_bucket is not None:
+                self.request_bucket.tokens -= 1
+            if self.token_bucket is not None:
+                self.token_bucket.tokens -= reserved
+        return reserved
+
+    def settle(self, reserved: float, usage: Dict[str, int], failed: bool = False) -> None:
+        """Corrects the reservation with the usage the response reported."""
+        if "prompt_tokens" not in usage:
+            if failed:
+                self._return_tokens(reserved)
+            else:
+                self.usage["responses_without_usage"] += 1
+            return
+        self.usage["prompt_tokens"] += usage["prompt_tokens"]
+        self.usage["completion_tokens"] += usage["completion_tokens"]
+        self._return_tokens(reserved - usage["prompt_tokens"] - usage["completion_tokens"])
+
+    def _return_tokens(self, amount: float) -> None:
+        if self.token_bucket is None:
+            return
+        # Over-use may push the bucket below zero; later calls then wait it off.
+        self.token_bucket.tokens = max(-self.token_bucket.capacity, min(self.token_bucket.capacity, self.token_bucket.tokens + amount))
+        if amount > 0 and self._tokens_returned is not None:
+            self._tokens_returned.set()
+
+    def pause(self, seconds: float) -> None:
+        """Holds back all calls after the provider answered 429 with a wait time."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def get_state(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        state = {"rpm": self.rpm, "tpm": self.tpm, "blocked_for_seconds": max(0.0, self._blocked_until - now), **self.usage}
+        for name, bucket in (("available_requests", self.request_bucket), ("available_tokens", self.token_bucket)):
+            if bucket is not None:
+                bucket.refill(now)
+                state[name] = bucket.tokens
+        return state
+
+_RATE_LIMITERS: Dict[Tuple[str, Optional[str]], ProviderRateLimiter] = {}
+
+def get_rate_limits(provider_config: Dict[str, Any], model_name: str) -> Dict[str, Optional[float]]:
+    """RATE_LIMITS for "Provider/model", then "Provider", then the provider's own rpm/tpm."""
+    configured = SETTINGS.get("RATE_LIMITS", {})
+    provider_name = provider_config["name"]
+    limits = configured.get(f"{provider_name}/{model_name}") or configured.get(provider_name) or provider_config
+    return {"rpm": limits.get("rpm"), "tpm": limits.get("tpm")}
+
+def _rate_limiter_key(provider_config: Dict[str, Any], model_name: str) -> Tuple[str, Optional[str]]:
+    """Provider-wide limits are one quota, so all models of the provider share a limiter."""
+    configured = SETTINGS.get("RATE_LIMITS", {})
+    provider_name = provider_config["name"]
+    if configured.get(f"{provider_name}/{model_name}"):
+        return provider_name, model_name
+    limits = configured.get(provider_name) or provider_config
+    if limits.get("rpm") or limits.get("tpm"):
+        return provider_name, None
+    return provider_name, model_name
+
+def get_rate_limiter(provider_config: Dict[str, Any], model_name: str) -> ProviderRateLimiter:
+    key = _rate_limiter_key(provider_config, model_name)
+    limiter = _RATE_LIMITERS.get(key)
+    if limiter is None:
+        limits = get_rate_limits(provider_config, model_name)
+        limiter = ProviderRateLimiter(limits["rpm"], limits["tpm"], SETTINGS.get("RATE_LIMIT_HEADROOM", 0.9))
+        _RATE_LIMITERS[key] = limiter
+    return limiter
+
+def get_rate_limiter_states() -> List[Dict[str, Any]]:
+    return [{"provider": provider_name, "model": model_name, **limiter.get_state()}
+            for (provider_name, model_name), limiter in _RATE_LIMITERS.items()]
+
+def estimate_call_tokens(prompt: str, content: str) -> int:
+    """Input tokens plus the output expected for them, as counted against TPM."""
+    input_tokens = estimate_tokens(prompt) + estimate_tokens(content)
+    expected_output = min(SETTINGS.get("MAX_TOKENS", 8192), int(estimate_tokens(content) * SETTINGS.get("CHUNK_OUTPUT_TOKEN_RATIO", 1.2)))
+    return input_tokens + expected_output
+
+def extract_token_usage(data: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    """Reads the usage block of an OpenAI-compatible, Anthropic, Google or Ollama response."""
+    usage = data.get("usage")
+    if isinstance(usage, dict):
+        if "prompt_tokens" in usage or "completion_tokens" in usage:
+            return {"prompt_tokens": usage.get("prompt_tokens") or 0, "completion_tokens": usage.get("completion_tokens") or 0}
+        if "input_tokens" in usage or "output_tokens" in usage:
+            return {"prompt_tokens": usage.get("input_tokens") or 0, "completion_tokens": usage.get("output_tokens") or 0}
+    metadata = data.get("usageMetadata")
+    if isinstance(metadata, dict):
+        return {"prompt_tokens": metadata.get("promptTokenCount") or 0,
+                "completion_tokens": (metadata.get("candidatesTokenCount") or 0) + (metadata.get("thoughtsTokenCount") or 0)}
+    if "prompt_eval_count" in data or "eval_count" in data:
+        return {"prompt_tokens": data.get("prompt_eval_count") or 0, "completion_tokens": data.get("eval_count") or 0}
+    return None
+
+# Filled by the execute_* functions with the usage reported for the current call.
+_TOKEN_USAGE: ContextVar[Optional[Dict[str, int]]] = ContextVar("notemd_token_usage", default=None)
+
+def _record_token_usage(data: Any) -> None:
+    sink = _TOKEN_USAGE.get()
+    if sink is not None and isinstance(data, dict):
+        usage = extract_token_usage(data)
+        if usage is not None:
+            sink.update(usage)
+
+async def call_provider_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
+    """One rate-limited provider call with usage, latency and circuit breaker bookkeeping."""
+    api_call_function = API_CALL_FUNCTIONS.get(provider_config["name"])
+    if not api_call_function: raise ValueError(f"Unsupported provider: {provider_config['name']}")
+    breaker = get_circuit_breaker(provider_config["name"])
+    admission = _BREAKER_ADMISSION.get()
+    limiter = get_rate_limiter(provider_config, model_name)
+    try:
+        reserved = await limiter.acquire(estimate_call_tokens(prompt, content))
+    except BaseException:
+        # Cancelled while waiting for capacity: the provider was never called.
+        breaker.record(None, admission)
+        raise
+    usage: Dict[str, int] = {}
+    usage_token = _TOKEN_USAGE.set(usage)
+    outcome: Optional[bool] = None
+    completed = False
+    started = time.monotonic()
+    try:
+        result = await api_call_function(provider_config, model_name, prompt, content)
+        completed = True
+        outcome = True
+        elapsed = time.monotonic() - started
+        get_latency_tracker(provider_config["name"], model_name).record(elapsed)
+        LLM_CALL_SECONDS.labels(provider_config["name"], model_name, "success").observe(elapsed)
+        return result
+    except Exception as e:
+        outcome = False if is_provider_failure(e) else None
+        error_type = f"http_{e.response.status_code}" if isinstance(e, httpx.HTTPStatusError) else type(e).__name__
+        LLM_CALL_SECONDS.labels(provider_config["name"], model_name, "error").observe(time.monotonic() - started)
+        LLM_CALL_ERRORS.labels(provider_config["name"], model_name, error_type).inc()
+        raise
+    finally:
+        _TOKEN_USAGE.reset(usage_token)
+        limiter.settle(reserved, usage, failed=not completed)
+        breaker.record(outcome, admission)
+
+# --- Retry Policy ---
+class RetryBudget:
+    """Caps retries for one provider to a fraction of its recent requests."""
+    def __init__(self, ratio: float, min_retries: int, window_seconds: float):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._requests = deque()
+        self._retries = deque()
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.window_seconds
+        while self._requests and self._requests[0] < cutoff:
+            self._requests.popleft()
+        while self._retries and self._retries[0] < cutoff:
+            self._retries.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        self._prune(now)
+        self._requests.append(now)
+
+    def try_acquire_retry(self) -> bool:
+        now = time.monotonic()
+        self._prune(now)
+        allowed = self.min_retries + int(len(self._requests) * self.ratio)
+        if len(self._retries) >= allowed:
+            return False
+        self._retries.append(now)
+        return True
+
+_RETRY_BUDGETS: Dict[str, RetryBudget] = {}
+
+def get_retry_budget(provider_name: str) -> RetryBudget:
+    budget = _RETRY_BUDGETS.get(provider_name)
+    if budget is None:
+        budget = RetryBudget(
+            SETTINGS.get("RETRY_BUDGET_RATIO", 0.2),
+            SETTINGS.get("RETRY_BUDGET_MIN_RETRIES", 10),
+            SETTINGS.get("RETRY_BUDGET_WINDOW", 60),
+        )
+        _RETRY_BUDGETS[provider_name] = budget
+    return budget
+
+_DURATION_PART_REGEX = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+def _parse_wait_seconds(value: str) -> Optional[float]:
+    """Parses a Retry-After or rate-limit reset header into seconds from now."""
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+        # Large values are absolute epoch timestamps rather than durations.
+        return seconds - time.time() if seconds > 1_000_000_000 else seconds
+    except ValueError:
+        pass
+    parts = _DURATION_PART_REGEX.findall(value)
+    if parts and "".join(number + unit for number, unit in parts) == value:
+        return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+    for parse in (lambda v: datetime.fromisoformat(v.replace("Z", "+00:00")), parsedate_to_datetime):
+        try:
+            moment = parse(value)
+        except (TypeError, ValueError):
+            continue
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return (moment - datetime.now(timezone.utc)).total_seconds()
+    return None
+
+def get_retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Returns how long the provider asked us to wait, if it said so."""
+    retry_after_ms = response.headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        except ValueError:
+            pass
+    retry_after = response.headers.get("retry-after")
+    if retry_after:
+        seconds = _parse_wait_seconds(retry_after)
+        if seconds is not None:
+            return max(0.0, seconds)
+
+    reset_waits = []
+    for header in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens", "x-ratelimit-reset",
+                   "anthropic-ratelimit-requests-reset", "anthropic-ratelimit-tokens-reset"):
+        value = response.headers.get(header)
+        if value:
+            seconds = _parse_wait_seconds(value)
+            if seconds is not None:
+                reset_waits.append(max(0.0, seconds))
+    return max(reset_waits) if reset_waits else None
+
+def compute_backoff_delay(attempt: int) -> float:
+    """Exponential backoff from API_CALL_INTERVAL with a jittered fraction."""
+    base = SETTINGS.get("API_CALL_INTERVAL", 5)
+    cap = SETTINGS.get("API_CALL_MAX_BACKOFF", 60)
+    jitter = min(1.0, max(0.0, SETTINGS.get("API_CALL_BACKOFF_JITTER", 0.5)))
+    delay = min(cap, base * (2 ** (attempt - 1)))
+    return delay * (1 - jitter * random.random())
+
+async def call_api_with_retry(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, cancelled: bool, call=call_provider_api):
     last_error = None
     max_attempts = SETTINGS.get("API_CALL_MAX_RETRIES", 3) + 1
-    interval_seconds = SETTINGS.get("API_CALL_INTERVAL", 5)
+    if provider_config["name"] not in API_CALL_FUNCTIONS: raise ValueError(f"Unsupported provider: {provider_config['name']}")
+    budget = get_retry_budget(provider_config["name"])
+    budget.record_request()
 
+    attempt = 0
     for attempt in range(1, max_attempts + 1):
         if cancelled: raise Exception("Processing cancelled by user before API attempt.")
+        retry_after = None
         try:
-            api_call_function = API_CALL_FUNCTIONS.get(provider_config["name"])
-            if not api_call_function: raise ValueError(f"Unsupported provider: {provider_config['name']}")
-            return await api_call_function(provider_config, model_name, prompt, content)
+            return await call(provider_config, model_name, prompt, content)
         except httpx.HTTPStatusError as e:
             print(f"API Call: Attempt {attempt} failed with HTTP status {e.response.status_code}: {e.response.text}")
             last_error = e
             if e.response.status_code in [400, 401, 403, 404]:
                 raise e
+            if e.response.status_code in [429, 503]:
+                retry_after = get_retry_after_seconds(e.response)
+                if retry_after and e.response.status_code == 429:
+                    get_rate_limiter(provider_config, model_name).pause(min(retry_after, SETTINGS.get("API_CALL_MAX_RETRY_AFTER", 120)))
         except httpx.RequestError as e:
             print(f"API Call: Attempt {attempt} failed with request error: {e}")
             last_error = e
@@ -217,34 +853,669 @@ async def call_api_with_retry(provider_config: Dict[str, Any], model_name: str,
         if cancelled: raise Exception("Processing cancelled by user during API retry sequence.")
 
         if attempt < max_attempts:
-            print(f"Waiting {interval_seconds} seconds before retry {attempt + 1}...")
-            cancellable_delay(interval_seconds * 1000, cancelled)
-
-    raise Exception(f"API call failed after {max_attempts} attempts. Last error: {last_error}")
+            if get_circuit_breaker(provider_config["name"]).state == "open":
+                print(f"Circuit for {provider_config['name']} opened. Not retrying.")
+                break
+            if not budget.try_acquire_retry():
+                print(f"Retry budget for {provider_config['name']} exhausted. Not retrying.")
+                break
+            delay_seconds = compute_backoff_delay(attempt)
+            if retry_after is not None:
+                delay_seconds = max(delay_seconds, min(retry_after, SETTINGS.get("API_CALL_MAX_RETRY_AFTER", 120)))
+            LLM_RETRIES.labels(provider_config["name"], model_name).inc()
+            print(f"Waiting {delay_seconds:.2f} seconds before retry {attempt + 1}...")
+            await cancellable_delay(int(delay_seconds * 1000), cancelled)
+
+    raise Exception(f"API call failed after {attempt} attempts. Last error: {last_error}")
+
+# --- Provider Routing ---
+class ProviderUnavailableError(Exception):
+    """Raised when every provider on a task's route is skipped or has failed."""
+
+class LatencyTracker:
+    """Recent successful call latencies for one provider and model."""
+    def __init__(self, window: int):
+        self._samples = deque(maxlen=max(1, window))
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float, min_samples: int = 1) -> Optional[float]:
+        if len(self._samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def get_state(self) -> Dict[str, Any]:
+        return {"samples": len(self._samples), "p50": self.percentile(0.5), "p95": self.percentile(0.95), "p99": self.percentile(0.99)}
+
+class CircuitBreaker:
+    """Skips a provider after consecutive failures until a trial call succeeds."""
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial: Optional[object] = None
+
+    def allow_request(self) -> Optional[object]:
+        """The admission for a call, or None when the provider must be skipped."""
+        if self.state == "closed":
+            return object()
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and self._trial is None:
+            self._trial = object()
+            return self._trial
+        return None
 
-async def call_llm_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, cancelled: bool = False) -> str:
+    def is_available(self) -> bool:
+        """Like allow_request(), without claiming the half-open trial."""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            return time.monotonic() - self._opened_at >= self.reset_timeout
+        return self._trial is None
+
+    def record(self, success: Optional[bool], admission: Optional[object] = None) -> None:
+        """Records a call outcome; None means it says nothing about provider health."""
+        # Only the admission holding the half-open trial ends it, so calls admitted while closed cannot start a second trial.
+        if admission is not None and admission is self._trial:
+            self._trial = None
+        if success is None:
+            return
+        if success:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                print(f"Circuit opened after {self.consecutive_failures} consecutive failures.")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def get_state(self) -> Dict[str, Any]:
+        state = {"state": self.state, "consecutive_failures": self.consecutive_failures}
+        if self.state == "open":
+            state["retry_in_seconds"] = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        return state
+
+_LATENCY_TRACKERS: Dict[Tuple[str, str], LatencyTracker] = {}
+_CIRCUIT_BREAKERS: Dict[str, CircuitBreaker] = {}
+# Circuit breaker admission of the provider call being made in this context.
+_BREAKER_ADMISSION: ContextVar[Optional[object]] = ContextVar("notemd_breaker_admission", default=None)
+
+def get_latency_tracker(provider_name: str, model_name: str) -> LatencyTracker:
+    key = (provider_name, model_name)
+    tracker = _LATENCY_TRACKERS.get(key)
+    if tracker is None:
+        tracker = LatencyTracker(SETTINGS.get("LATENCY_WINDOW", 200))
+        _LATENCY_TRACKERS[key] = tracker
+    return tracker
+
+def get_circuit_breaker(provider_name: str) -> CircuitBreaker:
+    breaker = _CIRCUIT_BREAKERS.get(provider_name)
+    if breaker is None:
+        breaker = CircuitBreaker(SETTINGS.get("CIRCUIT_BREAKER_FAILURE_THRESHOLD", 5), SETTINGS.get("CIRCUIT_BREAKER_RESET_TIMEOUT", 30))
+        _CIRCUIT_BREAKERS[provider_name] = breaker
+    return breaker
+
+def is_provider_failure(error: BaseException) -> bool:
+    """Whether an error counts against the provider's circuit breaker."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return not isinstance(error, ValueError)
+
+def get_llm_timeout(provider_config: Dict[str, Any], model_name: str) -> httpx.Timeout:
+    """Connect and read timeouts; the read timeout follows the recent p99 latency."""
+    read_timeout = SETTINGS.get("LLM_READ_TIMEOUT", 60)
+    if SETTINGS.get("ENABLE_ADAPTIVE_TIMEOUTS", True):
+        p99 = get_latency_tracker(provider_config["name"], model_name).percentile(0.99, SETTINGS.get("ADAPTIVE_TIMEOUT_MIN_SAMPLES", 20))
+        if p99 is not None:
+            read_timeout = min(SETTINGS.get("LLM_MAX_READ_TIMEOUT", 300),
+                               max(SETTINGS.get("LLM_MIN_READ_TIMEOUT", 30), p99 * SETTINGS.get("ADAPTIVE_TIMEOUT_MULTIPLIER", 3)))
+    return httpx.Timeout(read_timeout, connect=SETTINGS.get("LLM_CONNECT_TIMEOUT", 10))
+
+def get_hedge_delay(provider_config: Dict[str, Any], model_name: str) -> Optional[float]:
+    if not SETTINGS.get("ENABLE_HEDGED_REQUESTS", False):
+        return None
+    threshold = get_latency_tracker(provider_config["name"], model_name).percentile(
+        SETTINGS.get("HEDGE_LATENCY_PERCENTILE", 0.95), SETTINGS.get("HEDGE_MIN_SAMPLES", 20))
+    if threshold is None:
+        return None
+    return max(SETTINGS.get("HEDGE_MIN_DELAY", 1.0), threshold)
+
+def get_route_for_task(task_type: Optional[str], provider_config: Dict[str, Any], model_name: str) -> List[Tuple[Dict[str, Any], str]]:
+    """The task's provider followed by its TASK_FALLBACK_PROVIDERS, without duplicates."""
+    route = [(provider_config, model_name)]
+    providers = {p["name"]: p for p in SETTINGS.get("DEFAULT_PROVIDERS", [])}
+    for entry in SETTINGS.get("TASK_FALLBACK_PROVIDERS", {}).get(task_type, []) if task_type else []:
+        provider_name, _, fallback_model = entry.partition("/")
+        fallback_config = providers.get(provider_name)
+        if fallback_config is None:
+            print(f"Warning: fallback provider '{provider_name}' for {task_type} is not configured.")
+            continue
+        candidate = (fallback_config, fallback_model or fallback_config.get("model") or "")
+        if all(candidate[0]["name"] != c[0]["name"] or candidate[1] != c[1] for c in route):
+            route.append(candidate)
+    return route
+
+async def _call_provider(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, cancelled: bool, call=call_provider_api):
     if SETTINGS.get("ENABLE_STABLE_API_CALL", False):
-        return await call_api_with_retry(provider_config, model_name, prompt, content, cancelled)
-    else:
-        api_call_function = API_CALL_FUNCTIONS.get(provider_config["name"])
-        if not api_call_function: raise ValueError(f"Unsupported provider: {provider_config['name']}")
-        return await api_call_function(provider_config, model_name, prompt, content)
+        return await call_api_with_retry(provider_config, model_name, prompt, content, cancelled, call)
+    return await call(provider_config, model_name, prompt, content)
+
+async def _call_with_hedge(primary: Tuple[Dict[str, Any], str], backups: List[Tuple[Dict[str, Any], str]], prompt: str, content: str, cancelled: bool, call=call_provider_api):
+    """Calls `primary`, hedging to a backup once it is slower than its recent p95 latency."""
+    first = asyncio.ensure_future(_call_provider(*primary, prompt, content, cancelled, call))
+    hedge_delay = get_hedge_delay(*primary)
+    if hedge_delay is None:
+        return await first
+
+    tasks = [first]
+    winner = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if done:
+            winner = first
+            return first.result()
+        hedge_target = next((b for b in backups if get_circuit_breaker(b[0]["name"]).is_available()), primary)
+        admission = get_circuit_breaker(hedge_target[0]["name"]).allow_request()
+        if admission is not None:
+            print(f"{primary[0]['name']} slower than {hedge_delay:.2f}s; sending hedged request to {hedge_target[0]['name']}.")
+            get_routing_stats()["hedged_requests"] += 1
+            # The hedge task copies the current context, admission included.
+            admission_token = _BREAKER_ADMISSION.set(admission)
+            try:
+                tasks.append(asyncio.ensure_future(_call_provider(*hedge_target, prompt, content, cancelled, call)))
+            finally:
+                _BREAKER_ADMISSION.reset(admission_token)
+        pending = set(tasks)
+        last_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        get_routing_stats()["hedge_wins"] += 1
+                    winner = task
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif task is not winner and not task.cancelled() and task.exception() is None and hasattr(task.result(), "aclose"):
+                await task.result().aclose()
+
+_ROUTING_STATS = {"routed_calls": 0, "failovers": 0, "skipped_open_circuits": 0, "hedged_requests": 0, "hedge_wins": 0}
+
+def get_routing_stats() -> Dict[str, int]:
+    return _ROUTING_STATS
+
+async def route_llm_call(task_type: Optional[str], provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, cancelled: bool = False, call=call_provider_api):
+    """Tries the task's route in order, skipping providers whose circuit is open."""
+    route = get_route_for_task(task_type, provider_config, model_name)
+    _ROUTING_STATS["routed_calls"] += 1
+    last_error: Optional[BaseException] = None
+    for index, candidate in enumerate(route):
+        candidate_name = candidate[0]["name"]
+        admission = get_circuit_breaker(candidate_name).allow_request()
+        if admission is None:
+            print(f"Circuit for {candidate_name} is open; skipping it.")
+            _ROUTING_STATS["skipped_open_circuits"] += 1
+            continue
+        if index > 0:
+            _ROUTING_STATS["failovers"] += 1
+            print(f"Falling back to {candidate_name} ({candidate[1]}).")
+        admission_token = _BREAKER_ADMISSION.set(admission)
+        try:
+            return await _call_with_hedge(candidate, route[index + 1:], prompt, content, cancelled, call)
+        except Exception as e:
+            if cancelled or index == len(route) - 1:
+                raise
+            print(f"{candidate_name} failed: {e}")
+            last_error = e
+        finally:
+            _BREAKER_ADMISSION.reset(admission_token)
+    if last_error is not None:
+        raise last_error
+    raise ProviderUnavailableError(f"No provider available for {task_type or 'this task'}: every circuit on its route is open.")
+
+def get_provider_status() -> Dict[str, Any]:
+    return {
+        "routing": dict(_ROUTING_STATS),
+        "circuit_breakers": {name: breaker.get_state() for name, breaker in _CIRCUIT_BREAKERS.items()},
+        "latency": [{"provider": provider_name, "model": model_name, **tracker.get_state()}
+                    for (provider_name, model_name), tracker in _LATENCY_TRACKERS.items()],
+    }
+
+# --- LLM Response Cache ---
+class LLMResponseCache:
+    """Content-addressed LLM response cache: an in-memory LRU over an optional SQLite file."""
+    def __init__(self, memory_entries: int, disk_path: str, max_disk_bytes: int, ttl_seconds: float):
+        self.memory_entries = max(0, memory_entries)
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_bytes = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+        if disk_path:
+            directory = os.path.dirname(os.path.abspath(disk_path))
+            os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            self._db.commit()
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl_seconds) and now - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        if not self.memory_entries:
+            return
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._is_expired(entry[1], now):
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+                self.stats["expired"] += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, size, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, size, created_at = row
+                    if not self._is_expired(created_at, now):
+                        self._db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        self._remember(key, value, created_at)
+                        self.stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._db.commit()
+                    self._disk_bytes -= size
+                    self.stats["expired"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self.stats["stores"] += 1
+            if self._db is None:
+                return
+            size = len(value.encode("utf-8"))
+            row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._disk_bytes -= row[0]
+            self._db.execute("INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)", (key, value, size, now, now))
+            self._disk_bytes += size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk(now)
+            self._db.commit()
+
+    def _evict_disk(self, now: float) -> None:
+        if self.ttl_seconds:
+            cursor = self._db.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+            self.stats["expired"] += cursor.rowcount
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        # Evict down to 90% of the limit so we do not evict on every store.
+        target = self.max_disk_bytes * 0.9
+        while self._disk_bytes > target:
+            rows = self._db.execute("SELECT key, size FROM entries ORDER BY accessed_at LIMIT 64").fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            for key, size in rows:
+                if self._disk_bytes <= target:
+                    break
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
+            self._disk_bytes = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            disk_entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] if self._db is not None else 0
+            return {
+                **self.stats,
+                "hits": hits,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "disk_bytes": self._disk_bytes,
+            }
+
+_LLM_CACHE: Optional[LLMResponseCache] = None
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    global _LLM_CACHE
+    if not SETTINGS.get("ENABLE_LLM_CACHE", False):
+        return None
+    if _LLM_CACHE is None:
+        _LLM_CACHE = LLMResponseCache(
+            SETTINGS.get("LLM_CACHE_MEMORY_ENTRIES", 512),
+            SETTINGS.get("LLM_CACHE_PATH", ""),
+            SETTINGS.get("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024),
+            SETTINGS.get("LLM_CACHE_TTL", 7 * 24 * 3600),
+        )
+    return _LLM_CACHE
+
+def close_llm_cache() -> None:
+    global _LLM_CACHE
+    if _LLM_CACHE is not None:
+        _LLM_CACHE.close()
+        _LLM_CACHE = None
+
+def make_llm_cache_key(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> str:
+    key_material = json.dumps([
+        provider_config.get("name"),
+        model_name,
+        provider_config.get("temperature"),
+        get_max_output_tokens(provider_config, model_name),
+        prompt,
+        content,
+    ], ensure_ascii=False)
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+async def call_llm_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, cancelled: bool = False, task_type: Optional[str] = None) -> str:
+    started = time.monotonic()
+    cache = get_llm_cache()
+    cache_label = "disabled"
+    try:
+        if cache is None:
+            return await route_llm_call(task_type, provider_config, model_name, prompt, content, cancelled)
+
+        cache_key = make_llm_cache_key(provider_config, model_name, prompt, content)
+        cached_response = await asyncio.to_thread(cache.get, cache_key)
+        if cached_response is not None:
+            cache_label = "hit"
+            return cached_response
+        cache_label = "miss"
+        response = await route_llm_call(task_type, provider_config, model_name, prompt, content, cancelled)
+        if response:
+            await asyncio.to_thread(cache.set, cache_key, response)
+        return response
+    finally:
+        LLM_REQUEST_SECONDS.labels(task_type or "custom", provider_config["name"], model_name, cache_label).observe(time.monotonic() - started)
+
+# --- LLM Token Streaming ---
+# Streamed provider calls. Each wire format has one generator that yields
+# text deltas and fills `usage` from the usage the provider reports; usage
+# is passed explicitly because a ContextVar set inside a generator would
+# leak into whatever the consumer runs between deltas.
+@asynccontextmanager
+async def _open_llm_stream(provider_config: Dict[str, Any], model_name: str, request: LLMRequest):
+    url, headers, payload = request
+    client = get_http_client(provider_config['baseUrl'])
+    async with client.stream("POST", url, headers=headers, json=payload, timeout=get_llm_timeout(provider_config, model_name)) as response:
+        if response.is_error:
+            await response.aread()  # So the error body is available to the retry logging.
+            response.raise_for_status()
+        yield response
+
+async def _iter_sse_events(response: httpx.Response) -> AsyncIterator[Tuple[str, str]]:
+    """(event, data) pairs of a text/event-stream response."""
+    event, data_lines = "message", []
+    async for line in response.aiter_lines():
+        if not line:
+            if data_lines:
+                yield event, "\n".join(data_lines)
+            event, data_lines = "message", []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "event":
+            event = value
+        elif field == "data":
+            data_lines.append(value)
+    if data_lines:
+        yield event, "\n".join(data_lines)
+
+def _merge_stream_usage(usage: Dict[str, int], data: Any) -> None:
+    """Keeps the maxima, since streams report usage cumulatively and sometimes in parts."""
+    reported = extract_token_usage(data) if isinstance(data, dict) else None
+    for key, value in (reported or {}).items():
+        usage[key] = max(usage.get(key, 0), value)
+
+async def stream_openai_compatible_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, usage: Dict[str, int]) -> AsyncIterator[str]:
+    request = _STREAM_REQUEST_BUILDERS[provider_config["name"]](provider_config, model_name, prompt, content, stream=True)
+    # Like execute_openrouter_api, OpenRouter answers with the reasoning when a model sends no content.
+    reasoning, has_content = [], False
+    async with _open_llm_stream(provider_config, model_name, request) as response:
+        async for _, data in _iter_sse_events(response):
+            if data.strip() == "[DONE]":
+                break
+            chunk = json.loads(data)
+            if chunk.get("error"):
+                raise Exception(f"{provider_config['name']} stream error: {chunk['error']}")
+            _merge_stream_usage(usage, chunk)
+            for choice in chunk.get("choices") or []:
+                delta = choice.get("delta") or {}
+                text = delta.get("content")
+                if text:
+                    has_content = True
+                    yield text
+                elif provider_config["name"] == "OpenRouter" and delta.get("reasoning"):
+                    reasoning.append(delta["reasoning"])
+    if reasoning and not has_content:
+        yield "".join(reasoning)
+
+async def stream_anthropic_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, usage: Dict[str, int]) -> AsyncIterator[str]:
+    request = _anthropic_request(provider_config, model_name, prompt, content, stream=True)
+    async with _open_llm_stream(provider_config, model_name, request) as response:
+        async for event, data in _iter_sse_events(response):
+            message = json.loads(data)
+            message_type = message.get("type", event)
+            if message_type == "error":
+                raise Exception(f"Anthropic stream error: {message.get('error')}")
+            if message_type == "message_start":
+                _merge_stream_usage(usage, message.get("message"))
+            elif message_type == "message_delta":
+                _merge_stream_usage(usage, message)
+            elif message_type == "content_block_delta" and message.get("delta", {}).get("type") == "text_delta":
+                yield message["delta"]["text"]
+            elif message_type == "message_stop":
+                break
+
+async def stream_google_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, usage: Dict[str, int]) -> AsyncIterator[str]:
+    request = _google_request(provider_config, model_name, prompt, content, stream=True)
+    async with _open_llm_stream(provider_config, model_name, request) as response:
+        async for _, data in _iter_sse_events(response):
+            chunk = json.loads(data)
+            if chunk.get("error"):
+                raise Exception(f"Google stream error: {chunk['error']}")
+            _merge_stream_usage(usage, chunk)
+            for candidate in (chunk.get("candidates") or [])[:1]:
+                for part in (candidate.get("content") or {}).get("parts") or []:
+                    if part.get("text") and not part.get("thought"):
+                        yield part["text"]
+
+async def stream_ollama_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, usage: Dict[str, int]) -> AsyncIterator[str]:
+    request = _ollama_request(provider_config, model_name, prompt, content, stream=True)
+    async with _open_llm_stream(provider_config, model_name, request) as response:
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if chunk.get("error"):
+                raise Exception(f"Ollama stream error: {chunk['error']}")
+            text = (chunk.get("message") or {}).get("content")
+            if text:
+                yield text
+            if chunk.get("done"):
+                _merge_stream_usage(usage, chunk)
+                break
+
+_STREAM_REQUEST_BUILDERS = {
+    "DeepSeek": _openai_compatible_request,
+    "OpenAI": _openai_compatible_request,
+    "Mistral": _openai_compatible_request,
+    "Azure OpenAI": _azure_openai_request,
+    "LMStudio": _lmstudio_request,
+    "OpenRouter": _openrouter_request,
+}
+
+STREAM_CALL_FUNCTIONS = {
+    "DeepSeek": stream_openai_compatible_api,
+    "OpenAI": stream_openai_compatible_api,
+    "Anthropic": stream_anthropic_api,
+    "Google": stream_google_api,
+    "Mistral": stream_openai_compatible_api,
+    "Azure OpenAI": stream_openai_compatible_api,
+    "LMStudio": stream_openai_compatible_api,
+    "Ollama": stream_ollama_api,
+    "OpenRouter": stream_openai_compatible_api,
+}
+
+async def stream_provider_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> AsyncIterator[str]:
+    """Streamed counterpart of call_provider_api."""
+    stream_function = STREAM_CALL_FUNCTIONS.get(provider_config["name"])
+    if not stream_function: raise ValueError(f"Unsupported provider: {provider_config['name']}")
+    breaker = get_circuit_breaker(provider_config["name"])
+    # Read while the first delta is awaited in the routing context; later deltas run in the consumer's.
+    admission = _BREAKER_ADMISSION.get()
+    limiter = get_rate_limiter(provider_config, model_name)
+    try:
+        reserved = await limiter.acquire(estimate_call_tokens(prompt, content))
+    except BaseException:
+        breaker.record(None, admission)
+        raise
+    usage: Dict[str, int] = {}
+    outcome: Optional[bool] = None
+    started = time.monotonic()
+    first_delta = True
+    try:
+        async for delta in stream_function(provider_config, model_name, prompt, content, usage):
+            if first_delta:
+                LLM_TIME_TO_FIRST_TOKEN.labels(provider_config["name"], model_name).observe(time.monotonic() - started)
+                first_delta = False
+            yield delta
+        outcome = True
+        elapsed = time.monotonic() - started
+        get_latency_tracker(provider_config["name"], model_name).record(elapsed)
+        LLM_CALL_SECONDS.labels(provider_config["name"], model_name, "success").observe(elapsed)
+    except Exception as e:
+        outcome = False if is_provider_failure(e) else None
+        error_type = f"http_{e.response.status_code}" if isinstance(e, httpx.HTTPStatusError) else type(e).__name__
+        LLM_CALL_SECONDS.labels(provider_config["name"], model_name, "error").observe(time.monotonic() - started)
+        LLM_CALL_ERRORS.labels(provider_config["name"], model_name, error_type).inc()
+        raise
+    finally:
+        # A stream that already produced text was metered, even if it was abandoned.
+        limiter.settle(reserved, usage, failed=outcome is not True and first_delta)
+        breaker.record(outcome, admission)
+
+async def _prepend_delta(first: Optional[str], stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    try:
+        if first:
+            yield first
+        async for delta in stream:
+            yield delta
+    finally:
+        await stream.aclose()
+
+async def start_provider_stream(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str) -> AsyncIterator[str]:
+    """Opens a provider stream and waits for its first delta, while errors can still fail over."""
+    stream = stream_provider_api(provider_config, model_name, prompt, content)
+    try:
+        first = await stream.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except BaseException:
+        await stream.aclose()
+        raise
+    return _prepend_delta(first, stream)
+
+async def stream_llm_api(provider_config: Dict[str, Any], model_name: str, prompt: str, content: str, cancelled: bool = False, task_type: Optional[str] = None) -> AsyncIterator[str]:
+    """Streamed counterpart of call_llm_api, yielding text deltas."""
+    if not SETTINGS.get("ENABLE_PROVIDER_STREAMING", True):
+        yield await call_llm_api(provider_config, model_name, prompt, content, cancelled, task_type)
+        return
+
+    started = time.monotonic()
+    cache = get_llm_cache()
+    cache_label = "disabled"
+    cache_key = None
+    try:
+        if cache is not None:
+            cache_key = make_llm_cache_key(provider_config, model_name, prompt, content)
+            cached_response = await asyncio.to_thread(cache.get, cache_key)
+            if cached_response is not None:
+                cache_label = "hit"
+                yield cached_response
+                return
+            cache_label = "miss"
+
+        stream = await route_llm_call(task_type, provider_config, model_name, prompt, content, cancelled, call=start_provider_stream)
+        parts = []
+        try:
+            async for delta in stream:
+                if cancelled: raise Exception("Processing cancelled by user during streamed API call.")
+                parts.append(delta)
+                yield delta
+        finally:
+            await stream.aclose()
+        response = "".join(parts)
+        if cache_key is not None and response:
+            await asyncio.to_thread(cache.set, cache_key, response)
+    finally:
+        LLM_REQUEST_SECONDS.labels(task_type or "custom", provider_config["name"], model_name, cache_label).observe(time.monotonic() - started)
 
 # --- Mermaid and LaTeX Processing (from mermaidProcessor.ts) ---
-def refine_mermaid_blocks(content: str) -> str:
-    lines = content.split('\n')
-    result_lines = []
-    in_mermaid = False
-    current_block_lines = []
-    last_arrow_index_in_block = -1
+_MERMAID_START_REGEX = re.compile(r'^```\s*\(?\s*mermaid\s*\)?')
 
-    for line in lines:
+class _MermaidBlockRefiner:
+    """Line-at-a-time state machine behind refine_mermaid_blocks()."""
+    def __init__(self):
+        self.in_mermaid = False
+        self.current_block_lines: List[str] = []
+        self.last_arrow_index_in_block = -1
+
+    def push(self, line: str) -> List[str]:
         stripped = line.strip()
-        mermaid_start_regex = re.compile(r'^```\s*\(?\s*mermaid\s*\)?')
+        current_block_lines = self.current_block_lines
+        last_arrow_index_in_block = self.last_arrow_index_in_block
 
-        if mermaid_start_regex.search(stripped):
-            line = mermaid_start_regex.sub('```mermaid', line)
-            if in_mermaid:
+        if _MERMAID_START_REGEX.search(stripped):
+            line = _MERMAID_START_REGEX.sub('```mermaid', line)
+            if self.in_mermaid:
                 if last_arrow_index_in_block != -1:
                     if (last_arrow_index_in_block + 1 >= len(current_block_lines) or\
                             current_block_lines[last_arrow_index_in_block + 1].strip() != '```'):
@@ -254,26 +1525,35 @@ def refine_mermaid_blocks(content: str) -> str:
                        current_block_lines[-1].strip() != '```':
                         if len(current_block_lines) == 1 or current_block_lines[1].strip() != '```':
                             current_block_lines.insert(1, '```')
-            result_lines.extend(current_block_lines)
-            in_mermaid = True
-            current_block_lines = [line]
-            last_arrow_index_in_block = -1
-        elif in_mermaid:
+            self.in_mermaid = True
+            self.current_block_lines = [line]
+            self.last_arrow_index_in_block = -1
+            return current_block_lines
+        elif self.in_mermaid:
             if "subgraph" not in line:
                 line = line.replace('"', '')
 
             current_block_lines.append(line)
             if "-->" in line:
-                last_arrow_index_in_block = len(current_block_lines) - 1
+                self.last_arrow_index_in_block = len(current_block_lines) - 1
             if stripped == '```':
-                result_lines.extend(current_block_lines)
-                in_mermaid = False
-                current_block_lines = []
-                last_arrow_index_in_block = -1
+                self.in_mermaid = False
+                self.current_block_lines = []
+                self.last_arrow_index_in_block = -1
+                return current_block_lines
+            return []
         else:
-            result_lines.append(line)
+            return [line]
+
+    def finish(self) -> List[str]:
+        current_block_lines = self.current_block_lines
+        last_arrow_index_in_block = self.last_arrow_index_in_block
+        self.current_block_lines = []
+        self.last_arrow_index_in_block = -1
+        if not self.in_mermaid:
+            return []
+        self.in_mermaid = False
 
-    if in_mermaid:
         if last_arrow_index_in_block != -1:
             if (last_arrow_index_in_block + 1 >= len(current_block_lines) or\
                     current_block_lines[last_arrow_index_in_block + 1].strip() != '```'):
@@ -287,8 +1567,14 @@ def refine_mermaid_blocks(content: str) -> str:
                     current_block_lines.append('```')
         elif current_block_lines[-1].strip() != '```':
             current_block_lines.append('```')
-        result_lines.extend(current_block_lines)
+        return current_block_lines
 
+def refine_mermaid_blocks(content: str) -> str:
+    refiner = _MermaidBlockRefiner()
+    result_lines = []
+    for line in content.split('\n'):
+        result_lines.extend(refiner.push(line))
+    result_lines.extend(refiner.finish())
     return '\n'.join(result_lines)
 
 def cleanup_latex_delimiters(content: str) -> str:
@@ -298,10 +1584,236 @@ def cleanup_latex_delimiters(content: str) -> str:
     processed = re.sub(r'___TEMP_DOLLAR_ESCAPE___', '$', processed)
     return processed
 
+# --- Fused Markdown Post-Processing ---
+# The LLM output cleanup chain (blank-line collapsing, strip, LaTeX delimiter
+# cleanup, Mermaid refinement, \boxed{ unwrapping, code-fence removal and
+# duplicate detection) as a pipeline of incremental stages. Text flows through
+# every stage once, and feed() can be called with streamed chunks.
+_LATEX_DOLLAR_TOKEN_REGEX = re.compile(r'\\\$|\$')
+
+class _NewlineCollapser:
+    """Incremental text.replace("\n\n\n", "\n\n")."""
+    def __init__(self):
+        self._held = ""
+
+    def feed(self, text: str) -> str:
+        # A trailing run of newlines may continue in the next piece.
+        text = self._held + text
+        body = text.rstrip("\n")
+        self._held = text[len(body):]
+        return body.replace("\n\n\n", "\n\n")
+
+    def finish(self) -> str:
+        held, self._held = self._held, ""
+        return held.replace("\n\n\n", "\n\n")
+
+class _WhitespaceStripper:
+    """Incremental text.strip()."""
+    def __init__(self):
+        self._started = False
+        self._held = ""
+
+    def feed(self, text: str) -> str:
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        text = self._held + text
+        body = text.rstrip()
+        self._held = text[len(body):]
+        return body
+
+    def finish(self) -> str:
+        self._held = ""
+        return ""
+
+class _LatexDelimiterCleaner:
+    """Incremental cleanup_latex_delimiters()."""
+    def __init__(self):
+        self._pending_backslash = False
+        self._in_span = False
+        self._span: List[str] = []
+
+    def feed(self, text: str) -> str:
+        if self._pending_backslash:
+            text = "\\" + text
+            self._pending_backslash = False
+        if text.endswith("\\"):
+            # It might escape a `$` at the start of the next piece.
+            text = text[:-1]
+            self._pending_backslash = True
+
+        out = []
+        position = 0
+        for match in _LATEX_DOLLAR_TOKEN_REGEX.finditer(text):
+            segment = text[position:match.start()]
+            position = match.end()
+            if match.group() != "$":
+                (self._span if self._in_span else out).append(segment + "$")
+            elif self._in_span:
+                self._span.append(segment)
+                out.append("$" + "".join(self._span).strip() + "$")
+                self._span = []
+                self._in_span = False
+            else:
+                out.append(segment)
+                self._in_span = True
+        (self._span if self._in_span else out).append(text[position:])
+        return "".join(out)
+
+    def finish(self) -> str:
+        tail = "\\" if self._pending_backslash else ""
+        self._pending_backslash = False
+        if self._in_span:
+            span, self._span, self._in_span = "".join(self._span), [], False
+            return "$" + span + tail
+        return tail
+
+class _MermaidStage:
+    """Incremental refine_mermaid_blocks() over a text stream."""
+    def __init__(self):
+        self._refiner = _MermaidBlockRefiner()
+        self._partial = ""
+        self._started = False
+
+    def _emit(self, text: str) -> str:
+        if self._started:
+            text = "\n" + text
+        self._started = True
+        return text
+
+    def feed(self, text: str) -> str:
+        text = self._partial + text
+        cut = text.rfind("\n")
+        if cut == -1:
+            self._partial = text
+            return ""
+        self._partial = text[cut + 1:]
+        complete = text[:cut]
+        # Lines outside a block that cannot open one pass through unchanged.
+        if not self._refiner.in_mermaid and "```" not in complete:
+            return self._emit(complete)
+        refined_lines = []
+        for line in complete.split("\n"):
+            refined_lines.extend(self._refiner.push(line))
+        return self._emit("\n".join(refined_lines)) if refined_lines else ""
+
+    def finish(self) -> str:
+        refined_lines = list(self._refiner.push(self._partial))
+        refined_lines.extend(self._refiner.finish())
+        self._partial = ""
+        return self._emit("\n".join(refined_lines)) if refined_lines else ""
+
+# Matches the old chain for any text without the ___TEMP_DOLLAR_ESCAPE___ placeholder of cleanup_latex_delimiters().
+class MarkdownPostProcessor:
+    """Single-pass, incremental equivalent of the post-LLM cleanup chain."""
+    def __init__(self, collapse_blank_lines: bool = False, strip_input: bool = False, strip_output: bool = False,
+                 unwrap_boxed: bool = True, remove_markdown_fences: bool = False, remove_code_fences: bool = False,
+                 track_duplicates: bool = False):
+        self._input_stages = []
+        if collapse_blank_lines:
+            self._input_stages.append(_NewlineCollapser())
+        if strip_input:
+            self._input_stages.append(_WhitespaceStripper())
+        self._latex = _LatexDelimiterCleaner()
+        self._mermaid = _MermaidStage()
+        self._output_stripper = _WhitespaceStripper() if strip_output else None
+
+        self.unwrap_boxed = unwrap_boxed
+        self.remove_markdown_fences = remove_markdown_fences
+        self.remove_code_fences = remove_code_fences
+        self.track_duplicates = track_duplicates
+        self.seen_words: set = set()
+        self.duplicate_words: set = set()
+        self._partial = ""
+        self._first_line = True
+        self._boxed = False
+        self._held_line: Optional[str] = None
+        self._started = False
+
+    def _release_lines(self, text: str, final: bool) -> str:
+        text = self._partial + text
+        if final:
+            complete, self._partial = text, ""
+        else:
+            cut = text.rfind("\n")
+            if cut == -1:
+                self._partial = text
+                return ""
+            complete, self._partial = text[:cut], text[cut + 1:]
+
+        if self._first_line or self._boxed:
+            lines = complete.split("\n")
+            if self._first_line:
+                self._first_line = False
+                if self.unwrap_boxed and lines[0].strip() == '\\boxed{':
+                    self._boxed = True
+                    lines.pop(0)
+            if self._boxed:
+                # Hold one line back: a closing "}" is only dropped if it is the last line.
+                if self._held_line is not None:
+                    lines.insert(0, self._held_line)
+                self._held_line = lines.pop() if lines else None
+                if final and self._held_line is not None:
+                    if self._held_line.strip() != '}':
+                        lines.append(self._held_line)
+                    self._held_line = None
+            if not lines:
+                return ""
+            complete = "\n".join(lines)
+
+        if self.remove_markdown_fences or self.remove_code_fences:
+            complete = complete.replace("```markdown", "")
+        if self.remove_code_fences:
+            complete = complete.replace("```", "")
+        if self.track_duplicates:
+            find_duplicates(complete, self.seen_words, self.duplicate_words)
+        if self._started:
+            complete = "\n" + complete
+        self._started = True
+        return complete
+
+    def _run(self, text: str, final: bool) -> str:
+        for stage in self._input_stages:
+            text = stage.feed(text) + (stage.finish() if final else "")
+        text = self._latex.feed(text) + (self._latex.finish() if final else "")
+        text = self._mermaid.feed(text) + (self._mermaid.finish() if final else "")
+        if self._output_stripper is not None:
+            text = self._output_stripper.feed(text) + (self._output_stripper.finish() if final else "")
+        return self._release_lines(text, final)
+
+    def feed(self, text: str) -> str:
+        """Consumes the next piece of text and returns the output that is final so far."""
+        return self._run(text, final=False)
+
+    def finish(self) -> str:
+        """Flushes the remaining output once the input is complete."""
+        return self._run("", final=True)
+
+    def process(self, text: str) -> str:
+        return self.feed(text) + self.finish()
+
+def create_add_links_postprocessor() -> MarkdownPostProcessor:
+    return MarkdownPostProcessor(
+        collapse_blank_lines=True,
+        strip_input=True,
+        remove_markdown_fences=True,
+        remove_code_fences=SETTINGS.get("REMOVE_CODE_FENCES_ON_ADD_LINKS", False),
+        track_duplicates=SETTINGS.get("ENABLE_DUPLICATE_DETECTION", True),
+    )
+
+def report_postprocessor_duplicates(processor: MarkdownPostProcessor) -> None:
+    if processor.track_duplicates:
+        report_duplicates(processor.duplicate_words)
+    else:
+        print("Duplicate detection is disabled in settings.")
+
 # --- Duplicate Handling (from fileUtils.ts) ---
-def find_duplicates(content: str) -> set[str]:
-    duplicates = set()
-    seen_words = set()
+def find_duplicates(content: str, seen_words: Optional[set] = None, duplicates: Optional[set] = None) -> set[str]:
+    # Passing the sets from a previous call continues the scan across streamed chunks.
+    duplicates = set() if duplicates is None else duplicates
+    seen_words = set() if seen_words is None else seen_words
     lines = content.split('\n')
 
     for line in lines:
@@ -318,8 +1830,10 @@ async def handle_duplicates(content: str):
     if not SETTINGS.get("ENABLE_DUPLICATE_DETECTION", True):
         print("Duplicate detection is disabled in settings.")
         return
+    report_duplicates(find_duplicates(content))
+
+def report_duplicates(duplicate_words: set) -> None:
     potential_issues = set()
-    duplicate_words = find_duplicates(content)
     for word in duplicate_words:
         potential_issues.add(f'Duplicate word: "{word}"')
 
@@ -328,22 +1842,109 @@ async def handle_duplicates(content: str):
         for issue in potential_issues:
             print(issue)
 
+# --- Research Cache ---
+class ResearchCache:
+    """In-memory LRU caches for search results and page text."""
+    def __init__(self, query_entries: int, query_ttl: float, url_entries: int, url_ttl: float):
+        self.query_entries = max(0, query_entries)
+        self.query_ttl = query_ttl
+        self.url_entries = max(0, url_entries)
+        self.url_ttl = url_ttl
+        self._queries: "OrderedDict[str, Tuple[List[Dict[str, Any]], float]]" = OrderedDict()
+        self._pages: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.stats = {"query_hits": 0, "query_misses": 0, "url_hits": 0, "url_misses": 0, "url_revalidated": 0, "url_refetched": 0}
+
+    @staticmethod
+    def make_query_key(search_provider: str, query: str) -> str:
+        if search_provider == "tavily":
+            options = [SETTINGS.get("TAVILY_SEARCH_DEPTH", "basic"), SETTINGS.get("TAVILY_MAX_RESULTS", 5)]
+        else:
+            options = [SETTINGS.get("DDG_MAX_RESULTS", 5)]
+        return json.dumps([search_provider, " ".join(query.lower().split()), *options], ensure_ascii=False)
+
+    def get_search_results(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        entry = self._queries.get(key)
+        if entry is not None and not (self.query_ttl and time.time() - entry[1] > self.query_ttl):
+            self._queries.move_to_end(key)
+            self.stats["query_hits"] += 1
+            return [dict(result) for result in entry[0]]
+        if entry is not None:
+            del self._queries[key]
+        self.stats["query_misses"] += 1
+        return None
+
+    def set_search_results(self, key: str, results: List[Dict[str, Any]]) -> None:
+        if not self.query_entries:
+            return
+        self._queries[key] = ([dict(result) for result in results], time.time())
+        self._queries.move_to_end(key)
+        while len(self._queries) > self.query_entries:
+            self._queries.popitem(last=False)
+
+    def get_page(self, url: str) -> Optional[Dict[str, Any]]:
+        """Returns the cached entry for `url` with a `fresh` flag, or None."""
+        entry = self._pages.get(url)
+        if entry is None:
+            self.stats["url_misses"] += 1
+            return None
+        self._pages.move_to_end(url)
+        fresh = not (self.url_ttl and time.time() - entry["fetched_at"] > self.url_ttl)
+        if fresh:
+            self.stats["url_hits"] += 1
+        return {**entry, "fresh": fresh}
+
+    def set_page(self, url: str, text: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        if not self.url_entries:
+            return
+        self._pages[url] = {"text": text, "etag": etag, "last_modified": last_modified, "fetched_at": time.time()}
+        self._pages.move_to_end(url)
+        while len(self._pages) > self.url_entries:
+            self._pages.popitem(last=False)
+
+    def mark_revalidated(self, url: str) -> None:
+        entry = self._pages.get(url)
+        if entry is not None:
+            entry["fetched_at"] = time.time()
+        self.stats["url_revalidated"] += 1
+
+    def clear(self) -> None:
+        self._queries.clear()
+        self._pages.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "query_entries": len(self._queries), "url_entries": len(self._pages)}
+
+_RESEARCH_CACHE: Optional[ResearchCache] = None
+
+def get_research_cache() -> Optional[ResearchCache]:
+    global _RESEARCH_CACHE
+    if not SETTINGS.get("ENABLE_RESEARCH_CACHE", True):
+        return None
+    if _RESEARCH_CACHE is None:
+        _RESEARCH_CACHE = ResearchCache(
+            SETTINGS.get("RESEARCH_QUERY_CACHE_ENTRIES", 256),
+            SETTINGS.get("RESEARCH_QUERY_CACHE_TTL", 3600),
+            SETTINGS.get("RESEARCH_URL_CACHE_ENTRIES", 1024),
+            SETTINGS.get("RESEARCH_URL_CACHE_TTL", 24 * 3600),
+        )
+    return _RESEARCH_CACHE
+
 # --- Search Functions (from searchUtils.ts) ---
 async def search_duckduckgo(query: str) -> List[Dict[str, str]]:
     max_results = SETTINGS.get("DDG_MAX_RESULTS", 5)
     encoded_query = quote(query)
-    url = f"https://html.duckduckgo.com/html/?q={encoded_query}"
+    url = f"{SETTINGS.get('DDG_SEARCH_URL', 'https://html.duckduckgo.com/html/')}?q={encoded_query}"
     results = []
 
     print(f"Querying DuckDuckGo HTML endpoint: {url}")
     try:
-        async with httpx.AsyncClient(timeout=SETTINGS.get("DDG_FETCH_TIMEOUT", 15)) as client:
-            response = await client.get(url, headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-            })
-            response.raise_for_status()
+        client = get_http_client(url)
+        response = await client.get(url, headers={
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+        }, timeout=SETTINGS.get("DDG_FETCH_TIMEOUT", 15))
+        response.raise_for_status()
 
         html_content = response.text
         print(f"Received HTML response from DuckDuckGo ({len(html_content)} bytes). Parsing...")
@@ -386,41 +1987,130 @@ async def search_duckduckgo(query: str) -> List[Dict[str, str]]:
         print(f"Automated DuckDuckGo search failed. Error: {e}. Consider using Tavily.")
         return []
 
+async def search_tavily(query: str) -> List[Dict[str, Any]]:
+    tavily_url = SETTINGS.get("TAVILY_SEARCH_URL", 'https://api.tavily.com/search')
+    print(f'Searching Tavily for: "{query}"')
+    tavily_request_body = {
+        "api_key": SETTINGS["TAVILY_API_KEY"],
+        "query": query,
+        "search_depth": SETTINGS.get("TAVILY_SEARCH_DEPTH", "basic"),
+        "include_answer": False,
+        "include_raw_content": False,
+        "max_results": SETTINGS.get("TAVILY_MAX_RESULTS", 5)
+    }
+    client = get_http_client(tavily_url)
+    response = await client.post(tavily_url, json=tavily_request_body, timeout=SETTINGS.get("DDG_FETCH_TIMEOUT", 15))
+    response.raise_for_status()
+    return response.json().get("results") or []
+
+async def _cached_search(search_provider: str, query: str, search_function) -> List[Dict[str, Any]]:
+    cache = get_research_cache()
+    if cache is None:
+        return await search_function(query)
+    query_key = ResearchCache.make_query_key(search_provider, query)
+    cached_results = cache.get_search_results(query_key)
+    if cached_results is not None:
+        print(f'Using {len(cached_results)} cached search results for: "{query}"')
+        return cached_results
+    search_results = await search_function(query)
+    if search_results:
+        cache.set_search_results(query_key, search_results)
+    return search_results
+
+_SKIPPED_TEXT_PARENTS = frozenset(("script", "style"))
+
+def _extract_body_text(body, max_length: int) -> str:
+    """Whitespace-normalised visible text of `body`, read up to `max_length` characters."""
+    pieces = []
+    length = -1
+    for node in body.traverse(include_text=True):
+        if node.tag != '-text' or node.parent is None or node.parent.tag in _SKIPPED_TEXT_PARENTS:
+            continue
+        piece = re.sub(r'\s+', ' ', node.text_content).strip()
+        if not piece:
+            continue
+        pieces.append(piece)
+        length += len(piece) + 1
+        if length > max_length:
+            break
+    return ' '.join(pieces)
+
 async def fetch_content_from_url(url: str) -> str:
+    cache = get_research_cache()
+    cached_page = cache.get_page(url) if cache is not None else None
+    if cached_page is not None and cached_page["fresh"]:
+        print(f"Using cached content for: {url}")
+        return cached_page["text"]
+
     print(f"Fetching content from: {url}")
+    started = time.monotonic()
+    outcome = "error"
     try:
-        async with httpx.AsyncClient(timeout=SETTINGS.get("DDG_FETCH_TIMEOUT", 15)) as client:
-            response = await client.get(url, headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            })
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+        }
+        if cached_page is not None:
+            if cached_page["etag"]:
+                headers['If-None-Match'] = cached_page["etag"]
+            if cached_page["last_modified"]:
+                headers['If-Modified-Since'] = cached_page["last_modified"]
+
+        client = get_http_client(WEB_CLIENT_KEY)
+        max_bytes = SETTINGS.get("FETCH_MAX_BYTES", 2 * 1024 * 1024)
+        body_truncated = False
+        async with client.stream("GET", url, headers=headers, timeout=SETTINGS.get("DDG_FETCH_TIMEOUT", 15)) as response:
+            if response.status_code == 304 and cached_page is not None:
+                cache.mark_revalidated(url)
+                print(f"Cached content still valid for: {url}")
+                outcome = "not_modified"
+                return cached_page["text"]
             response.raise_for_status()
 
-        content_type = response.headers.get('content-type', '')
-        if 'text/html' not in content_type:
-            print(f"Skipping non-HTML content ({content_type}) from: {url}")
-            return f"[Content skipped: Not HTML - {content_type}]"
-
-        parser = HTMLParser(response.text)
+            # Decide from the headers alone, before any of the body is downloaded.
+            content_type = response.headers.get('content-type', '')
+            if 'text/html' not in content_type:
+                print(f"Skipping non-HTML content ({content_type}) from: {url}")
+                outcome = "skipped"
+                return f"[Content skipped: Not HTML - {content_type}]"
+
+            body_parts = []
+            body_size = 0
+            async for data in response.aiter_bytes():
+                body_parts.append(data)
+                body_size += len(data)
+                if max_bytes and body_size >= max_bytes:
+                    body_truncated = True
+                    break
+            body = b"".join(body_parts)[:max_bytes] if max_bytes else b"".join(body_parts)
+            html = body.decode(response.encoding or "utf-8", errors="replace")
+        if body_truncated:
+            print(f"Stopped reading {url} after {max_bytes} bytes.")
+
+        parser = HTMLParser(html)
         if parser.body is None:
+            outcome = "skipped"
             return "[Content skipped: No body tag found]"
-        for script in parser.css('script'): script.decompose()
-        for style in parser.css('style'): style.decompose()
 
-        text = parser.body.text(separator=' ', strip=True)
-        text = re.sub(r'\s+', ' ', text).strip()
-
-        max_length = 15000
+        max_length = SETTINGS.get("FETCH_MAX_CHARS", 15000)
+        text = _extract_body_text(parser.body, max_length)
         if len(text) > max_length:
             text = text[:max_length] + "... [content truncated]"
             print(f"Truncated content from: {url}")
 
+        if cache is not None:
+            if cached_page is not None:
+                cache.stats["url_refetched"] += 1
+            cache.set_page(url, text, response.headers.get('etag'), response.headers.get('last-modified'))
         print(f"Successfully fetched and extracted text from: {url}")
+        outcome = "truncated" if body_truncated else "success"
         return text
 
     except Exception as e:
         print(f"Error fetching content from {url}: {e}")
         return f"[Content skipped: Error fetching - {e}]"
+    finally:
+        PAGE_FETCH_SECONDS.labels(outcome).observe(time.monotonic() - started)
 
 async def _perform_research(topic: str, cancelled: bool) -> Optional[str]:
     print(f'Entering _perform_research for topic: "{topic}"')
@@ -435,37 +2125,20 @@ async def _perform_research(topic: str, cancelled: bool) -> Optional[str]:
             print("Selected search provider: Tavily.")
             if not SETTINGS.get("TAVILY_API_KEY"): raise ValueError('Tavily API key is not configured.')
             if cancelled: raise Exception("Processing cancelled by user before Tavily search.")
-
-            tavily_url = 'https://api.tavily.com/search'
-            print(f'Searching Tavily for: "{search_query}"')
-            
-            tavily_request_body = {
-                "api_key": SETTINGS["TAVILY_API_KEY"],
-                "query": search_query,
-                "search_depth": SETTINGS.get("TAVILY_SEARCH_DEPTH", "basic"),
-                "include_answer": False,
-                "include_raw_content": False,
-                "max_results": SETTINGS.get("TAVILY_MAX_RESULTS", 5)
-            }
-            
-            async with httpx.AsyncClient(timeout=SETTINGS.get("DDG_FETCH_TIMEOUT", 15)) as client:
-                response = await client.post(tavily_url, json=tavily_request_body)
-                response.raise_for_status()
-            
+            with RESEARCH_SEARCH_SECONDS.labels("tavily").time():
+                search_results = await _cached_search("tavily", search_query, search_tavily)
             if cancelled: raise Exception("Processing cancelled by user during Tavily search.")
-            tavily_data = response.json()
-            if not tavily_data.get("results"): 
+            if not search_results: 
                 print('Tavily returned no results.')
                 return None
-            search_results = tavily_data["results"]
             print(f"Fetched {len(search_results)} results from Tavily.")
 
         else:
             search_source = 'DuckDuckGo'
             print("Selected search provider: DuckDuckGo.")
             if cancelled: raise Exception("Processing cancelled by user before DuckDuckGo search.")
-            print(f'Searching DuckDuckGo for: "{search_query}"')
-            search_results = await search_duckduckgo(search_query)
+            with RESEARCH_SEARCH_SECONDS.labels("duckduckgo").time():
+                search_results = await _cached_search("duckduckgo", search_query, search_duckduckgo)
             if cancelled: raise Exception("Processing cancelled by user during DuckDuckGo search.")
             if not search_results: 
                 print('DuckDuckGo search failed or returned no results.')
@@ -475,7 +2148,8 @@ async def _perform_research(topic: str, cancelled: bool) -> Optional[str]:
         if search_source == 'DuckDuckGo':
             print(f"Fetching content for top {len(search_results)} DuckDuckGo results...")
             fetch_promises = [fetch_content_from_url(result["url"]) for result in search_results]
-            fetched_contents = await asyncio.gather(*fetch_promises)
+            with RESEARCH_FETCH_SECONDS.time():
+                fetched_contents = await asyncio.gather(*fetch_promises)
             if cancelled: raise Exception("Processing cancelled by user during DuckDuckGo content fetching.")
             print(f"Finished fetching content for DuckDuckGo results.")
         else:
@@ -509,44 +2183,282 @@ async def _perform_research(topic: str, cancelled: bool) -> Optional[str]:
         print(f'Error in _perform_research catch block for "{topic}": {e}')
         return None
 
+# --- Concurrent Chunk Processing ---
+class ChunkProcessingError(Exception):
+    """Raised when some chunks still fail after their retries; carries the completed ones."""
+    def __init__(self, message: str, failed_chunks: Dict[int, BaseException], completed_chunks: Dict[int, str]):
+        super().__init__(message)
+        self.failed_chunks = failed_chunks
+        self.completed_chunks = completed_chunks
+
+_PROVIDER_SEMAPHORES: Dict[str, asyncio.Semaphore] = {}
+_PROVIDER_SEMAPHORE_LOOPS: Dict[str, Any] = {}
+
+def get_provider_concurrency(provider_name: str) -> int:
+    limits = SETTINGS.get("PROVIDER_CONCURRENCY", {}) or {}
+    return max(1, int(limits.get(provider_name, SETTINGS.get("CHUNK_CONCURRENCY", 4))))
+
+def get_provider_semaphore(provider_name: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _PROVIDER_SEMAPHORES.get(provider_name)
+    if semaphore is None or _PROVIDER_SEMAPHORE_LOOPS.get(provider_name) is not loop:
+        semaphore = asyncio.Semaphore(get_provider_concurrency(provider_name))
+        _PROVIDER_SEMAPHORES[provider_name] = semaphore
+        _PROVIDER_SEMAPHORE_LOOPS[provider_name] = loop
+    return semaphore
+
+def _is_retryable_chunk_error(error: BaseException) -> bool:
+    if isinstance(error, ValueError):
+        return False
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code in [400, 401, 403, 404]:
+        return False
+    return "cancelled" not in str(error)
+
+async def _process_chunks_concurrently(chunks: List[str], provider_config: Dict[str, Any], model_name: str, prompt: str, cancelled: bool) -> List[str]:
+    semaphore = get_provider_semaphore(provider_config["name"])
+    completed: Dict[int, str] = {}
+    failed: Dict[int, BaseException] = {}
+
+    async def run_chunk(chunk: str) -> str:
+        async with semaphore:
+            if cancelled: raise Exception("Processing cancelled by user before chunk API call.")
+            return await call_llm_api(provider_config, model_name, prompt, chunk, cancelled, "addLinks")
+
+    print(f"Processing {len(chunks)} chunks with up to {get_provider_concurrency(provider_config['name'])} concurrent calls to {provider_config['name']}.")
+    pending = list(range(len(chunks)))
+    max_rounds = SETTINGS.get("CHUNK_MAX_RETRIES", 1) + 1
+    for round_number in range(1, max_rounds + 1):
+        outcomes = await asyncio.gather(*(run_chunk(chunks[i]) for i in pending), return_exceptions=True)
+        failed = {}
+        for index, outcome in zip(pending, outcomes):
+            if isinstance(outcome, asyncio.CancelledError):
+                raise outcome
+            if isinstance(outcome, BaseException):
+                print(f"Chunk {index + 1}/{len(chunks)} failed on round {round_number}: {outcome}")
+                failed[index] = outcome
+            else:
+                completed[index] = outcome
+
+        retryable = [i for i in sorted(failed) if _is_retryable_chunk_error(failed[i])]
+        if not failed or len(retryable) != len(failed) or round_number == max_rounds:
+            break
+        pending = retryable
+        print(f"Retrying {len(pending)} failed chunk(s); {len(completed)} completed chunk(s) kept.")
+
+    if failed:
+        failed_numbers = ", ".join(str(i + 1) for i in sorted(failed))
+        first_error = failed[min(failed)]
+        raise ChunkProcessingError(
+            f"Failed to process {len(failed)} of {len(chunks)} chunks (chunk {failed_numbers}). First error: {first_error}",
+            failed, completed)
+
+    return [completed[i] for i in range(len(chunks))]
+
+# --- Operation Cancellation ---
+class OperationCancelledError(Exception):
+    """Raised when an operation was cancelled through its ID or because its client went away."""
+
+class CancellationToken:
+    """Cancellation state of one operation; truthy once cancelled."""
+    def __init__(self, operation_id: str, cancelled: bool = False):
+        self.operation_id = operation_id
+        self.cancelled = cancelled
+        self._task: Optional[asyncio.Task] = None
+
+    def __bool__(self) -> bool:
+        return self.cancelled
+
+    def attach(self, task: asyncio.Task) -> None:
+        self._task = task
+        if self.cancelled:
+            task.cancel()
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+_OPERATIONS: Dict[str, CancellationToken] = {}
+
+def new_operation_id() -> str:
+    return os.urandom(8).hex()
+
+def register_operation(operation_id: Optional[str] = None, cancelled: bool = False) -> CancellationToken:
+    operation_id = operation_id or new_operation_id()
+    if operation_id in _OPERATIONS:
+        raise ValueError(f"Operation ID already in use: {operation_id}")
+    token = CancellationToken(operation_id, cancelled)
+    _OPERATIONS[operation_id] = token
+    return token
+
+def unregister_operation(token: CancellationToken) -> None:
+    if _OPERATIONS.get(token.operation_id) is token:
+        del _OPERATIONS[token.operation_id]
+
+def cancel_operation(operation_id: str) -> bool:
+    token = _OPERATIONS.get(operation_id)
+    if token is None:
+        return False
+    print(f"Cancelling operation {operation_id}.")
+    token.cancel()
+    return True
+
+async def _cancel_on_disconnect(token: CancellationToken, is_disconnected) -> None:
+    interval = SETTINGS.get("DISCONNECT_POLL_INTERVAL", 1)
+    while True:
+        await asyncio.sleep(interval)
+        if await is_disconnected():
+            print(f"Client disconnected; cancelling operation {token.operation_id}.")
+            token.cancel()
+            return
+
+async def run_cancellable(operation, *args, operation_id: Optional[str] = None, cancelled: bool = False, is_disconnected=None):
+    """Runs `operation(*args, token)` in a task that cancel_operation() can stop."""
+    token = register_operation(operation_id, cancelled)
+    task = asyncio.create_task(operation(*args, token))
+    token.attach(task)
+    watcher = asyncio.create_task(_cancel_on_disconnect(token, is_disconnected)) if is_disconnected else None
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if token.cancelled and task.cancelled():
+            raise OperationCancelledError(f"Operation {token.operation_id} was cancelled.")
+        raise
+    except Exception as e:
+        # A `cancelled` check can fire before the task cancellation lands.
+        if token.cancelled:
+            raise OperationCancelledError(f"Operation {token.operation_id} was cancelled.") from e
+        raise
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        unregister_operation(token)
+
+async def iter_cancellable(operation, *args, operation_id: Optional[str] = None, cancelled: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    """Streaming counterpart of run_cancellable()."""
+    token = register_operation(operation_id, cancelled)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce() -> None:
+        try:
+            async for event in operation(*args, token):
+                if event.get("event") == "start":
+                    event = {**event, "operation_id": token.operation_id}
+                queue.put_nowait((event, None))
+        except BaseException as e:
+            queue.put_nowait((None, e))
+            if not isinstance(e, Exception):
+                raise
+        else:
+            queue.put_nowait((None, None))
+
+    producer = asyncio.create_task(produce())
+    token.attach(producer)
+    try:
+        while True:
+            event, error = await queue.get()
+            if event is not None:
+                yield event
+            elif error is not None and token.cancelled:
+                raise OperationCancelledError(f"Operation {token.operation_id} was cancelled.")
+            elif error is not None:
+                raise error
+            else:
+                return
+    finally:
+        # Also reached when the client disconnects and the response stops iterating.
+        if not producer.done():
+            producer.cancel()
+        unregister_operation(token)
+
+# --- Request Coalescing ---
+class _Flight:
+    """One computation shared by concurrent identical requests."""
+    def __init__(self, task_name: str, settings: Dict[str, Any], operation, text: str):
+        self.settings = settings
+        self.token = CancellationToken(f"{task_name}:{new_operation_id()}")
+        self.task = asyncio.create_task(operation(text, self.token))
+        self.token.attach(self.task)
+        self.waiters = 0
+
+_FLIGHTS: Dict[Tuple[str, str], _Flight] = {}
+
+def normalize_request_text(text: str) -> str:
+    return " ".join(text.split())
+
+async def coalesce(task_name: str, operation, text: str, cancelled: bool = False):
+    """Runs `operation(text, cancelled)` once for concurrent identical calls."""
+    if cancelled: raise Exception("Processing cancelled by user.")
+    if not SETTINGS.get("ENABLE_REQUEST_COALESCING", True):
+        return await operation(text, cancelled)
+
+    key = (task_name, normalize_request_text(text))
+    flight = _FLIGHTS.get(key)
+    # A settings reload swaps the snapshot, so requests after it never join older work.
+    # A flight whose last waiter left is being cancelled even if its task is not done yet.
+    if flight is None or flight.task.done() or flight.token.cancelled or flight.settings is not current_settings():
+        flight = _Flight(task_name, current_settings(), operation, text)
+        _FLIGHTS[key] = flight
+        flight.task.add_done_callback(lambda _, flight=flight: _FLIGHTS.pop(key) if _FLIGHTS.get(key) is flight else None)
+    else:
+        COALESCED_REQUESTS.labels(task_name).inc()
+        print(f"Joining the {task_name} already in flight for \"{key[1]}\" ({flight.waiters} waiting).")
+
+    flight.waiters += 1
+    try:
+        # Shielded: cancelling one caller must not stop the work the others wait for.
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.token.cancel()
+
 # --- Main Processing Function ---
 async def process_content(content: str, cancelled: bool = False) -> str:
-    chunks = split_content(content)
     processed_chunks = []
 
     provider_config = get_provider_for_task("addLinks")
     if not provider_config:
         raise ValueError(f"Active provider not found in settings.")
     model_name = get_model_for_task("addLinks", provider_config)
+    chunks = split_content(content, None, provider_config, model_name)
 
-    for chunk in chunks:
-        llm_response = await call_llm_api(provider_config, model_name, get_llm_processing_prompt(), chunk, cancelled)
-        processed_chunks.append(llm_response)
+    if SETTINGS.get("ENABLE_PARALLEL_CHUNK_PROCESSING", False) and len(chunks) > 1:
+        processed_chunks = await _process_chunks_concurrently(chunks, provider_config, model_name, get_llm_processing_prompt(), cancelled)
+    else:
+        for chunk in chunks:
+            llm_response = await call_llm_api(provider_config, model_name, get_llm_processing_prompt(), chunk, cancelled, "addLinks")
+            processed_chunks.append(llm_response)
 
-    processed_content = "\n\n".join(processed_chunks).replace("\n\n\n", "\n\n").strip()
+    processor = create_add_links_postprocessor()
+    final_content = processor.process("\n\n".join(processed_chunks))
+    report_postprocessor_duplicates(processor)
 
-    final_content = cleanup_latex_delimiters(processed_content)
-    final_content = refine_mermaid_blocks(final_content)
+    return final_content
 
-    lines = final_content.split('\n')
-    if lines and lines[0].strip() == '\\boxed{':
-        lines.pop(0)
-        if lines and lines[-1].strip() == '}':
-            lines.pop()
-        final_content = '\n'.join(lines)
+async def generate_content_for_title(title: str, cancelled: bool = False) -> str:
+    return await coalesce("generate_title", _generate_content_for_title, title, cancelled)
 
-    if SETTINGS.get("REMOVE_CODE_FENCES_ON_ADD_LINKS", False):
-        final_content = final_content.replace("```markdown", "")
-        final_content = final_content.replace("```", "")
-    else:
-        final_content = final_content.replace("```markdown", "")
+async def _generate_content_for_title(title: str, cancelled: bool) -> str:
+    print(f"Starting content generation for: {title}")
+    provider_config, model_name, generation_prompt = await _prepare_title_generation(title, cancelled)
+
+    if cancelled: raise Exception("Processing cancelled by user before API call.")
+    print(f"Calling {provider_config['name']} to generate content...")
+
+    generated_content = await call_llm_api(provider_config, model_name, generation_prompt, "", cancelled, "generateTitle")
 
-    await handle_duplicates(final_content)
+    if cancelled: raise Exception("Processing cancelled by user after API call.")
+    print(f"Content received from {provider_config['name']}.")
+
+    final_content = MarkdownPostProcessor().process(generated_content)
+    print("Mermaid/LaTeX cleanup applied.")
+
+    if cancelled: raise Exception("Processing cancelled by user after post-processing.")
 
     return final_content
 
-async def generate_content_for_title(title: str, cancelled: bool = False) -> str:
-    print(f"Starting content generation for: {title}")
+async def _prepare_title_generation(title: str, cancelled: bool) -> Tuple[Dict[str, Any], str, str]:
     provider_config = get_provider_for_task("generateTitle")
     if not provider_config: raise ValueError("No valid LLM provider configured for \"Generate from Title\" task.")
     model_name = get_model_for_task("generateTitle", provider_config)
@@ -575,39 +2487,18 @@ async def generate_content_for_title(title: str, cancelled: bool = False) -> str
     custom_prompt_template = SETTINGS.get("CUSTOM_PROMPT_GENERATE_TITLE")
     if not custom_prompt_template:
         raise ValueError("Custom prompt for 'Generate from Title' is not configured.")
-    generation_prompt = custom_prompt_template.format(TITLE=title, RESEARCH_CONTEXT_SECTION=research_context_section)
+    generation_prompt = fill_prompt_template(custom_prompt_template, TITLE=title, RESEARCH_CONTEXT_SECTION=research_context_section)
 
     target_language_name = next((lang["name"] for lang in SETTINGS.get("AVAILABLE_LANGUAGES", []) if lang["code"] == SETTINGS.get("LANGUAGE", "en")), SETTINGS.get("LANGUAGE", "en"))
     if SETTINGS.get("LANGUAGE", "en") != "en":
         generation_prompt += f'\n\nIMPORTANT: Process the request and perform all reasoning in English. However, the final output MUST be written in {target_language_name}.In mermaid diagrams, it is necessary to translate into {target_language_name} while retaining the English.'
 
-    if cancelled: raise Exception("Processing cancelled by user before API call.")
-    print(f"Calling {provider_config['name']} to generate content...")
-
-    generated_content = await call_llm_api(provider_config, model_name, generation_prompt, "", cancelled)
-
-    if cancelled: raise Exception("Processing cancelled by user after API call.")
-    print(f"Content received from {provider_config['name']}.")
-
-    final_content = cleanup_latex_delimiters(generated_content)
-    if cancelled: raise Exception("Processing cancelled by user during post-processing.")
-    final_content = refine_mermaid_blocks(final_content)
-    print("Mermaid/LaTeX cleanup applied.")
-
-    if cancelled: raise Exception("Processing cancelled by user after post-processing.")
-
-    lines = final_content.split('\n')
-    if lines and lines[0].strip() == '\\boxed{':
-        lines.pop(0)
-        if lines and lines[-1].strip() == '}':
-            lines.pop()
-        final_content = '\n'.join(lines)
-
-    if cancelled: raise Exception("Processing cancelled by user before saving.")
-
-    return final_content
+    return provider_config, model_name, generation_prompt
 
 async def research_and_summarize(topic: str, cancelled: bool = False) -> str:
+    return await coalesce("research_summarize", _research_and_summarize, topic, cancelled)
+
+async def _research_and_summarize(topic: str, cancelled: bool) -> str:
     print(f'Starting research for topic: "{topic}"')
 
     if cancelled: raise Exception("Processing cancelled by user before research.")
@@ -629,31 +2520,19 @@ async def research_and_summarize(topic: str, cancelled: bool = False) -> str:
     summary_prompt_template = SETTINGS.get("CUSTOM_PROMPT_RESEARCH_SUMMARIZE")
     if not summary_prompt_template:
         raise ValueError("Custom prompt for 'Research & Summarize' is not configured.")
-    summary_prompt = summary_prompt_template.format(TOPIC=topic, SEARCH_RESULTS_CONTEXT=research_context)
+    summary_prompt = fill_prompt_template(summary_prompt_template, TOPIC=topic, SEARCH_RESULTS_CONTEXT=research_context)
 
-    summary = await call_llm_api(provider_config, model_name, summary_prompt, "", cancelled)
+    summary = await call_llm_api(provider_config, model_name, summary_prompt, "", cancelled, "research")
 
     if cancelled: raise Exception("Processing cancelled by user after summarization.")
 
     print(f"Generated summary using {provider_config['name']}.")
 
-    final_summary = cleanup_latex_delimiters(summary)
-    if cancelled: raise Exception("Processing cancelled by user during post-processing.")
-    final_summary = refine_mermaid_blocks(final_summary)
+    summary_to_append = MarkdownPostProcessor(strip_output=True).process(summary)
     print("Mermaid/LaTeX cleanup applied to summary.")
 
     if cancelled: raise Exception("Processing cancelled by user after post-processing.")
 
-    summary_to_append = final_summary.strip()
-    lines = summary_to_append.split('\n')
-    if lines and lines[0].strip() == '\\boxed{':
-        lines.pop(0)
-        if lines and lines[-1].strip() == '}':
-            lines.pop()
-        summary_to_append = '\n'.join(lines)
-
-    if cancelled: raise Exception("Processing cancelled by user before appending summary.")
-
     search_source = SETTINGS.get("SEARCH_PROVIDER", "tavily")
     summary_header = f"\n\n## Research Summary (via {search_source.capitalize()}): {topic}\n\n"
 
@@ -670,43 +2549,391 @@ async def execute_custom_prompt(prompt: str, content: str, cancelled: bool = Fal
 
     return llm_response
 
-# --- File Utilities ---
+# --- Streaming Processing ---
+# These generators yield event dicts as work completes so the HTTP layer can
+# forward each processed chunk immediately instead of buffering the document.
+
+async def _next_chunk(chunk_iterator, from_file: bool) -> Optional[str]:
+    if from_file:
+        return await asyncio.to_thread(next, chunk_iterator, None)
+    return next(chunk_iterator, None)
+
+async def _iter_chunk_responses(chunks: Iterable[str], provider_config: Dict[str, Any], model_name: str, prompt: str, cancelled: bool, from_file: bool = False) -> AsyncIterator[Tuple[int, str, bool]]:
+    """Yields (index, text, chunk_done) in chunk order."""
+    total_chunks = None if from_file else len(chunks)
+    chunk_iterator = iter(chunks)
+    if not SETTINGS.get("ENABLE_PARALLEL_CHUNK_PROCESSING", False) or total_chunks == 1:
+        index = 0
+        while True:
+            chunk = await _next_chunk(chunk_iterator, from_file)
+            if chunk is None:
+                return
+            if cancelled: raise Exception("Processing cancelled by user before chunk API call.")
+            async for delta in stream_llm_api(provider_config, model_name, prompt, chunk, cancelled, "addLinks"):
+                yield index, delta, False
+            yield index, "", True
+            index += 1
+
+    semaphore = get_provider_semaphore(provider_config["name"])
+
+    async def run_chunk(chunk: str) -> str:
+        async with semaphore:
+            if cancelled: raise Exception("Processing cancelled by user before chunk API call.")
+            return await call_llm_api(provider_config, model_name, prompt, chunk, cancelled, "addLinks")
+
+    # Chunks run concurrently but are released in order, so the client can
+    # render the document top to bottom while later chunks are in flight.
+    # File chunks are started at most two per provider slot ahead.
+    read_ahead = 2 * get_provider_concurrency(provider_config["name"]) if from_file else None
+    in_flight: deque = deque()  # (chunk, task) in chunk order
+    exhausted = False
+    index = 0
+    try:
+        while True:
+            while not exhausted and (read_ahead is None or len(in_flight) < read_ahead):
+                chunk = await _next_chunk(chunk_iterator, from_file)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    in_flight.append((chunk, asyncio.ensure_future(run_chunk(chunk))))
+            if not in_flight:
+                return
+            chunk, task = in_flight.popleft()
+            chunk_label = f"{index + 1}" if total_chunks is None else f"{index + 1} of {total_chunks}"
+            try:
+                result = await task
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+                result = None
+                for retry in range(SETTINGS.get("CHUNK_MAX_RETRIES", 1)):
+                    if not _is_retryable_chunk_error(error):
+                        break
+                    print(f"Retrying chunk {chunk_label} after error: {error}")
+                    try:
+                        result = await run_chunk(chunk)
+                        break
+                    except Exception as retry_error:
+                        error = retry_error
+                if result is None:
+                    raise ChunkProcessingError(
+                        f"Failed to process chunk {chunk_label}. Error: {error}",
+                        {index: error}, {})
+            yield index, result, True
+            index += 1
+    finally:
+        for _, task in in_flight:
+            if not task.done():
+                task.cancel()
+
+async def _iter_processed_chunks(chunks: Iterable[str], provider_config: Dict[str, Any], model_name: str, processor: MarkdownPostProcessor,
+                                 cancelled: bool, from_file: bool = False) -> AsyncIterator[Tuple[int, str, bool]]:
+    """Runs add-links over `chunks` and yields (index, processed_text, chunk_done)."""
+    started_index = -1
+    async for index, llm_response, chunk_done in _iter_chunk_responses(chunks, provider_config, model_name, get_llm_processing_prompt(), cancelled, from_file):
+        if index != started_index:
+            llm_response = llm_response if index == 0 else "\n\n" + llm_response
+            started_index = index
+        yield index, processor.feed(llm_response), chunk_done
+
+async def process_content_stream(content: str, cancelled: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    provider_config = get_provider_for_task("addLinks")
+    if not provider_config:
+        raise ValueError(f"Active provider not found in settings.")
+    model_name = get_model_for_task("addLinks", provider_config)
+    chunks = split_content(content, None, provider_config, model_name)
+
+    total_chunks = len(chunks)
+    yield {"event": "start", "total_chunks": total_chunks, "provider": provider_config["name"], "model": model_name}
+
+    # One post-processor for the whole stream, so the concatenated chunk
+    # contents are identical to the non-streamed result. A chunk may arrive
+    # in several "chunk" events as its tokens stream in.
+    processor = create_add_links_postprocessor()
+    tokens_so_far = 0
+    completed = 0
+
+    async for index, processed_text, chunk_done in _iter_processed_chunks(chunks, provider_config, model_name, processor, cancelled):
+        tokens_so_far += estimate_tokens(processed_text)
+        if processed_text:
+            yield {"event": "chunk", "index": index, "total_chunks": total_chunks, "content": processed_text}
+        if chunk_done:
+            completed += 1
+            yield {"event": "progress", "completed_chunks": completed, "total_chunks": total_chunks, "tokens_so_far": tokens_so_far}
+
+    remaining_text = processor.finish()
+    if remaining_text:
+        tokens_so_far += estimate_tokens(remaining_text)
+        yield {"event": "chunk", "index": max(total_chunks - 1, 0), "total_chunks": total_chunks, "content": remaining_text}
+    report_postprocessor_duplicates(processor)
+
+    yield {"event": "done", "total_chunks": total_chunks, "tokens": tokens_so_far}
+
+async def generate_content_for_title_stream(title: str, cancelled: bool = False) -> AsyncIterator[Dict[str, Any]]:
+    print(f"Starting streamed content generation for: {title}")
+    yield {"event": "start", "title": title, "total_chunks": 1}
+    if SETTINGS.get("ENABLE_RESEARCH_IN_GENERATE_CONTENT", False):
+        yield {"event": "progress", "stage": "research", "completed_chunks": 0, "total_chunks": 1, "tokens_so_far": 0}
 
-async def handle_file_rename(old_path: str, new_path: str):
-    old_name = os.path.splitext(os.path.basename(old_path))[0]
-    new_name = os.path.splitext(os.path.basename(new_path))[0]
+    provider_config, model_name, generation_prompt = await _prepare_title_generation(title, cancelled)
 
-    if not old_name or not new_name or old_name == new_name:
-        return
+    if cancelled: raise Exception("Processing cancelled by user before API call.")
+    yield {"event": "progress", "stage": "generate", "completed_chunks": 0, "total_chunks": 1, "tokens_so_far": 0,
+           "provider": provider_config["name"], "model": model_name}
 
-    print(f"Updating links for renamed file: {new_name}")
+    processor = MarkdownPostProcessor()
+    tokens = 0
+    async for delta in stream_llm_api(provider_config, model_name, generation_prompt, "", cancelled, "generateTitle"):
+        processed_text = processor.feed(delta)
+        if processed_text:
+            tokens += estimate_tokens(processed_text)
+            yield {"event": "chunk", "index": 0, "total_chunks": 1, "content": processed_text}
+
+    if cancelled: raise Exception("Processing cancelled by user after API call.")
+    remaining_text = processor.finish()
+    if remaining_text:
+        tokens += estimate_tokens(remaining_text)
+        yield {"event": "chunk", "index": 0, "total_chunks": 1, "content": remaining_text}
+    yield {"event": "progress", "stage": "generate", "completed_chunks": 1, "total_chunks": 1, "tokens_so_far": tokens}
+    yield {"event": "done", "total_chunks": 1, "tokens": tokens}
+
+# --- File Utilities ---
 
-    link_regex = re.compile(r'\[\[{}\]\]'.format(re.escape(old_name)))
+# --- Wikilink Index ---
+# Matches [[target]], [[target|alias]], [[target#heading]] and embeds; group 1 is the
+# target, group 2 the #heading and |alias suffix.
+_WIKILINK_TARGET_REGEX = re.compile(r'\[\[([^\]\|#\n]*)([^\]\n]*)\]\]')
+
+def extract_wikilink_targets(content: str) -> set:
+    targets = set()
+    for match in _WIKILINK_TARGET_REGEX.finditer(content):
+        target = match.group(1).strip()
+        if target:
+            # Index by note name so that [[folder/Note]] is found for "Note" as well.
+            targets.add(target.rsplit('/', 1)[-1].lower())
+    return targets
+
+class WikilinkIndex:
+    """Persisted inverted index from wikilink target to the notes that reference it."""
+    VERSION = 1
+
+    def __init__(self, vault_root: str, index_path: str):
+        self.vault_root = vault_root
+        self.index_path = index_path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.targets: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != self.VERSION or data.get("vault_root") != self.vault_root:
+                print("Wikilink index belongs to another vault or version. Rebuilding.")
+                return
+            for rel_path, record in data.get("files", {}).items():
+                self._set_record(rel_path, record["mtime"], record["size"], set(record["targets"]))
+            print(f"Loaded wikilink index with {len(self.files)} files.")
+        except Exception as e:
+            print(f"Error loading wikilink index from {self.index_path}: {e}. Rebuilding.")
+            self.files, self.targets = {}, {}
+
+    def save(self) -> None:
+        with self._lock:
+            if not self.index_path or not self._dirty:
+                return
+            data = {
+                "version": self.VERSION,
+                "vault_root": self.vault_root,
+                "files": {rel_path: {"mtime": r["mtime"], "size": r["size"], "targets": sorted(r["targets"])} for rel_path, r in self.files.items()},
+            }
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.index_path)), exist_ok=True)
+                temp_path = f"{self.index_path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(temp_path, self.index_path)
+                self._dirty = False
+            except Exception as e:
+                print(f"Error saving wikilink index to {self.index_path}: {e}")
+
+    def _set_record(self, rel_path: str, mtime: float, size: int, targets: set) -> None:
+        self._drop_record(rel_path)
+        self.files[rel_path] = {"mtime": mtime, "size": size, "targets": targets}
+        for target in targets:
+            self.targets.setdefault(target, set()).add(rel_path)
+
+    def _drop_record(self, rel_path: str) -> None:
+        record = self.files.pop(rel_path, None)
+        if record is None:
+            return
+        for target in record["targets"]:
+            referencing = self.targets.get(target)
+            if referencing is not None:
+                referencing.discard(rel_path)
+                if not referencing:
+                    del self.targets[target]
+
+    def refresh(self) -> Dict[str, int]:
+        """Re-indexes files that were added, changed or removed since the last refresh."""
+        stats = {"scanned": 0, "reindexed": 0, "removed": 0}
+        with self._lock:
+            seen = set()
+            for root, _, files in os.walk(self.vault_root):
+                for file in files:
+                    if not file.endswith(".md"):
+                        continue
+                    file_path = os.path.join(root, file)
+                    rel_path = os.path.relpath(file_path, self.vault_root)
+                    seen.add(rel_path)
+                    stats["scanned"] += 1
+                    try:
+                        stat = os.stat(file_path)
+                        record = self.files.get(rel_path)
+                        if record is not None and record["mtime"] == stat.st_mtime and record["size"] == stat.st_size:
+                            continue
+                        with open(file_path, 'r', encoding='utf-8') as f:
+                            content = f.read()
+                        self._set_record(rel_path, stat.st_mtime, stat.st_size, extract_wikilink_targets(content))
+                        stats["reindexed"] += 1
+                    except Exception as e:
+                        print(f"Error indexing wikilinks in {file_path}: {e}")
+            for rel_path in [p for p in self.files if p not in seen]:
+                self._drop_record(rel_path)
+                stats["removed"] += 1
+            if stats["reindexed"] or stats["removed"]:
+                self._dirty = True
+        return stats
+
+    def update_file(self, file_path: str, content: str) -> None:
+        """Records new content for a file the server has just written."""
+        rel_path = os.path.relpath(file_path, self.vault_root)
+        with self._lock:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                self._drop_record(rel_path)
+            else:
+                self._set_record(rel_path, stat.st_mtime, stat.st_size, extract_wikilink_targets(content))
+            self._dirty = True
+
+    def files_linking_to(self, name: str) -> List[str]:
+        with self._lock:
+            rel_paths = sorted(self.targets.get(name.lower(), ()))
+        return [os.path.join(self.vault_root, rel_path) for rel_path in rel_paths]
+
+_WIKILINK_INDEX: Optional[WikilinkIndex] = None
+
+def get_wikilink_index() -> WikilinkIndex:
+    global _WIKILINK_INDEX
+    vault_root = SETTINGS["VAULT_ROOT"]
+    index_path = SETTINGS.get("WIKILINK_INDEX_PATH", "")
+    if _WIKILINK_INDEX is None or _WIKILINK_INDEX.vault_root != vault_root or _WIKILINK_INDEX.index_path != index_path:
+        _WIKILINK_INDEX = WikilinkIndex(vault_root, index_path)
+    return _WIKILINK_INDEX
+
+def _find_files_linking_to(names: Iterable[str]) -> List[str]:
+    """Returns the vault notes that may contain a link to any of `names`."""
+    if not SETTINGS.get("ENABLE_WIKILINK_INDEX", True):
+        file_paths = []
+        for root, _, files in os.walk(SETTINGS["VAULT_ROOT"]):
+            for file in files:
+                if file.endswith(".md"):
+                    file_paths.append(os.path.join(root, file))
+        return file_paths
+    index = get_wikilink_index()
+    stats = index.refresh()
+    print(f"Wikilink index refreshed: {stats['scanned']} files checked, {stats['reindexed']} re-indexed, {stats['removed']} removed.")
+    return sorted({file_path for name in names for file_path in index.files_linking_to(name)})
+
+def _record_rewritten_file(file_path: str, content: str) -> None:
+    if SETTINGS.get("ENABLE_WIKILINK_INDEX", True):
+        get_wikilink_index().update_file(file_path, content)
+
+def _save_wikilink_index() -> None:
+    if SETTINGS.get("ENABLE_WIKILINK_INDEX", True):
+        get_wikilink_index().save()
+
+def rewrite_renamed_links(content: str, renames: Dict[str, str]) -> str:
+    """Points links to each old name in `renames` at its new name, all in one pass."""
+    # One substitution for all renames, so A -> B together with B -> C does not turn [[A]] into [[C]].
+    def replace(match: re.Match) -> str:
+        new_name = renames.get(match.group(1).strip())
+        return match.group(0) if new_name is None else f"[[{new_name}{match.group(2)}]]"
+    return _WIKILINK_TARGET_REGEX.sub(replace, content)
+
+def delete_link_regex(file_name: str) -> re.Pattern:
+    return re.compile(r'\[\[{}\]\]'.format(re.escape(file_name)), re.IGNORECASE)
+
+def remove_deleted_links(content: str, link_regex: re.Pattern) -> str:
+    """Drops the links matched by delete_link_regex() and the list items they empty."""
+    updated_content = re.sub(link_regex, '', content)
+    updated_content = re.sub(r'^[ \t]*[-*+]\s*$', '', updated_content, flags=re.MULTILINE)
+    return re.sub(r'\n{3,}', '\n\n', updated_content).strip()
+
+def _rename_map(renames: List[Tuple[str, str]]) -> Dict[str, str]:
+    """Maps old note names to new ones for (old_path, new_path) pairs, skipping no-op renames."""
+    name_map: Dict[str, str] = {}
+    for old_path, new_path in renames:
+        old_name = os.path.splitext(os.path.basename(old_path))[0]
+        new_name = os.path.splitext(os.path.basename(new_path))[0]
+        if not old_name or not new_name or old_name == new_name:
+            continue
+        if name_map.get(old_name, new_name) != new_name:
+            raise ValueError(f"Conflicting renames for \"{old_name}\": \"{name_map[old_name]}\" and \"{new_name}\"")
+        name_map[old_name] = new_name
+    return name_map
+
+# Held while rename and delete rewrite links, so overlapping requests cannot
+# read-modify-write the same note and drop each other's edits.
+_VAULT_REWRITE_LOCK = threading.Lock()
+
+def _rewrite_vault_links(operation: str, names: Iterable[str], rewrite) -> Tuple[int, List[str]]:
+    """Applies `rewrite` to the notes that may link to `names`; returns the count and errors."""
     updated_count = 0
     errors = []
-
-    for root, _, files in os.walk(SETTINGS["VAULT_ROOT"]):
-        for file in files:
-            if file.endswith(".md"):
-                file_path = os.path.join(root, file)
-                if file_path == new_path: continue
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    if re.search(link_regex, content):
-                        updated_content = re.sub(link_regex, f"[[{new_name}]]", content)
-                        if content != updated_content:
-                            with open(file_path, 'w', encoding='utf-8') as f:
-                                f.write(updated_content)
-                            updated_count += 1
-                except Exception as e:
-                    error_msg = f"Error updating links in {file_path} for rename: {e}"
-                    print(error_msg)
-                    errors.append(error_msg)
-    
-    print(f"Updated links to \"{new_name}\" in {updated_count} files.")
+    with _VAULT_REWRITE_LOCK:
+        for file_path in _find_files_linking_to(names):
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+                VAULT_FILES_SCANNED.labels(operation).inc()
+                updated_content = rewrite(content)
+                if content != updated_content:
+                    with open(file_path, 'w', encoding='utf-8') as f:
+                        f.write(updated_content)
+                    _record_rewritten_file(file_path, updated_content)
+                    VAULT_FILES_WRITTEN.labels(operation).inc()
+                    updated_count += 1
+            except Exception as e:
+                error_msg = f"Error updating links in {file_path} for {operation}: {e}"
+                print(error_msg)
+                errors.append(error_msg)
+        _save_wikilink_index()
+    return updated_count, errors
+
+async def handle_file_renames(renames: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """Updates the links for many renamed files in a single pass over the vault."""
+    name_map = _rename_map(renames)
+    if not name_map:
+        return {"renamed_count": 0, "updated_count": 0, "errors": []}
+
+    print(f"Updating links for {len(name_map)} renamed files.")
+
+    updated_count, errors = await asyncio.to_thread(_rewrite_vault_links, "rename", list(name_map), lambda content: rewrite_renamed_links(content, name_map))
+
+    print(f"Updated links in {updated_count} files.")
     if errors:
         print(f"Encountered {len(errors)} errors while updating links.")
+    return {"renamed_count": len(name_map), "updated_count": updated_count, "errors": errors}
+
+async def handle_file_rename(old_path: str, new_path: str):
+    await handle_file_renames([(old_path, new_path)])
 
 async def handle_file_delete(path: str):
     file_name = os.path.splitext(os.path.basename(path))[0]
@@ -715,61 +2942,611 @@ async def handle_file_delete(path: str):
 
     print(f"Removing links for deleted file: {file_name}")
 
-    link_regex = re.compile(r'\[\[{}\]\]'.format(re.escape(file_name)), re.IGNORECASE)
-    updated_count = 0
-    errors = []
-
-    for root, _, files in os.walk(SETTINGS["VAULT_ROOT"]):
-        for file in files:
-            if file.endswith(".md"):
-                file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    updated_content = re.sub(link_regex, '', content)
-                    updated_content = re.sub(r'^[ \t]*[-*+]\s*$', '', updated_content, flags=re.MULTILINE)
-                    updated_content = re.sub(r'\n{3,}', '\n\n', updated_content).strip()
-
-                    if content != updated_content:
-                        with open(file_path, 'w', encoding='utf-8') as f:
-                            f.write(updated_content)
-                        updated_count += 1
-                except Exception as e:
-                    error_msg = f"Error removing links from {file_path} for delete: {e}"
-                    print(error_msg)
-                    errors.append(error_msg)
+    link_regex = delete_link_regex(file_name)
+    updated_count, errors = await asyncio.to_thread(_rewrite_vault_links, "delete", [file_name], lambda content: remove_deleted_links(content, link_regex))
 
     print(f"Removed links to \"{file_name}\" from {updated_count} files.")
     if errors:
         print(f"Encountered {len(errors)} errors while removing links.")
 
-async def batch_fix_mermaid_syntax_in_folder(folder_path: str):
-    if not os.path.isdir(folder_path):
-        raise ValueError(f"Selected path is not a valid folder: {folder_path}")
+# --- Batch Fix Manifest ---
+# Bump when cleanup_latex_delimiters or refine_mermaid_blocks change behaviour,
+# so files recorded as already fixed are checked again.
+MERMAID_FIX_MANIFEST_VERSION = 1
 
-    modified_count = 0
-    errors = []
+def _load_fix_manifest() -> Dict[str, Dict[str, Any]]:
+    manifest_path = SETTINGS.get("MERMAID_FIX_MANIFEST_PATH", "")
+    if not manifest_path or not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("version") != MERMAID_FIX_MANIFEST_VERSION:
+            print("Batch fix manifest was written by another fixer version. Ignoring it.")
+            return {}
+        return data.get("files", {})
+    except Exception as e:
+        print(f"Error loading batch fix manifest from {manifest_path}: {e}. Ignoring it.")
+        return {}
+
+def _save_fix_manifest(files: Dict[str, Dict[str, Any]]) -> None:
+    manifest_path = SETTINGS.get("MERMAID_FIX_MANIFEST_PATH", "")
+    if not manifest_path:
+        return
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(manifest_path)), exist_ok=True)
+        temp_path = f"{manifest_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": MERMAID_FIX_MANIFEST_VERSION, "files": files}, f)
+        os.replace(temp_path, manifest_path)
+    except Exception as e:
+        print(f"Error saving batch fix manifest to {manifest_path}: {e}")
+
+def _content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def _manifest_record(file_path: str, content: str) -> Dict[str, Any]:
+    stat = os.stat(file_path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size, "hash": _content_hash(content)}
+
+# --- Parallel Batch Fix Engine ---
+# The fixes are pure CPU-bound string functions, so files are spread across a
+# process pool (or a worker thread for small jobs) to keep the event loop free.
+_FIX_PROCESS_POOL: Optional[ProcessPoolExecutor] = None
+_FIX_BATCH_SIZE = 32
+
+def get_batch_fix_workers() -> int:
+    workers = SETTINGS.get("BATCH_FIX_WORKERS", 0)
+    return max(1, workers or (os.cpu_count() or 1))
+
+def _get_fix_process_pool() -> ProcessPoolExecutor:
+    global _FIX_PROCESS_POOL
+    if _FIX_PROCESS_POOL is None:
+        _FIX_PROCESS_POOL = ProcessPoolExecutor(max_workers=get_batch_fix_workers())
+    return _FIX_PROCESS_POOL
+
+def shutdown_batch_fix_pool() -> None:
+    global _FIX_PROCESS_POOL
+    if _FIX_PROCESS_POOL is not None:
+        _FIX_PROCESS_POOL.shutdown(wait=True, cancel_futures=True)
+        _FIX_PROCESS_POOL = None
+
+def _fix_markdown_file(file_path: str, known_hash: Optional[str], dry_run: bool, diff_label: str) -> Dict[str, Any]:
+    with open(file_path, 'r', encoding='utf-8') as f:
+        original_content = f.read()
+
+    # Touched but unchanged files only need their manifest stat refreshed.
+    if known_hash is not None and known_hash == _content_hash(original_content):
+        return {"file": file_path, "skipped": True, "record": _manifest_record(file_path, original_content)}
+
+    processed_content = cleanup_latex_delimiters(original_content)
+    processed_content = refine_mermaid_blocks(processed_content)
+
+    if processed_content.strip() == original_content.strip():
+        return {"file": file_path, "modified": False, "record": _manifest_record(file_path, original_content)}
+    if dry_run:
+        diff = difflib.unified_diff(
+            original_content.splitlines(keepends=True), processed_content.splitlines(keepends=True),
+            fromfile=f"a/{diff_label}", tofile=f"b/{diff_label}")
+        return {"file": file_path, "modified": True, "diff": ''.join(diff)}
+
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(processed_content)
+    return {"file": file_path, "modified": True, "record": _manifest_record(file_path, processed_content)}
+
+def _fix_markdown_files(jobs: List[Tuple[str, Optional[str], str]], dry_run: bool) -> List[Dict[str, Any]]:
+    results = []
+    for file_path, known_hash, diff_label in jobs:
+        try:
+            results.append(_fix_markdown_file(file_path, known_hash, dry_run, diff_label))
+        except Exception as e:
+            results.append({"file": file_path, "error": str(e)})
+    return results
 
+async def _run_fix_jobs(jobs: List[Tuple[str, Optional[str], str]], dry_run: bool) -> List[Dict[str, Any]]:
+    global _FIX_PROCESS_POOL
+    if get_batch_fix_workers() <= 1 or len(jobs) <= _FIX_BATCH_SIZE:
+        return await asyncio.to_thread(_fix_markdown_files, jobs, dry_run)
+
+    loop = asyncio.get_running_loop()
+    batches = [jobs[i:i + _FIX_BATCH_SIZE] for i in range(0, len(jobs), _FIX_BATCH_SIZE)]
+    try:
+        pool = _get_fix_process_pool()
+        batch_results = await asyncio.gather(*(loop.run_in_executor(pool, _fix_markdown_files, batch, dry_run) for batch in batches))
+    except BrokenProcessPool as e:
+        print(f"Batch fix process pool failed ({e}). Falling back to a single worker thread.")
+        _FIX_PROCESS_POOL = None
+        return await asyncio.to_thread(_fix_markdown_files, jobs, dry_run)
+    return [result for batch in batch_results for result in batch]
+
+def _collect_fix_jobs(folder_path: str, manifest: Dict[str, Dict[str, Any]], force: bool) -> Tuple[List[Tuple[str, Optional[str], str]], int, int]:
+    jobs = []
+    skipped_count = 0
+    scanned_count = 0
     for root, _, files in os.walk(folder_path):
         for file in files:
             if file.endswith(".md"):
                 file_path = os.path.join(root, file)
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        original_content = f.read()
-                    
-                    processed_content = cleanup_latex_delimiters(original_content)
-                    processed_content = refine_mermaid_blocks(processed_content)
-
-                    if processed_content.strip() != original_content.strip():
-                        with open(file_path, 'w', encoding='utf-8') as f:
-                            f.write(processed_content)
-                        modified_count += 1
-                        print(f"Fixed syntax in: {file_path}")
-                except Exception as e:
-                    error_msg = f"Error fixing syntax in {file_path}: {e}"
-                    print(error_msg)
-                    errors.append({"file": file_path, "message": str(e)})
-    
-    return {"errors": errors, "modified_count": modified_count}
+                scanned_count += 1
+                record = None if force else manifest.get(os.path.abspath(file_path))
+                if record is not None:
+                    try:
+                        stat = os.stat(file_path)
+                        if record["mtime"] == stat.st_mtime and record["size"] == stat.st_size:
+                            skipped_count += 1
+                            continue
+                    except OSError:
+                        pass
+                diff_label = os.path.relpath(file_path, folder_path).replace(os.sep, '/')
+                jobs.append((file_path, record["hash"] if record else None, diff_label))
+    return jobs, skipped_count, scanned_count
+
+async def batch_fix_mermaid_syntax_in_folder(folder_path: str, force: bool = False, dry_run: bool = False):
+    if not os.path.isdir(folder_path):
+        raise ValueError(f"Selected path is not a valid folder: {folder_path}")
+
+    modified_count = 0
+    errors = []
+    diffs = []
+    use_manifest = SETTINGS.get("ENABLE_MERMAID_FIX_MANIFEST", True)
+    manifest = _load_fix_manifest() if use_manifest else {}
+
+    jobs, skipped_count, scanned_count = await asyncio.to_thread(_collect_fix_jobs, folder_path, manifest, force)
+    if jobs:
+        print(f"Checking {len(jobs)} files with up to {get_batch_fix_workers()} workers{' (dry run)' if dry_run else ''}...")
+    results = await _run_fix_jobs(jobs, dry_run) if jobs else []
+
+    for result in results:
+        file_path = result["file"]
+        manifest_key = os.path.abspath(file_path)
+        if "error" in result:
+            manifest.pop(manifest_key, None)
+            error_msg = f"Error fixing syntax in {file_path}: {result['error']}"
+            print(error_msg)
+            errors.append({"file": file_path, "message": result["error"]})
+            continue
+        if result.get("skipped"):
+            skipped_count += 1
+        elif result.get("modified"):
+            modified_count += 1
+            if dry_run:
+                diffs.append({"file": file_path, "diff": result["diff"]})
+            else:
+                print(f"Fixed syntax in: {file_path}")
+        if use_manifest and "record" in result:
+            manifest[manifest_key] = result["record"]
+
+    VAULT_FILES_SCANNED.labels("batch_fix").inc(len(jobs))
+    if not dry_run:
+        VAULT_FILES_WRITTEN.labels("batch_fix").inc(modified_count)
+
+    # A dry run must leave no trace, including in the manifest.
+    if use_manifest and not dry_run:
+        _save_fix_manifest(manifest)
+    if skipped_count:
+        print(f"Skipped {skipped_count} unchanged files (already checked in a previous run).")
+
+    response = {"errors": errors, "modified_count": modified_count, "skipped_count": skipped_count, "scanned_count": scanned_count}
+    if dry_run:
+        response["dry_run"] = True
+        response["diffs"] = diffs
+    return response
+
+# --- Batch Jobs ---
+JOB_TASKS = ("process_content", "generate_title")
+
+def resolve_vault_path(relative_path: str) -> str:
+    """Absolute path of a note relative to VAULT_ROOT; rejects paths outside the vault."""
+    vault_root = os.path.realpath(SETTINGS["VAULT_ROOT"])
+    full_path = os.path.realpath(os.path.join(vault_root, relative_path))
+    if os.path.commonpath([vault_root, full_path]) != vault_root:
+        raise ValueError(f"Path is outside the vault: {relative_path}")
+    return full_path
+
+def _process_alive(owner: Optional[str]) -> bool:
+    # os.kill() would terminate the process on Windows, where workers are not shared anyway.
+    if not owner or not owner.isdigit() or os.name == "nt":
+        return False
+    if int(owner) == os.getpid():
+        return False  # A previous run that had our PID; nothing in this process has claimed items yet.
+    try:
+        os.kill(int(owner), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+class JobStore:
+    """Persistent SQLite queue of batch jobs, shared by the server workers."""
+    def __init__(self, path: str):
+        self.owner = str(os.getpid())
+        if path and path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, task TEXT NOT NULL, created_at REAL NOT NULL, cancelled INTEGER NOT NULL DEFAULT 0)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS job_items (job_id TEXT NOT NULL, item_index INTEGER NOT NULL, input TEXT NOT NULL, is_path INTEGER NOT NULL, status TEXT NOT NULL, result TEXT, error TEXT, started_at REAL, finished_at REAL, PRIMARY KEY (job_id, item_index))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS job_items_status ON job_items (status)")
+        if "owner" not in {row["name"] for row in self._db.execute("PRAGMA table_info(job_items)")}:
+            self._db.execute("ALTER TABLE job_items ADD COLUMN owner TEXT")
+        requeued = self.requeue_orphaned()
+        if requeued:
+            print(f"Re-queued {requeued} job item(s) interrupted by the last shutdown.")
+
+    def requeue_running(self) -> int:
+        """Queues this process's running items again."""
+        with self._lock:
+            return self._db.execute("UPDATE job_items SET status = 'queued', started_at = NULL, owner = NULL WHERE status = 'running' AND owner = ?", (self.owner,)).rowcount
+
+    def requeue_orphaned(self) -> int:
+        """Queues running items again whose process no longer exists."""
+        with self._lock:
+            owners = [row["owner"] for row in self._db.execute("SELECT DISTINCT owner FROM job_items WHERE status = 'running'")]
+            orphaned = [owner for owner in owners if not _process_alive(owner)]
+            return sum(self._db.execute("UPDATE job_items SET status = 'queued', started_at = NULL, owner = NULL WHERE status = 'running' AND owner IS ?", (owner,)).rowcount
+                       for owner in orphaned)
+
+    def create_job(self, task: str, items: List[Tuple[str, bool]]) -> str:
+        job_id = os.urandom(8).hex()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("INSERT INTO jobs (id, task, created_at) VALUES (?, ?, ?)", (job_id, task, time.time()))
+                self._db.executemany(
+                    "INSERT INTO job_items (job_id, item_index, input, is_path, status) VALUES (?, ?, ?, ?, 'queued')",
+                    [(job_id, index, item_input, int(is_path)) for index, (item_input, is_path) in enumerate(items)])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim_next_item(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT job_items.rowid, job_id, item_index, input, is_path, task FROM job_items JOIN jobs ON jobs.id = job_items.job_id "
+                    "WHERE status = 'queued' ORDER BY job_items.rowid LIMIT 1").fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE job_items SET status = 'running', started_at = ?, owner = ? WHERE rowid = ?", (time.time(), self.owner, row["rowid"]))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"job_id": row["job_id"], "item_index": row["item_index"], "input": row["input"], "is_path": bool(row["is_path"]), "task": row["task"]}
+
+    def finish_item(self, job_id: str, item_index: int, status: str, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._db.execute("UPDATE job_items SET status = ?, result = ?, error = ?, finished_at = ? WHERE job_id = ? AND item_index = ?",
+                             (status, result, error, time.time(), job_id, item_index))
+
+    def cancel_job(self, job_id: str) -> bool:
+        """Marks the job cancelled and drops its queued items."""
+        with self._lock:
+            if self._db.execute("UPDATE jobs SET cancelled = 1 WHERE id = ?", (job_id,)).rowcount == 0:
+                return False
+            self._db.execute("UPDATE job_items SET status = 'cancelled', error = 'Cancelled', finished_at = ? WHERE job_id = ? AND status = 'queued'",
+                             (time.time(), job_id))
+            return True
+
+    def _summarize(self, job: sqlite3.Row) -> Dict[str, Any]:
+        counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0, "cancelled": 0}
+        for row in self._db.execute("SELECT status, COUNT(*) AS count FROM job_items WHERE job_id = ? GROUP BY status", (job["id"],)):
+            counts[row["status"]] = row["count"]
+        pending = counts["queued"] + counts["running"]
+        if job["cancelled"]:
+            status = "cancelling" if counts["running"] else "cancelled"
+        elif pending == 0:
+            status = "completed" if not counts["failed"] else ("failed" if not counts["completed"] else "completed_with_errors")
+        else:
+            status = "queued" if counts["queued"] == sum(counts.values()) else "running"
+        return {"job_id": job["id"], "task": job["task"], "status": status, "created_at": job["created_at"],
+                "total_items": sum(counts.values()), "item_counts": counts}
+
+    @staticmethod
+    def _format_item(task: str, row: sqlite3.Row) -> Dict[str, Any]:
+        item = {"index": row["item_index"]}
+        if row["is_path"]:
+            item["path"] = row["input"]
+        elif task == "generate_title":
+            item["title"] = row["input"]
+        item.update(status=row["status"], result=row["result"], error=row["error"],
+                    started_at=row["started_at"], finished_at=row["finished_at"])
+        return item
+
+    def get_job(self, job_id: str, include_items: bool = False, offset: int = 0, limit: int = 100) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            summary = self._summarize(job)
+            if include_items:
+                rows = self._db.execute(
+                    "SELECT item_index, input, is_path, status, result, error, started_at, finished_at FROM job_items "
+                    "WHERE job_id = ? ORDER BY item_index LIMIT ? OFFSET ?", (job_id, limit, offset)).fetchall()
+                summary["items"] = [self._format_item(job["task"], row) for row in rows]
+            return summary
+
+    def list_jobs(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = self._db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ? OFFSET ?", (limit, offset)).fetchall()
+            return [self._summarize(job) for job in jobs]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+async def _run_job_item(item: Dict[str, Any]) -> str:
+    with settings_snapshot():
+        if item["task"] == "generate_title":
+            return await generate_content_for_title(item["input"])
+        content = item["input"]
+        if item["is_path"]:
+            def read_note() -> str:
+                with open(resolve_vault_path(item["input"]), 'r', encoding='utf-8') as f:
+                    return f.read()
+            content = await asyncio.to_thread(read_note)
+        return await process_content(content)
+
+class JobWorkerPool:
+    """Asyncio workers draining a JobStore."""
+    def __init__(self, store: JobStore, worker_count: int, poll_interval: float):
+        self.store = store
+        self.worker_count = max(1, worker_count)
+        self.poll_interval = poll_interval
+        self._workers: List[asyncio.Task] = []
+        self._running_items: Dict[Tuple[str, int], asyncio.Task] = {}
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def start(self) -> None:
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def cancel_running_items(self, job_id: str) -> int:
+        tasks = [task for (item_job_id, _), task in self._running_items.items() if item_job_id == job_id]
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Interrupted items run again on the next start.
+        await asyncio.to_thread(self.store.requeue_running)
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                # Clear before claiming so a submission in between is not missed.
+                self._wakeup.clear()
+                item = await asyncio.to_thread(self.store.claim_next_item)
+                if item is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process_item(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job worker error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _process_item(self, item: Dict[str, Any]) -> None:
+        key = (item["job_id"], item["item_index"])
+        item_task = asyncio.create_task(_run_job_item(item))
+        self._running_items[key] = item_task
+        result, error = None, None
+        try:
+            result = await item_task
+            status = "completed"
+        except asyncio.CancelledError:
+            if self._stopping:
+                raise
+            status, error = "cancelled", "Cancelled"
+        except Exception as e:
+            status, error = "failed", str(e)
+        finally:
+            self._running_items.pop(key, None)
+        await asyncio.to_thread(self.store.finish_item, item["job_id"], item["item_index"], status, result, error)
+
+_JOB_STORE: Optional[JobStore] = None
+_JOB_WORKER_POOL: Optional[JobWorkerPool] = None
+
+def get_job_store() -> JobStore:
+    global _JOB_STORE
+    if _JOB_STORE is None:
+        _JOB_STORE = JobStore(SETTINGS.get("JOB_QUEUE_PATH", ""))
+    return _JOB_STORE
+
+async def start_job_workers() -> None:
+    global _JOB_WORKER_POOL
+    if _JOB_WORKER_POOL is not None:
+        return
+    store = await asyncio.to_thread(get_job_store)
+    _JOB_WORKER_POOL = JobWorkerPool(store, SETTINGS.get("JOB_WORKERS", 4), SETTINGS.get("JOB_POLL_INTERVAL", 2))
+    _JOB_WORKER_POOL.start()
+
+async def stop_job_workers() -> None:
+    global _JOB_WORKER_POOL, _JOB_STORE
+    if _JOB_WORKER_POOL is not None:
+        await _JOB_WORKER_POOL.stop()
+        _JOB_WORKER_POOL = None
+    if _JOB_STORE is not None:
+        _JOB_STORE.close()
+        _JOB_STORE = None
+
+async def submit_job(task: str, items: List[Dict[str, Optional[str]]]) -> Dict[str, Any]:
+    """Queues a batch job of `process_content` or `generate_title` items."""
+    if task not in JOB_TASKS:
+        raise ValueError(f"Unsupported job task: {task}. Expected one of: {', '.join(JOB_TASKS)}")
+    if not items:
+        raise ValueError("A job needs at least one item.")
+    queued_items = []
+    for index, item in enumerate(items):
+        if task == "generate_title":
+            if not item.get("title"):
+                raise ValueError(f"Item {index} has no title.")
+            queued_items.append((item["title"], False))
+        elif item.get("path"):
+            if not os.path.isfile(resolve_vault_path(item["path"])):
+                raise ValueError(f"Item {index}: file not found in the vault: {item['path']}")
+            queued_items.append((item["path"], True))
+        elif item.get("content") is not None:
+            queued_items.append((item["content"], False))
+        else:
+            raise ValueError(f"Item {index} has neither content nor path.")
+
+    store = get_job_store()
+    job_id = await asyncio.to_thread(store.create_job, task, queued_items)
+    if _JOB_WORKER_POOL is not None:
+        _JOB_WORKER_POOL.notify()
+    return await asyncio.to_thread(store.get_job, job_id)
+
+async def cancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    store = get_job_store()
+    if not await asyncio.to_thread(store.cancel_job, job_id):
+        return None
+    if _JOB_WORKER_POOL is not None:
+        _JOB_WORKER_POOL.cancel_running_items(job_id)
+    return await asyncio.to_thread(store.get_job, job_id)
+
+# --- Vault File Processing ---
+# Add-links for notes read from disk rather than sent as JSON: the note is
+# chunked as it is read and the result is written chunk by chunk, so memory
+# stays proportional to the chunks in flight rather than the note.
+def processed_file_path(relative_path: str) -> str:
+    """Default output for a processed note, under PROCESSED_FILE_FOLDER."""
+    directory, file_name = os.path.split(os.path.normpath(relative_path))
+    stem, extension = os.path.splitext(file_name)
+    return os.path.join(SETTINGS.get("PROCESSED_FILE_FOLDER", "Processed"), directory, f"{stem}_processed{extension or '.md'}")
+
+def _observe_chunks(chunks: Iterable[str]):
+    count = 0
+    for chunk in chunks:
+        CHUNK_TOKENS.observe(estimate_tokens(chunk))
+        count += 1
+        yield chunk
+    CHUNKS_PER_DOCUMENT.observe(count)
+
+async def process_file(source: Iterable[str], output_path: str, cancelled: bool = False) -> Dict[str, Any]:
+    """Adds links to the note read from `source` and writes the result to `output_path`."""
+    provider_config = get_provider_for_task("addLinks")
+    if not provider_config:
+        raise ValueError(f"Active provider not found in settings.")
+    model_name = get_model_for_task("addLinks", provider_config)
+
+    target_path = resolve_vault_path(output_path)
+    temp_path = f"{target_path}.partial"
+    await asyncio.to_thread(os.makedirs, os.path.dirname(target_path), exist_ok=True)
+    token_budget = get_chunk_token_budget(get_llm_processing_prompt(), provider_config, model_name)
+    chunks = _observe_chunks(iter_file_chunks(source, token_budget, get_chunk_word_limit(provider_config, model_name)))
+    processor = create_add_links_postprocessor()
+    chunk_count = 0
+    written_characters = 0
+    pending_text: List[str] = []
+
+    output = await asyncio.to_thread(open, temp_path, 'w', encoding='utf-8')
+    try:
+        async for _, processed_text, chunk_done in _iter_processed_chunks(chunks, provider_config, model_name, processor, cancelled, from_file=True):
+            pending_text.append(processed_text)
+            if chunk_done:
+                chunk_count += 1
+                text, pending_text = ''.join(pending_text), []
+                written_characters += len(text)
+                await asyncio.to_thread(output.write, text)
+        text = ''.join(pending_text) + processor.finish()
+        written_characters += len(text)
+        await asyncio.to_thread(output.write, text)
+        await asyncio.to_thread(output.close)
+        await asyncio.to_thread(os.replace, temp_path, target_path)
+    except BaseException:
+        output.close()
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    report_postprocessor_duplicates(processor)
+    VAULT_FILES_WRITTEN.labels("process_file").inc()
+    print(f"Processed note written to {output_path} ({chunk_count} chunks).")
+    return {"output_path": output_path, "chunks": chunk_count, "characters": written_characters}
+
+async def process_vault_file(path: str, output_path: Optional[str] = None, cancelled: bool = False) -> Dict[str, Any]:
+    """process_file for a note given relative to VAULT_ROOT."""
+    source_path = resolve_vault_path(path)
+    output_path = output_path or processed_file_path(path)
+    if resolve_vault_path(output_path) == source_path:
+        raise ValueError("The output path must differ from the note being processed.")
+    if not await asyncio.to_thread(os.path.isfile, source_path):
+        raise ValueError(f"File not found in the vault: {path}")
+    source = await asyncio.to_thread(open, source_path, 'r', encoding='utf-8')
+    try:
+        VAULT_FILES_SCANNED.labels("process_file").inc()
+        result = await process_file(source, output_path, cancelled)
+    finally:
+        source.close()
+    return {"path": path, **result}
+
+# --- Settings Reload ---
+def _reset_llm_cache() -> None:
+    # Not closed: calls still holding the old cache finish with it.
+    global _LLM_CACHE
+    _LLM_CACHE = None
+
+def _reset_research_cache() -> None:
+    global _RESEARCH_CACHE
+    _RESEARCH_CACHE = None
+
+def _reset_batch_fix_pool() -> None:
+    global _FIX_PROCESS_POOL
+    if _FIX_PROCESS_POOL is not None:
+        # Running batch fixes keep their submitted work; new ones get a pool of the new size.
+        _FIX_PROCESS_POOL.shutdown(wait=False)
+        _FIX_PROCESS_POOL = None
+
+# Shared objects built from settings, with the setting names (or prefixes ending
+# in "_") they depend on. A reload drops them when one of those settings changed,
+# and the getters rebuild them on next use.
+_SETTINGS_DEPENDENTS: List[Tuple[Tuple[str, ...], Any]] = [
+    (("HTTP_",), retire_http_clients),
+    (("RATE_LIMITS", "RATE_LIMIT_HEADROOM", "DEFAULT_PROVIDERS"), _RATE_LIMITERS.clear),
+    (("RETRY_BUDGET_",), _RETRY_BUDGETS.clear),
+    (("CIRCUIT_BREAKER_",), _CIRCUIT_BREAKERS.clear),
+    (("LATENCY_WINDOW",), _LATENCY_TRACKERS.clear),
+    (("PROVIDER_CONCURRENCY", "CHUNK_CONCURRENCY"), _PROVIDER_SEMAPHORES.clear),
+    (("ENABLE_LLM_CACHE", "LLM_CACHE_"), _reset_llm_cache),
+    (("ENABLE_RESEARCH_CACHE", "RESEARCH_QUERY_CACHE_", "RESEARCH_URL_CACHE_"), _reset_research_cache),
+    (("BATCH_FIX_WORKERS",), _reset_batch_fix_pool),
+]
+
+# Settings only read when the server starts.
+RESTART_REQUIRED_SETTINGS = ("JOB_QUEUE_PATH", "JOB_WORKERS", "JOB_POLL_INTERVAL")
+
+def _matches_setting(name: str, patterns: Tuple[str, ...]) -> bool:
+    return any(name.startswith(pattern) if pattern.endswith("_") else name == pattern for pattern in patterns)
+
+def reload_settings(settings_dict: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Swaps in a new settings snapshot without interrupting running requests."""
+    previous = _SETTINGS_SNAPSHOT
+    changed = sorted(name for name in set(previous) | set(settings_dict) if previous.get(name) != settings_dict.get(name))
+    set_settings(settings_dict)
+    for patterns, reset in _SETTINGS_DEPENDENTS:
+        if any(_matches_setting(name, patterns) for name in changed):
+            reset()
+    restart_required = [name for name in changed if name in RESTART_REQUIRED_SETTINGS]
+    print(f"Settings reloaded: {len(changed)} changed" + (f", restart required for {', '.join(restart_required)}." if restart_required else "."))
+    return {"changed": changed, "restart_required": restart_required}
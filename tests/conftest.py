@@ -0,0 +1,189 @@
+import asyncio
+import copy
+import json
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import httpx
+import pytest
+
+import main  # Loads config.py, as the server does.
+import notemd_core
+
+_INITIAL_SETTINGS = notemd_core.current_settings()
+
+def _reset_core_state() -> None:
+    """Drops the shared objects notemd_core builds lazily, so every test starts cold."""
+    notemd_core.close_llm_cache()
+    notemd_core.shutdown_batch_fix_pool()
+    if notemd_core._JOB_STORE is not None:
+        notemd_core._JOB_STORE.close()
+    notemd_core._JOB_STORE = None
+    notemd_core._JOB_WORKER_POOL = None
+    notemd_core._RESEARCH_CACHE = None
+    notemd_core._WIKILINK_INDEX = None
+    for registry in (notemd_core._RATE_LIMITERS, notemd_core._RETRY_BUDGETS, notemd_core._CIRCUIT_BREAKERS,
+                     notemd_core._LATENCY_TRACKERS, notemd_core._PROVIDER_SEMAPHORES, notemd_core._PROVIDER_SEMAPHORE_LOOPS,
+                     notemd_core._FLIGHTS, notemd_core._OPERATIONS, notemd_core._HTTP_CLIENTS, notemd_core._HTTP_CLIENT_LOOPS):
+        registry.clear()
+    notemd_core._RETIRED_HTTP_CLIENTS.clear()
+    for name in notemd_core._ROUTING_STATS:
+        notemd_core._ROUTING_STATS[name] = 0
+
+@pytest.fixture(autouse=True)
+def isolated_core():
+    _reset_core_state()
+    yield
+    _reset_core_state()
+    notemd_core.set_settings(_INITIAL_SETTINGS)
+
+@pytest.fixture
+def vault(tmp_path):
+    path = tmp_path / "vault"
+    path.mkdir()
+    return path
+
+@pytest.fixture
+def settings(tmp_path, vault) -> Callable[..., Dict[str, Any]]:
+    """Installs config.py's settings with everything on disk moved into tmp_path
+    and no waiting between retries. Call it with overrides to install a new
+    snapshot; overrides accumulate across calls."""
+    providers = copy.deepcopy(main.build_settings()["DEFAULT_PROVIDERS"])
+    for provider in providers:
+        provider["apiKey"] = "test-key"
+        provider["baseUrl"] = provider["baseUrl"] or "https://azure.example.test"
+    current = {
+        **main.build_settings(),
+        "DEFAULT_PROVIDERS": providers,
+        "ACTIVE_PROVIDER": "OpenAI",
+        "VAULT_ROOT": str(vault),
+        "WIKILINK_INDEX_PATH": str(tmp_path / "cache" / "wikilink_index.json"),
+        "MERMAID_FIX_MANIFEST_PATH": str(tmp_path / "cache" / "mermaid_fix_manifest.json"),
+        "ENABLE_LLM_CACHE": False,
+        "LLM_CACHE_PATH": "",
+        "JOB_QUEUE_PATH": "",
+        "ENABLE_STABLE_API_CALL": False,
+        "API_CALL_INTERVAL": 0,
+        "BATCH_FIX_WORKERS": 1,
+    }
+
+    def configure(**overrides: Any) -> Dict[str, Any]:
+        current.update(overrides)
+        snapshot = dict(current)
+        notemd_core.set_settings(snapshot)
+        return snapshot
+
+    configure()
+    return configure
+
+@pytest.fixture
+def provider(settings) -> Callable[[str], Dict[str, Any]]:
+    """Looks up a configured provider entry by name."""
+    return lambda name: next(p for p in notemd_core.SETTINGS["DEFAULT_PROVIDERS"] if p["name"] == name)
+
+Reply = Union[str, httpx.Response]
+
+class FakeLLM:
+    """Answers provider requests in the provider's own wire format, streamed or not.
+
+    `reply(call)` returns the response text, or an httpx.Response to send
+    instead (errors, 429s with headers). By default the user content is echoed.
+    Each request is recorded in `calls` as {"format", "url", "payload", "stream", "content"}.
+    `delay` holds every response back, and `max_in_flight` counts the most
+    requests seen waiting at once.
+    """
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self.reply: Callable[[Dict[str, Any]], Reply] = lambda call: call["content"]
+        self.delay = 0.0
+        self.delta_size = 5
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @staticmethod
+    def _wire_format(url: str) -> str:
+        if "/chat/completions" in url:
+            return "openai"
+        if url.split("?")[0].endswith("/v1/messages"):
+            return "anthropic"
+        if ":generateContent" in url or ":streamGenerateContent" in url:
+            return "google"
+        return "ollama"
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        payload = json.loads(request.content)
+        wire_format = self._wire_format(url)
+        if wire_format in ("openai", "ollama"):
+            content = payload["messages"][-1]["content"]
+        elif wire_format == "anthropic":
+            content = payload["messages"][0]["content"]
+        else:
+            content = payload["contents"][0]["parts"][0]["text"]
+        stream = payload.get("stream") is True or "alt=sse" in url
+        call = {"format": wire_format, "url": url, "payload": payload, "stream": stream, "content": content}
+        self.calls.append(call)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        answer = self.reply(call)
+        if isinstance(answer, httpx.Response):
+            return answer
+        usage = (notemd_core.estimate_tokens(content), notemd_core.estimate_tokens(answer))
+        if stream:
+            deltas = [answer[i:i + self.delta_size] for i in range(0, len(answer), self.delta_size)]
+            return httpx.Response(200, content=_STREAM_BODIES[wire_format](deltas, usage).encode("utf-8"))
+        return httpx.Response(200, json=_RESPONSE_BODIES[wire_format](answer, usage))
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    return (f"event: {event}\n" if event else "") + f"data: {json.dumps(data)}\n\n"
+
+_RESPONSE_BODIES = {
+    "openai": lambda text, usage: {"choices": [{"message": {"content": text}}], "usage": {"prompt_tokens": usage[0], "completion_tokens": usage[1]}},
+    "anthropic": lambda text, usage: {"content": [{"type": "text", "text": text}], "usage": {"input_tokens": usage[0], "output_tokens": usage[1]}},
+    "google": lambda text, usage: {"candidates": [{"content": {"parts": [{"text": text}]}}], "usageMetadata": {"promptTokenCount": usage[0], "candidatesTokenCount": usage[1]}},
+    "ollama": lambda text, usage: {"message": {"content": text}, "done": True, "prompt_eval_count": usage[0], "eval_count": usage[1]},
+}
+
+_STREAM_BODIES = {
+    "openai": lambda deltas, usage: "".join(_sse({"choices": [{"delta": {"content": d}}]}) for d in deltas)
+        + _sse({"choices": [], "usage": {"prompt_tokens": usage[0], "completion_tokens": usage[1]}}) + "data: [DONE]\n\n",
+    "anthropic": lambda deltas, usage: _sse({"type": "message_start", "message": {"usage": {"input_tokens": usage[0], "output_tokens": 1}}}, "message_start")
+        + "".join(_sse({"type": "content_block_delta", "delta": {"type": "text_delta", "text": d}}, "content_block_delta") for d in deltas)
+        + _sse({"type": "message_delta", "usage": {"output_tokens": usage[1]}}, "message_delta") + _sse({"type": "message_stop"}, "message_stop"),
+    "google": lambda deltas, usage: "".join(_sse({"candidates": [{"content": {"parts": [{"text": d}]}}]}) for d in deltas)
+        + _sse({"candidates": [], "usageMetadata": {"promptTokenCount": usage[0], "candidatesTokenCount": usage[1]}}),
+    "ollama": lambda deltas, usage: "".join(json.dumps({"message": {"content": d}, "done": False}) + "\n" for d in deltas)
+        + json.dumps({"message": {"content": ""}, "done": True, "prompt_eval_count": usage[0], "eval_count": usage[1]}) + "\n",
+}
+
+@pytest.fixture
+def fake_llm(monkeypatch, settings) -> FakeLLM:
+    """Routes every provider request through a FakeLLM instead of the network."""
+    llm = FakeLLM()
+    monkeypatch.setattr(notemd_core, "_create_http_client", lambda key: httpx.AsyncClient(transport=httpx.MockTransport(llm.handle)))
+    return llm
+
+class FakeWeb:
+    """Serves search and page requests: `pages` maps a URL to an httpx.Response
+    or to a callable building one from the request. Requests are recorded in `requests`."""
+    def __init__(self):
+        self.pages: Dict[str, Any] = {}
+        self.requests: List[httpx.Request] = []
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        page = self.pages.get(str(request.url).split("?")[0])
+        if page is None:
+            return httpx.Response(404)
+        return page(request) if callable(page) else page
+
+@pytest.fixture
+def fake_web(monkeypatch, settings) -> FakeWeb:
+    """Routes search and page fetch requests through a FakeWeb instead of the network."""
+    web = FakeWeb()
+    monkeypatch.setattr(notemd_core, "_create_http_client", lambda key: httpx.AsyncClient(transport=httpx.MockTransport(web.handle)))
+    return web
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+
+import notemd_core
+
+BROKEN = "# Diagram\n\n```mermaid\ngraph TD\n  A[\"Start\"] --> B\n\nText with $ x $.\n"
+CLEAN = "# Plain note\n\nNothing to fix here.\n"
+
+def make_folder(vault, broken: int = 2, clean: int = 3):
+    for index in range(broken):
+        (vault / f"broken{index}.md").write_text(BROKEN, encoding="utf-8")
+    for index in range(clean):
+        (vault / f"clean{index}.md").write_text(CLEAN, encoding="utf-8")
+    return str(vault)
+
+def batch_fix(folder, **kwargs):
+    return asyncio.run(notemd_core.batch_fix_mermaid_syntax_in_folder(folder, **kwargs))
+
+def test_second_run_skips_unchanged_files(settings, vault):
+    folder = make_folder(vault)
+    first = batch_fix(folder)
+    assert (first["scanned_count"], first["modified_count"], first["skipped_count"]) == (5, 2, 0)
+    fixed = (vault / "broken0.md").read_text(encoding="utf-8")
+    assert fixed == notemd_core.refine_mermaid_blocks(notemd_core.cleanup_latex_delimiters(BROKEN))
+
+    second = batch_fix(folder)
+    assert (second["scanned_count"], second["modified_count"], second["skipped_count"]) == (5, 0, 5)
+
+def test_changed_files_are_checked_again(settings, vault):
+    folder = make_folder(vault)
+    batch_fix(folder)
+    (vault / "clean0.md").write_text(BROKEN + "\nEdited since the last run.\n", encoding="utf-8")
+    result = batch_fix(folder)
+    assert (result["modified_count"], result["skipped_count"]) == (1, 4)
+
+def test_touched_but_unchanged_files_are_recognized_by_hash(settings, vault):
+    folder = make_folder(vault)
+    batch_fix(folder)
+    stat = os.stat(vault / "clean1.md")
+    os.utime(vault / "clean1.md", (stat.st_atime, stat.st_mtime + 10))
+    assert batch_fix(folder)["skipped_count"] == 5
+    manifest = json.loads(open(notemd_core.SETTINGS["MERMAID_FIX_MANIFEST_PATH"], encoding="utf-8").read())
+    assert manifest["files"][str(vault / "clean1.md")]["mtime"] == stat.st_mtime + 10
+
+def test_force_checks_every_file(settings, vault):
+    folder = make_folder(vault)
+    batch_fix(folder)
+    result = batch_fix(folder, force=True)
+    assert (result["scanned_count"], result["modified_count"], result["skipped_count"]) == (5, 0, 0)
+
+def test_manifest_from_another_version_is_ignored(settings, vault):
+    folder = make_folder(vault)
+    batch_fix(folder)
+    path = notemd_core.SETTINGS["MERMAID_FIX_MANIFEST_PATH"]
+    manifest = json.loads(open(path, encoding="utf-8").read())
+    manifest["version"] = notemd_core.MERMAID_FIX_MANIFEST_VERSION + 1
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    assert batch_fix(folder)["skipped_count"] == 0
+
+def test_disabled_manifest_never_skips(settings, vault):
+    settings(ENABLE_MERMAID_FIX_MANIFEST=False)
+    folder = make_folder(vault)
+    batch_fix(folder)
+    assert batch_fix(folder)["skipped_count"] == 0
+    assert not os.path.exists(notemd_core.SETTINGS["MERMAID_FIX_MANIFEST_PATH"])
+
+def test_dry_run_reports_diffs_and_writes_nothing(settings, vault):
+    folder = make_folder(vault)
+    result = batch_fix(folder, dry_run=True)
+    assert result["dry_run"] and result["modified_count"] == 2
+    assert sorted(diff["file"] for diff in result["diffs"]) == [str(vault / "broken0.md"), str(vault / "broken1.md")]
+    assert result["diffs"][0]["diff"].startswith("--- a/broken")
+    assert (vault / "broken0.md").read_text(encoding="utf-8") == BROKEN
+    assert not os.path.exists(notemd_core.SETTINGS["MERMAID_FIX_MANIFEST_PATH"])
+
+def test_process_pool_gives_the_single_worker_result(settings, tmp_path):
+    single_folder, pool_folder = tmp_path / "single", tmp_path / "pool"
+    for folder in (single_folder, pool_folder):
+        folder.mkdir()
+        make_folder(folder, broken=40, clean=40)
+    single = batch_fix(str(single_folder))
+    settings(BATCH_FIX_WORKERS=2)
+    pooled = batch_fix(str(pool_folder))
+    assert (pooled["modified_count"], pooled["scanned_count"]) == (single["modified_count"], single["scanned_count"]) == (40, 80)
+    assert {path.name: path.read_text(encoding="utf-8") for path in pool_folder.iterdir()} == \
+           {path.name: path.read_text(encoding="utf-8") for path in single_folder.iterdir()}
+
+def test_unreadable_files_are_reported_and_checked_again(settings, vault):
+    folder = make_folder(vault)
+    (vault / "binary.md").write_bytes(b"\xff\xfe\x00 not utf-8")
+    result = batch_fix(folder)
+    assert [error["file"] for error in result["errors"]] == [str(vault / "binary.md")]
+    assert batch_fix(folder)["skipped_count"] == 5
@@ -0,0 +1,122 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+import notemd_core
+from notemd_core import OperationCancelledError
+
+SMALL_CHUNKS = {"ENABLE_ADAPTIVE_CHUNK_SIZE": False, "MAX_TOKENS": 1000, "CUSTOM_PROMPT_ADD_LINKS": "Add links."}
+
+async def wait_until(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.005)
+
+def test_cancel_operation_stops_a_running_operation(settings):
+    stopped = []
+
+    async def operation(token):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            stopped.append(bool(token))
+            raise
+
+    async def run():
+        task = asyncio.create_task(notemd_core.run_cancellable(operation, operation_id="op-1"))
+        await wait_until(lambda: "op-1" in notemd_core._OPERATIONS)
+        assert notemd_core.cancel_operation("op-1")
+        with pytest.raises(OperationCancelledError):
+            await task
+
+    asyncio.run(run())
+    assert stopped == [True]
+    assert "op-1" not in notemd_core._OPERATIONS
+    assert not notemd_core.cancel_operation("op-1")
+
+def test_operation_ids_must_be_unique(settings):
+    async def operation(token):
+        await asyncio.sleep(10)
+
+    async def run():
+        task = asyncio.create_task(notemd_core.run_cancellable(operation, operation_id="op-1"))
+        await wait_until(lambda: "op-1" in notemd_core._OPERATIONS)
+        with pytest.raises(ValueError):
+            await notemd_core.run_cancellable(operation, operation_id="op-1")
+        notemd_core.cancel_operation("op-1")
+        with pytest.raises(OperationCancelledError):
+            await task
+
+    asyncio.run(run())
+
+def test_operations_stop_when_the_client_disconnects(settings):
+    settings(DISCONNECT_POLL_INTERVAL=0.01)
+    polls = []
+
+    async def is_disconnected():
+        polls.append(True)
+        return len(polls) >= 3
+
+    async def operation(token):
+        await asyncio.sleep(10)
+
+    with pytest.raises(OperationCancelledError):
+        asyncio.run(notemd_core.run_cancellable(operation, is_disconnected=is_disconnected))
+    assert len(polls) == 3
+
+def test_cancelled_flag_cancels_before_any_call(settings, fake_llm):
+    settings(**SMALL_CHUNKS)
+    with pytest.raises(OperationCancelledError):
+        asyncio.run(notemd_core.run_cancellable(notemd_core.process_content, "Some content.", cancelled=True))
+    assert fake_llm.calls == []
+
+def test_cancelling_aborts_in_flight_provider_calls(settings, fake_llm):
+    settings(**SMALL_CHUNKS)
+    fake_llm.delay = 10
+
+    async def run():
+        task = asyncio.create_task(notemd_core.run_cancellable(notemd_core.process_content, "Some content.", operation_id="op-1"))
+        await wait_until(lambda: fake_llm.in_flight == 1)
+        notemd_core.cancel_operation("op-1")
+        with pytest.raises(OperationCancelledError):
+            await task
+
+    asyncio.run(run())
+    assert fake_llm.in_flight == 0
+
+def test_streams_report_their_operation_id_and_cancellation(settings):
+    async def operation(token):
+        yield {"event": "start"}
+        await asyncio.sleep(10)
+        yield {"event": "end"}
+
+    async def run():
+        events = []
+        with pytest.raises(OperationCancelledError):
+            async for event in notemd_core.iter_cancellable(operation, operation_id="stream-1"):
+                events.append(event)
+                notemd_core.cancel_operation(event["operation_id"])
+        return events
+
+    assert asyncio.run(run()) == [{"event": "start", "operation_id": "stream-1"}]
+    assert "stream-1" not in notemd_core._OPERATIONS
+
+def test_cancel_endpoint_stops_a_request(settings, fake_llm):
+    settings(**SMALL_CHUNKS)
+    fake_llm.delay = 10
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver") as client:
+            request = asyncio.create_task(client.post("/process_content", json={"content": "Some content.", "operation_id": "op-1"}))
+            await wait_until(lambda: fake_llm.in_flight == 1)
+            cancelled = await client.post("/cancel/op-1")
+            missing = await client.post("/cancel/unknown")
+            return await request, cancelled, missing
+
+    response, cancelled, missing = asyncio.run(run())
+    assert response.status_code == main.CLIENT_CLOSED_REQUEST
+    assert cancelled.json() == {"operation_id": "op-1", "status": "cancelling"}
+    assert missing.status_code == 404
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+import notemd_core
+
+PROMPT = "Add links."  # Three estimated tokens.
+
+@pytest.mark.parametrize("provider_name, model, budget, max_output", [
+    # Output-bound: 8192 / 1.2 output tokens per input token.
+    ("OpenAI", "gpt-4o-mini", 6826, 8192),
+    # Same bound in Claude tokens, which are 3.5 characters rather than the estimated 4.
+    ("Anthropic", "claude-3-5-sonnet-latest", 5973, 8192),
+    # Capped by the model's 4096 output tokens.
+    ("OpenAI", "gpt-3.5-turbo", 3242, 4096),
+    # Context-bound: 4096 - prompt - 256 reserve - 1024 output, in llama2 tokens.
+    ("OpenRouter", "gryphe/mythomax-l2-13b", 704, 1024),
+    # Unknown models keep prompt, chunk and output under MAX_TOKENS: (8192 - 3 - 256) / 2.2.
+    ("OpenAI", "unknown-model", 3605, 8192),
+    ("Ollama", "llama3", 3605, 8192),
+])
+def test_budgets_follow_the_model(settings, provider, provider_name, model, budget, max_output):
+    config = provider(provider_name)
+    assert notemd_core.get_chunk_token_budget(PROMPT, config, model) == budget
+    assert notemd_core.get_max_output_tokens(config, model) == max_output
+
+def test_word_limit_only_applies_to_unknown_models(settings, provider):
+    settings(CHUNK_WORD_COUNT=500)
+    assert notemd_core.get_chunk_word_limit(provider("OpenAI"), "gpt-4o") is None
+    assert notemd_core.get_chunk_word_limit(provider("OpenAI"), "unknown-model") == 500
+
+def test_max_tokens_still_caps_known_models(settings, provider):
+    settings(MAX_TOKENS=2000)
+    assert notemd_core.get_max_output_tokens(provider("OpenAI"), "gpt-4o") == 2000
+    assert notemd_core.get_chunk_token_budget(PROMPT, provider("OpenAI"), "gpt-4o") == int(2000 / 1.2)
+
+def test_capability_lookup_order(settings, provider):
+    settings(MODEL_CAPABILITIES={
+        "Ollama/llama3*": {"context_window": 8192, "max_output": 2048, "tokenizer": "llama3"},
+        "llama3*": {"context_window": 4096, "max_output": 1024},
+        "LMStudio": {"context_window": 32768, "max_output": 4096},
+    })
+    assert notemd_core.get_model_capabilities(provider("Ollama"), "llama3:8b")["max_output"] == 2048
+    assert notemd_core.get_model_capabilities(provider("OpenRouter"), "llama3-70b")["max_output"] == 1024
+    assert notemd_core.get_model_capabilities(provider("LMStudio"), "anything")["max_output"] == 4096
+    assert notemd_core.get_model_capabilities(provider("OpenAI"), "gpt-4o") is None
+
+def test_adaptive_sizing_can_be_turned_off(settings, provider):
+    settings(ENABLE_ADAPTIVE_CHUNK_SIZE=False)
+    assert notemd_core.get_chunk_token_budget(PROMPT, provider("OpenAI"), "gpt-4o") == 3605
+    assert notemd_core.get_chunk_word_limit(provider("OpenAI"), "gpt-4o") == 3000
+
+def test_chunks_fit_the_model_budget(settings, provider):
+    content = "\n\n".join(f"Paragraph {i}: " + "tokens and words " * 60 for i in range(300))
+    anthropic = provider("Anthropic")
+    budget = notemd_core.get_chunk_token_budget(PROMPT, anthropic, "claude-3-5-sonnet-latest")
+    chunks = notemd_core.split_content(content, PROMPT, anthropic, "claude-3-5-sonnet-latest")
+    assert len(chunks) > 1
+    assert all(notemd_core.estimate_tokens(chunk) <= budget for chunk in chunks)
+    # With no word limit, chunks grow past the 3000 words unknown models are held to.
+    assert max(len(chunk.split()) for chunk in chunks) > 3000
+
+@pytest.mark.parametrize("provider_name, model, field", [
+    ("OpenAI", "gpt-4-turbo", ("max_tokens",)),
+    ("Anthropic", "claude-3-5-sonnet-latest", ("max_tokens",)),
+    ("Google", "gemini-1.5-pro", ("generationConfig", "maxOutputTokens")),
+    ("Ollama", "llama3", ("options", "num_predict")),
+])
+def test_requests_send_the_model_output_limit(settings, fake_llm, provider, provider_name, model, field):
+    config = provider(provider_name)
+    asyncio.run(notemd_core.call_llm_api(config, model, PROMPT, "Content."))
+    value = fake_llm.calls[0]["payload"]
+    for key in field:
+        value = value[key]
+    assert value == notemd_core.get_max_output_tokens(config, model)
+    # Ollama keeps the context window it was started with.
+    assert "num_ctx" not in fake_llm.calls[0]["payload"].get("options", {})
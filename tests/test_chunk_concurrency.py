@@ -0,0 +1,47 @@
+import asyncio
+
+import httpx
+import pytest
+
+import notemd_core
+
+# Small, fixed-size chunks: no model capabilities, so MAX_TOKENS sizes them.
+SMALL_CHUNKS = {"ENABLE_ADAPTIVE_CHUNK_SIZE": False, "MAX_TOKENS": 1000, "CUSTOM_PROMPT_ADD_LINKS": "Add links.", "ENABLE_DUPLICATE_DETECTION": False}
+DOCUMENT = "\n\n".join(f"Paragraph {i} about topic {i} " + "filler text " * 15 for i in range(24))
+
+def test_parallel_processing_matches_sequential(settings, fake_llm):
+    settings(**SMALL_CHUNKS)
+    sequential = asyncio.run(notemd_core.process_content(DOCUMENT))
+    assert len(fake_llm.calls) > 3
+    settings(ENABLE_PARALLEL_CHUNK_PROCESSING=True)
+    assert asyncio.run(notemd_core.process_content(DOCUMENT)) == sequential
+
+def test_concurrency_is_bounded_per_provider(settings, fake_llm):
+    settings(**SMALL_CHUNKS, ENABLE_PARALLEL_CHUNK_PROCESSING=True, CHUNK_CONCURRENCY=4, PROVIDER_CONCURRENCY={"OpenAI": 2})
+    fake_llm.delay = 0.02
+    asyncio.run(notemd_core.process_content(DOCUMENT))
+    assert fake_llm.max_in_flight == 2
+
+def test_failed_chunks_are_retried_and_completed_ones_kept(settings, fake_llm):
+    settings(**SMALL_CHUNKS, ENABLE_PARALLEL_CHUNK_PROCESSING=True)
+    failed_once = set()
+
+    def reply(call):
+        if "Paragraph 0 " in call["content"] and call["content"] not in failed_once:
+            failed_once.add(call["content"])
+            return httpx.Response(500, json={"error": "boom"})
+        return call["content"]
+
+    fake_llm.reply = reply
+    result = asyncio.run(notemd_core.process_content(DOCUMENT))
+    chunk_count = len(notemd_core.split_content(DOCUMENT, None, notemd_core.get_provider_for_task("addLinks"), "gpt-4o"))
+    assert len(fake_llm.calls) == chunk_count + 1
+    assert result.startswith("Paragraph 0 ")
+
+def test_client_errors_fail_the_document(settings, fake_llm):
+    settings(**SMALL_CHUNKS, ENABLE_PARALLEL_CHUNK_PROCESSING=True)
+    fake_llm.reply = lambda call: httpx.Response(400, json={"error": "bad"}) if "Paragraph 0 " in call["content"] else call["content"]
+    with pytest.raises(notemd_core.ChunkProcessingError) as raised:
+        asyncio.run(notemd_core.process_content(DOCUMENT))
+    assert list(raised.value.failed_chunks) == [0]
+    assert len(raised.value.completed_chunks) >= 1
@@ -0,0 +1,64 @@
+import io
+import random
+
+import pytest
+
+import notemd_core
+from notemd_core import estimate_tokens, iter_content_chunks, iter_file_chunks
+
+def make_note(seed: int, paragraphs: int = 60) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for index in range(paragraphs):
+        kind = rng.random()
+        if kind < 0.1:
+            parts.append("```mermaid\ngraph TD\n  A --> B\n\n  B --> C\n```")
+        elif kind < 0.15:
+            parts.append("```python\ndef f():\n\n    return 1\n```")
+        elif kind < 0.2:
+            parts.append(" ".join(f"long{rng.randint(0, 999)}" for _ in range(rng.randint(200, 400))))
+        else:
+            parts.append(f"## Heading {index}\n" + " ".join(f"word{rng.randint(0, 99)}" for _ in range(rng.randint(5, 80))))
+    separators = ["\n\n", "\n\n\n", "\n  \n", "\n\n"]
+    return "".join(part + rng.choice(separators) for part in parts).rstrip("\n") + "\n"
+
+def fence_count(text: str) -> int:
+    return len(notemd_core._FENCE_LINE_REGEX.findall(text))
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("budget,max_words", [(64, None), (300, None), (300, 150), (5000, 3000)])
+def test_file_chunks_match_content_chunks(seed, budget, max_words):
+    content = make_note(seed)
+    expected = list(iter_content_chunks(content, budget, max_words))
+    assert list(iter_file_chunks(io.StringIO(content), budget, max_words)) == expected
+    assert list(iter_file_chunks(content.splitlines(keepends=True), budget, max_words)) == expected
+
+@pytest.mark.parametrize("seed", range(5))
+def test_chunks_keep_fences_whole_and_respect_the_budget(seed):
+    content = make_note(seed)
+    budget = 120
+    chunks = list(iter_content_chunks(content, budget))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert fence_count(chunk) % 2 == 0
+        if fence_count(chunk) == 0:
+            assert estimate_tokens(chunk) <= budget
+
+@pytest.mark.parametrize("seed", range(5))
+def test_chunks_lose_no_text(seed):
+    content = make_note(seed)
+    chunks = list(iter_content_chunks(content, 100, 60))
+    assert " ".join(chunks).split() == content.split()
+    for chunk in chunks:
+        if fence_count(chunk) == 0:
+            assert len(notemd_core._WORD_REGEX.findall(chunk)) <= 60
+
+def test_oversized_fenced_block_is_sent_whole():
+    block = "```mermaid\n" + "\n\n".join(f"  N{i} --> N{i + 1}" for i in range(200)) + "\n```"
+    chunks = list(iter_content_chunks(f"Before.\n\n{block}\n\nAfter.", 50))
+    assert block in chunks
+
+def test_unclosed_fence_runs_to_the_end():
+    content = "Intro paragraph.\n\n```python\nx = 1\n\ny = 2\n\nz = 3"
+    chunks = list(iter_content_chunks(content, 8))
+    assert chunks[-1].startswith("```python") and chunks[-1].endswith("z = 3")
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+import notemd_core
+from notemd_core import coalesce
+
+class SlowOperation:
+    """Records each run and holds it until `release` is set."""
+    def __init__(self):
+        self.runs = []
+        self.cancelled_runs = 0
+        self.release = None
+
+    async def __call__(self, text, cancelled):
+        self.runs.append(text)
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled_runs += 1
+            raise
+        return f"result for {text}"
+
+async def started(operation, runs):
+    while len(operation.runs) < runs:
+        await asyncio.sleep(0)
+
+def test_identical_concurrent_requests_run_once(settings):
+    operation = SlowOperation()
+
+    async def run():
+        operation.release = asyncio.Event()
+        calls = [asyncio.create_task(coalesce("task", operation, text)) for text in ("Fourier  transform", " Fourier transform", "Laplace")]
+        await started(operation, 2)
+        operation.release.set()
+        return await asyncio.gather(*calls)
+
+    results = asyncio.run(run())
+    # The first caller's text is the one passed on, not its normalized form.
+    assert results == ["result for Fourier  transform", "result for Fourier  transform", "result for Laplace"]
+    assert operation.runs == ["Fourier  transform", "Laplace"]
+    assert notemd_core._FLIGHTS == {}
+
+def test_errors_are_shared_and_not_cached(settings):
+    runs = []
+
+    async def failing(text, cancelled):
+        runs.append(text)
+        await asyncio.sleep(0.01)
+        raise ValueError("provider failed")
+
+    async def run():
+        results = await asyncio.gather(*[coalesce("task", failing, "Topic") for _ in range(3)], return_exceptions=True)
+        with pytest.raises(ValueError):
+            await coalesce("task", failing, "Topic")
+        return results
+
+    assert [str(result) for result in asyncio.run(run())] == ["provider failed"] * 3
+    assert runs == ["Topic", "Topic"]
+
+def test_one_caller_leaving_does_not_stop_the_others(settings):
+    operation = SlowOperation()
+
+    async def run():
+        operation.release = asyncio.Event()
+        leaving = asyncio.create_task(coalesce("task", operation, "Topic"))
+        staying = asyncio.create_task(coalesce("task", operation, "Topic"))
+        await started(operation, 1)
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        operation.release.set()
+        return await staying
+
+    assert asyncio.run(run()) == "result for Topic"
+    assert operation.cancelled_runs == 0
+
+def test_flight_is_cancelled_when_every_caller_left_and_replaced_afterwards(settings):
+    operation = SlowOperation()
+
+    async def run():
+        operation.release = asyncio.Event()
+        caller = asyncio.create_task(coalesce("task", operation, "Topic"))
+        await started(operation, 1)
+        caller.cancel()
+        await asyncio.sleep(0)
+        # The abandoned flight may still be finishing its cancellation; a new caller starts afresh.
+        later = asyncio.create_task(coalesce("task", operation, "Topic"))
+        await started(operation, 2)
+        operation.release.set()
+        return await later
+
+    assert asyncio.run(run()) == "result for Topic"
+    assert operation.runs == ["Topic", "Topic"]
+    assert operation.cancelled_runs == 1
+
+def test_requests_after_a_reload_do_not_join_older_work(settings):
+    operation = SlowOperation()
+
+    async def run():
+        operation.release = asyncio.Event()
+        before = asyncio.create_task(coalesce("task", operation, "Topic"))
+        await started(operation, 1)
+        notemd_core.reload_settings({**notemd_core.current_settings(), "MAX_TOKENS": 1234})
+        after = asyncio.create_task(coalesce("task", operation, "Topic"))
+        await started(operation, 2)
+        operation.release.set()
+        return await asyncio.gather(before, after)
+
+    asyncio.run(run())
+    assert operation.runs == ["Topic", "Topic"]
+
+def test_disabled_coalescing_runs_every_request(settings):
+    settings(ENABLE_REQUEST_COALESCING=False)
+    operation = SlowOperation()
+
+    async def run():
+        operation.release = asyncio.Event()
+        calls = [asyncio.create_task(coalesce("task", operation, "Topic")) for _ in range(3)]
+        await started(operation, 3)
+        operation.release.set()
+        return await asyncio.gather(*calls)
+
+    assert asyncio.run(run()) == ["result for Topic"] * 3
+
+def test_title_generation_is_coalesced(settings, fake_llm):
+    fake_llm.delay = 0.05
+    fake_llm.reply = lambda call: "# Generated"
+    before = notemd_core.METRICS_REGISTRY.get_sample_value("notemd_coalesced_requests_total", {"task": "generate_title"}) or 0.0
+
+    async def run():
+        return await asyncio.gather(*[notemd_core.generate_content_for_title(title) for title in ("Entropy", "entropy ", "Entropy")])
+
+    results = asyncio.run(run())
+    # Only whitespace is normalized, so "entropy" is a different request.
+    assert len(fake_llm.calls) == 2
+    assert results[0] == results[2]
+    assert notemd_core.METRICS_REGISTRY.get_sample_value("notemd_coalesced_requests_total", {"task": "generate_title"}) == before + 1
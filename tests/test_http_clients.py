@@ -0,0 +1,51 @@
+import asyncio
+
+import httpx
+
+import notemd_core
+
+def test_clients_are_pooled_per_origin(settings):
+    async def run():
+        first = notemd_core.get_http_client("https://api.openai.com/v1")
+        assert notemd_core.get_http_client("https://API.openai.com/v1/other") is first
+        assert notemd_core.get_http_client("https://api.anthropic.com") is not first
+        await notemd_core.close_http_clients()
+        assert first.is_closed
+    asyncio.run(run())
+
+def test_client_from_another_event_loop_is_retired_and_closed(settings):
+    async def get_client():
+        return notemd_core.get_http_client("https://api.openai.com/v1")
+
+    old_client = asyncio.run(get_client())
+    new_client = asyncio.run(get_client())
+    assert new_client is not old_client
+    assert notemd_core._RETIRED_HTTP_CLIENTS == [old_client]
+
+    asyncio.run(notemd_core.close_http_clients())
+    assert old_client.is_closed and new_client.is_closed
+    assert not notemd_core._RETIRED_HTTP_CLIENTS
+
+def test_retire_http_clients_hands_out_fresh_clients(settings):
+    async def run():
+        old_client = notemd_core.get_http_client("https://api.openai.com/v1")
+        notemd_core.retire_http_clients()
+        new_client = notemd_core.get_http_client("https://api.openai.com/v1")
+        assert new_client is not old_client and not old_client.is_closed
+        await notemd_core.close_http_clients()
+        assert old_client.is_closed
+    asyncio.run(run())
+
+def set_cookie_from(client: httpx.AsyncClient, url: str) -> None:
+    response = httpx.Response(200, headers={"set-cookie": "session=abc; Path=/"}, request=httpx.Request("GET", url))
+    client.cookies.extract_cookies(response)
+
+def test_web_client_keeps_no_cookies(settings):
+    web_client = notemd_core._create_http_client(notemd_core.WEB_CLIENT_KEY)
+    provider_client = notemd_core._create_http_client("https://api.openai.com")
+    set_cookie_from(web_client, "https://tracker.example.com/page")
+    set_cookie_from(provider_client, "https://api.openai.com/v1/chat/completions")
+    assert len(web_client.cookies.jar) == 0
+    assert len(provider_client.cookies.jar) == 1
+    asyncio.run(web_client.aclose())
+    asyncio.run(provider_client.aclose())
@@ -0,0 +1,168 @@
+import asyncio
+import subprocess
+import sys
+
+import httpx
+import pytest
+
+import main
+import notemd_core
+from notemd_core import JobStore, JobWorkerPool
+
+SMALL_CHUNKS = {"ENABLE_ADAPTIVE_CHUNK_SIZE": False, "MAX_TOKENS": 1000, "CUSTOM_PROMPT_ADD_LINKS": "Add links."}
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+def item_statuses(store, job_id):
+    return [item["status"] for item in store.get_job(job_id, include_items=True)["items"]]
+
+def dead_pid() -> str:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return str(process.pid)
+
+def test_items_are_claimed_in_submission_order(store):
+    first = store.create_job("process_content", [("one", False), ("two", False)])
+    second = store.create_job("generate_title", [("Title", False)])
+    claimed = [store.claim_next_item() for _ in range(4)]
+    assert [(item["job_id"], item["item_index"], item["input"]) for item in claimed[:3]] == [
+        (first, 0, "one"), (first, 1, "two"), (second, 0, "Title")]
+    assert claimed[2]["task"] == "generate_title"
+    assert claimed[3] is None
+    assert item_statuses(store, first) == ["running", "running"]
+
+@pytest.mark.parametrize("outcomes, status", [
+    ([], "queued"),
+    (["completed"], "running"),
+    (["completed", "completed"], "completed"),
+    (["failed", "failed"], "failed"),
+    (["completed", "failed"], "completed_with_errors"),
+])
+def test_job_status_follows_its_items(store, outcomes, status):
+    job_id = store.create_job("process_content", [("one", False), ("two", False)])
+    for index, outcome in enumerate(outcomes):
+        store.claim_next_item()
+        store.finish_item(job_id, index, outcome, result="done" if outcome == "completed" else None)
+    assert store.get_job(job_id)["status"] == status
+
+def test_cancel_drops_queued_items_and_waits_for_running_ones(store):
+    job_id = store.create_job("process_content", [("one", False), ("two", False), ("three", False)])
+    store.claim_next_item()
+    assert store.cancel_job(job_id)
+    assert item_statuses(store, job_id) == ["running", "cancelled", "cancelled"]
+    assert store.get_job(job_id)["status"] == "cancelling"
+    assert store.claim_next_item() is None
+    store.finish_item(job_id, 0, "cancelled", error="Cancelled")
+    assert store.get_job(job_id)["status"] == "cancelled"
+    assert not store.cancel_job("missing")
+
+def test_requeue_running_only_touches_own_items(store):
+    job_id = store.create_job("process_content", [("one", False), ("two", False)])
+    store.claim_next_item()
+    store.claim_next_item()
+    store._db.execute("UPDATE job_items SET owner = 'other-worker' WHERE item_index = 1")
+    assert store.requeue_running() == 1
+    assert item_statuses(store, job_id) == ["queued", "running"]
+
+def test_items_of_a_dead_process_are_requeued_on_open(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path)
+    job_id = store.create_job("process_content", [("one", False), ("two", False)])
+    store.claim_next_item()
+    store.claim_next_item()
+    store._db.execute("UPDATE job_items SET owner = ? WHERE item_index = 0", (dead_pid(),))
+    store._db.execute("UPDATE job_items SET owner = '1' WHERE item_index = 1")
+    store.close()
+
+    reopened = JobStore(path)
+    assert item_statuses(reopened, job_id) == ["queued", "running"]
+    assert reopened.claim_next_item()["item_index"] == 0
+    reopened.close()
+
+async def wait_for_status(store, job_id, statuses, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while (job := store.get_job(job_id, include_items=True))["status"] not in statuses:
+        assert asyncio.get_running_loop().time() < deadline, job
+        await asyncio.sleep(0.01)
+    return job
+
+def test_worker_pool_processes_queued_items(settings, fake_llm, store):
+    settings(**SMALL_CHUNKS)
+    fake_llm.reply = lambda call: f"Linked: {call['content']}"
+
+    async def run():
+        pool = JobWorkerPool(store, 2, 0.05)
+        pool.start()
+        job_id = store.create_job("process_content", [("First note.", False), ("Second note.", False)])
+        pool.notify()
+        job = await wait_for_status(store, job_id, ("completed", "failed", "completed_with_errors"))
+        await pool.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert job["status"] == "completed"
+    assert [item["result"] for item in job["items"]] == ["Linked: First note.", "Linked: Second note."]
+
+def test_cancelling_a_job_stops_its_running_items(settings, fake_llm, store):
+    settings(**SMALL_CHUNKS)
+    fake_llm.delay = 10
+
+    async def run():
+        pool = JobWorkerPool(store, 1, 0.05)
+        pool.start()
+        job_id = store.create_job("process_content", [("First note.", False), ("Second note.", False)])
+        pool.notify()
+        await wait_for_status(store, job_id, ("running",))
+        # The item is marked running in the worker thread before its task is registered.
+        while not pool._running_items:
+            await asyncio.sleep(0.01)
+        store.cancel_job(job_id)
+        assert pool.cancel_running_items(job_id) == 1
+        job = await wait_for_status(store, job_id, ("cancelled",))
+        await pool.stop()
+        return job
+
+    job = asyncio.run(run())
+    assert [(item["status"], item["error"]) for item in job["items"]] == [("cancelled", "Cancelled")] * 2
+
+def test_stopping_the_pool_requeues_running_items(settings, fake_llm, store):
+    settings(**SMALL_CHUNKS)
+    fake_llm.delay = 10
+
+    async def run():
+        pool = JobWorkerPool(store, 1, 0.05)
+        pool.start()
+        job_id = store.create_job("process_content", [("Only note.", False)])
+        pool.notify()
+        await wait_for_status(store, job_id, ("running",))
+        await pool.stop()
+        return job_id
+
+    job_id = asyncio.run(run())
+    assert item_statuses(store, job_id) == ["queued"]
+
+def test_job_endpoints(settings, vault):
+    (vault / "note.md").write_text("A note.", encoding="utf-8")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver") as client:
+            submitted = await client.post("/jobs", json={"task": "process_content", "items": [{"path": "note.md"}, {"content": "Inline."}]})
+            rejected = await client.post("/jobs", json={"task": "process_content", "items": [{"path": "../outside.md"}]})
+            job_id = submitted.json()["job_id"]
+            listed = await client.get("/jobs")
+            detail = await client.get(f"/jobs/{job_id}")
+            cancelled = await client.post(f"/cancel/{job_id}")
+            missing = await client.post("/cancel/missing")
+            return submitted, rejected, listed, detail, cancelled, missing
+
+    submitted, rejected, listed, detail, cancelled, missing = asyncio.run(run())
+    assert submitted.status_code == 200 and submitted.json()["status"] == "queued"
+    assert rejected.status_code == 400
+    assert [job["job_id"] for job in listed.json()["jobs"]] == [submitted.json()["job_id"]]
+    assert [item.get("path") for item in detail.json()["items"]] == ["note.md", None]
+    assert cancelled.json()["status"] == "cancelled"
+    assert missing.status_code == 404
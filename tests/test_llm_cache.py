@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+import notemd_core
+from notemd_core import LLMResponseCache, make_llm_cache_key
+
+def test_cache_key_covers_everything_that_shapes_the_response(settings, provider):
+    openai = provider("OpenAI")
+    base = make_llm_cache_key(openai, "gpt-4o", "prompt", "content")
+    assert make_llm_cache_key(dict(openai), "gpt-4o", "prompt", "content") == base
+    variants = [
+        make_llm_cache_key(provider("DeepSeek"), "gpt-4o", "prompt", "content"),
+        make_llm_cache_key(openai, "gpt-4o-mini", "prompt", "content"),
+        make_llm_cache_key({**openai, "temperature": 0.1}, "gpt-4o", "prompt", "content"),
+        make_llm_cache_key(openai, "gpt-4o", "other prompt", "content"),
+        make_llm_cache_key(openai, "gpt-4o", "prompt", "other content"),
+    ]
+    settings(MAX_TOKENS=1024)
+    variants.append(make_llm_cache_key(openai, "gpt-4o", "prompt", "content"))
+    assert len({base, *variants}) == len(variants) + 1
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = LLMResponseCache(2, "", 0, 0)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache" / "llm.sqlite3")
+    cache = LLMResponseCache(4, path, 1024 * 1024, 0)
+    cache.set("key", "value")
+    cache.close()
+    reopened = LLMResponseCache(4, path, 1024 * 1024, 0)
+    assert reopened.get("key") == "value"
+    assert reopened.get_stats()["disk_hits"] == 1
+    reopened.close()
+
+def test_disk_tier_stays_under_its_size_limit(tmp_path):
+    cache = LLMResponseCache(0, str(tmp_path / "llm.sqlite3"), 200, 0)
+    for index in range(20):
+        cache.set(f"key{index}", "x" * 40)
+    stats = cache.get_stats()
+    assert stats["disk_bytes"] <= 200 and stats["evictions"] > 0
+    assert cache.get("key19") == "x" * 40
+    assert cache.get("key0") is None
+    cache.close()
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(notemd_core.time, "time", lambda: now[0])
+    cache = LLMResponseCache(4, str(tmp_path / "llm.sqlite3"), 1024 * 1024, 60)
+    cache.set("key", "value")
+    now[0] += 30
+    assert cache.get("key") == "value"
+    now[0] += 31
+    assert cache.get("key") is None
+    assert cache.get_stats()["expired"] >= 1
+    cache.close()
+
+def test_identical_calls_are_served_from_the_cache(settings, fake_llm, provider, tmp_path):
+    settings(ENABLE_LLM_CACHE=True, LLM_CACHE_PATH=str(tmp_path / "llm.sqlite3"))
+    openai = provider("OpenAI")
+
+    async def run():
+        first = await notemd_core.call_llm_api(openai, "gpt-4o", "Add links.", "Some content.")
+        second = await notemd_core.call_llm_api(openai, "gpt-4o", "Add links.", "Some content.")
+        streamed = "".join([delta async for delta in notemd_core.stream_llm_api(openai, "gpt-4o", "Add links.", "Some content.")])
+        other = await notemd_core.call_llm_api(openai, "gpt-4o", "Add links.", "Other content.")
+        return first, second, streamed, other
+
+    first, second, streamed, other = asyncio.run(run())
+    assert first == second == streamed == "Some content."
+    assert other == "Other content."
+    assert len(fake_llm.calls) == 2
+    assert notemd_core.get_llm_cache().get_stats()["hits"] == 2
+
+def test_streamed_responses_are_cached(settings, fake_llm, provider):
+    settings(ENABLE_LLM_CACHE=True)
+    openai = provider("OpenAI")
+
+    async def run():
+        streamed = "".join([delta async for delta in notemd_core.stream_llm_api(openai, "gpt-4o", "Add links.", "Streamed content.")])
+        return streamed, await notemd_core.call_llm_api(openai, "gpt-4o", "Add links.", "Streamed content.")
+
+    assert asyncio.run(run()) == ("Streamed content.", "Streamed content.")
+    assert [call["stream"] for call in fake_llm.calls] == [True]
+
+@pytest.mark.parametrize("setting", ["LLM_CACHE_MEMORY_ENTRIES", "LLM_CACHE_TTL"])
+def test_reload_rebuilds_the_cache(settings, setting):
+    settings(ENABLE_LLM_CACHE=True)
+    cache = notemd_core.get_llm_cache()
+    notemd_core.reload_settings({**notemd_core.current_settings(), setting: 1})
+    assert notemd_core.get_llm_cache() is not cache
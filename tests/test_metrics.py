@@ -0,0 +1,53 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+import notemd_core
+
+def sample(name, **labels):
+    return notemd_core.METRICS_REGISTRY.get_sample_value(name, labels) or 0.0
+
+async def get(path: str) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver") as client:
+        return await client.get(path)
+
+def test_requests_are_counted_per_route_template(settings):
+    labels = {"method": "GET", "route": "/jobs/{job_id}", "status": "404"}
+    before = sample("notemd_http_requests_total", **labels)
+    assert asyncio.run(get("/jobs/first")).status_code == 404
+    assert asyncio.run(get("/jobs/second")).status_code == 404
+    assert sample("notemd_http_requests_total", **labels) == before + 2
+    assert sample("notemd_http_request_duration_seconds_count", method="GET", route="/jobs/{job_id}") >= 2
+
+def test_provider_calls_record_latency_and_errors(settings, fake_llm, provider):
+    openai = provider("OpenAI")
+    success = {"provider": "OpenAI", "model": "gpt-4o", "outcome": "success"}
+    errors = {"provider": "OpenAI", "model": "gpt-4o", "error": "http_503"}
+    before = sample("notemd_llm_call_duration_seconds_count", **success), sample("notemd_llm_call_errors_total", **errors)
+
+    async def run():
+        await notemd_core.call_provider_api(openai, "gpt-4o", "Add links.", "Content.")
+        fake_llm.reply = lambda call: httpx.Response(503, json={"error": "unavailable"})
+        with pytest.raises(httpx.HTTPStatusError):
+            await notemd_core.call_provider_api(openai, "gpt-4o", "Add links.", "Content.")
+
+    asyncio.run(run())
+    assert sample("notemd_llm_call_duration_seconds_count", **success) == before[0] + 1
+    assert sample("notemd_llm_call_errors_total", **errors) == before[1] + 1
+
+def test_splitting_records_chunk_counts(settings):
+    settings(ENABLE_ADAPTIVE_CHUNK_SIZE=False, MAX_TOKENS=1000, CUSTOM_PROMPT_ADD_LINKS="Add links.")
+    before = sample("notemd_split_chunks_count"), sample("notemd_split_chunk_tokens_count")
+    chunks = notemd_core.split_content("\n\n".join("word " * 200 for _ in range(10)))
+    assert sample("notemd_split_chunks_count") == before[0] + 1
+    assert sample("notemd_split_chunk_tokens_count") == before[1] + len(chunks)
+
+def test_metrics_endpoint_serves_the_prometheus_format(settings):
+    response = asyncio.run(get("/metrics"))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for name in ("notemd_http_requests_total", "notemd_llm_call_duration_seconds", "notemd_split_chunks",
+                 "notemd_page_fetch_duration_seconds", "notemd_coalesced_requests_total"):
+        assert f"# TYPE {name} " in response.text
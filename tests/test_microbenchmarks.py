@@ -0,0 +1,38 @@
+import re
+
+import microbenchmarks
+import notemd_core
+from vault_generator import generate_vault, make_document
+
+def read_vault(root):
+    return {str(path.relative_to(root)): path.read_text(encoding="utf-8") for path in root.rglob("*.md")}
+
+def test_generated_vaults_are_reproducible(tmp_path):
+    first = generate_vault(str(tmp_path / "first"), 30, seed=3, notes_per_folder=10)
+    second = generate_vault(str(tmp_path / "second"), 30, seed=3, notes_per_folder=10)
+    assert first == second and first["notes"] == 30
+    assert read_vault(tmp_path / "first") == read_vault(tmp_path / "second")
+    assert sorted(path.name for path in (tmp_path / "first").iterdir()) == ["Folder 0", "Folder 1", "Folder 2"]
+    generate_vault(str(tmp_path / "third"), 30, seed=4, notes_per_folder=10)
+    assert read_vault(tmp_path / "third") != read_vault(tmp_path / "first")
+
+def test_generated_links_match_the_reported_count(tmp_path):
+    stats = generate_vault(str(tmp_path / "vault"), 50, seed=1, links_per_note=6)
+    links = sum(len(re.findall(r"\[\[", content)) for content in read_vault(tmp_path / "vault").values())
+    assert links == stats["links"]
+    assert 50 * 3 < links < 50 * 9
+
+def test_documents_scale_with_the_requested_size():
+    small, large = make_document(1000), make_document(10000)
+    assert make_document(1000) == small
+    assert 0.8 < len(large.split()) / len(small.split()) / 10 < 1.25
+    assert large.count("```mermaid") + large.count("```(mermaid)") >= 10
+
+def test_compare_flags_benchmarks_past_the_threshold():
+    baseline = {"split_content[1k]": {"median": 1.0}, "refine_mermaid_blocks[1k]": {"median": 1.0}}
+    results = {"split_content[1k]": {"median": 1.2}, "refine_mermaid_blocks[1k]": {"median": 1.3}, "new[1k]": {"median": 9.0}}
+    assert microbenchmarks.compare(results, baseline, 1.25) == ["refine_mermaid_blocks[1k]"]
+
+def test_delete_helper_removes_links_and_what_they_leave_behind():
+    content = "- [[Old]]\n- [[old]]\n\n\n\nSee [[Old]] and [[Old#Heading]].\n"
+    assert notemd_core.remove_deleted_links(content, notemd_core.delete_link_regex("Old")) == "See  and [[Old#Heading]]."
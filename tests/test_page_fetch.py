@@ -0,0 +1,62 @@
+import asyncio
+import re
+
+import httpx
+import pytest
+from selectolax.parser import HTMLParser
+
+import notemd_core
+
+PAGE_URL = "https://example.com/page"
+
+class CountingBody:
+    """A page body sent in 1 KB pieces, counting how many were read."""
+    def __init__(self, html: str):
+        self.data = html.encode("utf-8")
+        self.pieces_read = 0
+
+    async def __aiter__(self):
+        for start in range(0, len(self.data), 1024):
+            self.pieces_read += 1
+            yield self.data[start:start + 1024]
+
+def test_download_stops_at_the_byte_cap(settings, fake_web):
+    settings(FETCH_MAX_BYTES=4096)
+    body = CountingBody("<html><body>" + "".join(f"<p>Paragraph {i}.</p>" for i in range(5000)) + "</body></html>")
+    fake_web.pages[PAGE_URL] = httpx.Response(200, headers={"content-type": "text/html"}, content=body)
+    text = asyncio.run(notemd_core.fetch_content_from_url(PAGE_URL))
+    assert text.startswith("Paragraph 0. Paragraph 1.")
+    assert "Paragraph 4999." not in text
+    assert body.pieces_read == 4
+
+def test_non_html_is_skipped_before_the_body_is_read(settings, fake_web):
+    body = CountingBody("%PDF-1.7 " * 10000)
+    fake_web.pages[PAGE_URL] = httpx.Response(200, headers={"content-type": "application/pdf"}, content=body)
+    assert asyncio.run(notemd_core.fetch_content_from_url(PAGE_URL)) == "[Content skipped: Not HTML - application/pdf]"
+    assert body.pieces_read == 0
+
+def test_long_pages_are_truncated_to_fetch_max_chars(settings, fake_web):
+    settings(FETCH_MAX_CHARS=100)
+    fake_web.pages[PAGE_URL] = httpx.Response(200, headers={"content-type": "text/html"}, text="<html><body>" + "<p>word</p>" * 1000 + "</body></html>")
+    text = asyncio.run(notemd_core.fetch_content_from_url(PAGE_URL))
+    assert text == ("word " * 20)[:100] + "... [content truncated]"
+
+def test_fetch_errors_are_reported_as_text(settings, fake_web):
+    fake_web.pages[PAGE_URL] = httpx.Response(500)
+    assert asyncio.run(notemd_core.fetch_content_from_url(PAGE_URL)).startswith("[Content skipped: Error fetching")
+
+@pytest.mark.parametrize("html", [
+    "<p>One</p>\n<p>  Two   words </p><script>var x = 1;</script><style>p {}</style><div>Three<span>Four</span></div>",
+    "<div>\n\n</div><p>Only\n\ttext</p>",
+])
+def test_extract_body_text_matches_selectolax(html):
+    body = HTMLParser(f"<html><body>{html}</body></html>").body
+    for node in body.css("script, style"):
+        node.decompose()
+    expected = re.sub(r"\s+", " ", body.text(separator=" ", strip=True)).strip()
+    assert notemd_core._extract_body_text(HTMLParser(f"<html><body>{html}</body></html>").body, 10_000) == expected
+
+def test_extract_body_text_stops_after_max_length():
+    body = HTMLParser("<html><body>" + "<p>word</p>" * 1000 + "</body></html>").body
+    text = notemd_core._extract_body_text(body, 50)
+    assert 50 < len(text) < 60
@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+import notemd_core
+from notemd_core import MarkdownPostProcessor, cleanup_latex_delimiters, find_duplicates, refine_mermaid_blocks
+
+SAMPLES = [
+    "Plain [[Link]] text.\n\n\n\nSecond paragraph with $ x + y $ and \\$5 and $$ E = mc^2 $$.",
+    "\\boxed{\nThe [[Answer]] is $ 42 $.\n}",
+    "\\boxed{\nNo closing brace here.\n\nJust text.",
+    "```markdown\n# Title\n\nBody with [[Note]].\n```",
+    "Intro\n\n```mermaid\ngraph TD\n  A[\"Start\"] --> B\n  B --> C\nTrailing text after an unclosed block\n\n## Next section",
+    "```(mermaid)\nsubgraph \"Group\"\n  A --> B\nend\n```\n\n```python\nprint('$ not latex $')\n```",
+    "```mermaid\ngraph LR\n```mermaid\ngraph TD\n  X --> Y\n",
+    "\n\n  leading and trailing whitespace  \n\n\n",
+    "Repeated words words and and repeated phrases phrases.\n\n\n\n\n\nMore repeated words.",
+    "",
+]
+
+def reference_add_links(text: str, remove_code_fences: bool) -> str:
+    """The add-links cleanup chain as process_content applied it before the fused post-processor."""
+    content = text.replace("\n\n\n", "\n\n").strip()
+    content = refine_mermaid_blocks(cleanup_latex_delimiters(content))
+    lines = content.split('\n')
+    if lines and lines[0].strip() == '\\boxed{':
+        lines.pop(0)
+        if lines and lines[-1].strip() == '}':
+            lines.pop()
+        content = '\n'.join(lines)
+    content = content.replace("```markdown", "")
+    if remove_code_fences:
+        content = content.replace("```", "")
+    return content
+
+def reference_generate(text: str) -> str:
+    content = refine_mermaid_blocks(cleanup_latex_delimiters(text))
+    lines = content.split('\n')
+    if lines and lines[0].strip() == '\\boxed{':
+        lines.pop(0)
+        if lines and lines[-1].strip() == '}':
+            lines.pop()
+        content = '\n'.join(lines)
+    return content
+
+def random_pieces(text: str, rng: random.Random):
+    cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(1, 12))))
+    bounds = [0] + cuts + [len(text)]
+    return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+def feed_pieces(processor: MarkdownPostProcessor, pieces) -> str:
+    return "".join(processor.feed(piece) for piece in pieces) + processor.finish()
+
+@pytest.mark.parametrize("remove_code_fences", [False, True])
+@pytest.mark.parametrize("text", SAMPLES)
+def test_add_links_processor_matches_reference_chain(text, remove_code_fences):
+    processor = MarkdownPostProcessor(collapse_blank_lines=True, strip_input=True, remove_markdown_fences=True,
+                                      remove_code_fences=remove_code_fences, track_duplicates=True)
+    expected = reference_add_links(text, remove_code_fences)
+    assert processor.process(text) == expected
+    assert processor.duplicate_words == find_duplicates(expected)
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_default_processor_matches_generate_title_chain(text):
+    assert MarkdownPostProcessor().process(text) == reference_generate(text)
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"strip_output": True},
+    {"collapse_blank_lines": True, "strip_input": True, "remove_markdown_fences": True, "track_duplicates": True},
+    {"collapse_blank_lines": True, "strip_input": True, "remove_code_fences": True},
+])
+def test_streamed_input_gives_the_batch_result(options):
+    rng = random.Random(9)
+    for text in SAMPLES + ["\n\n".join(SAMPLES)]:
+        batch_processor = MarkdownPostProcessor(**options)
+        expected = batch_processor.process(text)
+        for _ in range(25):
+            streamed_processor = MarkdownPostProcessor(**options)
+            assert feed_pieces(streamed_processor, random_pieces(text, rng)) == expected
+            assert streamed_processor.duplicate_words == batch_processor.duplicate_words
+
+def test_single_character_feeds_give_the_batch_result():
+    text = "\n\n".join(SAMPLES)
+    processor = MarkdownPostProcessor(collapse_blank_lines=True, strip_input=True, remove_markdown_fences=True)
+    assert feed_pieces(processor, list(text)) == MarkdownPostProcessor(collapse_blank_lines=True, strip_input=True, remove_markdown_fences=True).process(text)
+
+def test_add_links_postprocessor_follows_settings(settings):
+    settings(REMOVE_CODE_FENCES_ON_ADD_LINKS=True, ENABLE_DUPLICATE_DETECTION=False)
+    processor = notemd_core.create_add_links_postprocessor()
+    assert processor.process("```python\nx = 1\n```") == "python\nx = 1\n"
+    assert not processor.track_duplicates
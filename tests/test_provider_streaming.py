@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import notemd_core
+
+PROVIDERS = ["DeepSeek", "OpenAI", "Anthropic", "Google", "Mistral", "Azure OpenAI", "LMStudio", "Ollama", "OpenRouter"]
+CONTENT = "A paragraph long enough to arrive in several deltas, with [[links]] and $ x^2 $ in it."
+
+async def collect(stream):
+    return [delta async for delta in stream]
+
+@pytest.mark.parametrize("provider_name", PROVIDERS)
+def test_streamed_deltas_join_to_the_plain_response(settings, fake_llm, provider, provider_name):
+    config = provider(provider_name)
+    model = config.get("model") or "test-model"
+
+    async def run():
+        plain = await notemd_core.call_llm_api(config, model, "Add links.", CONTENT)
+        deltas = await collect(notemd_core.stream_llm_api(config, model, "Add links.", CONTENT))
+        return plain, deltas
+
+    plain, deltas = asyncio.run(run())
+    assert len(deltas) > 1
+    assert "".join(deltas) == plain
+    assert [call["stream"] for call in fake_llm.calls] == [False, True]
+
+@pytest.mark.parametrize("provider_name", ["OpenAI", "Anthropic", "Google", "Ollama"])
+def test_streamed_usage_is_recorded(settings, fake_llm, provider, provider_name):
+    config = provider(provider_name)
+    asyncio.run(collect(notemd_core.stream_llm_api(config, config["model"], "Add links.", CONTENT)))
+    state = notemd_core.get_rate_limiter(config, config["model"]).get_state()
+    assert (state["prompt_tokens"], state["completion_tokens"]) != (0, 0)
+    assert state["responses_without_usage"] == 0
+
+def test_errors_before_the_first_delta_fail_over(settings, fake_llm, provider):
+    settings(TASK_FALLBACK_PROVIDERS={"addLinks": ["Ollama"]})
+    fake_llm.reply = lambda call: httpx.Response(503, json={"error": "unavailable"}) if call["format"] == "openai" else call["content"]
+    deltas = asyncio.run(collect(notemd_core.stream_llm_api(provider("OpenAI"), "gpt-4o", "Add links.", CONTENT, task_type="addLinks")))
+    assert "".join(deltas) == CONTENT
+    assert [call["format"] for call in fake_llm.calls] == ["openai", "ollama"]
+    assert notemd_core.get_circuit_breaker("OpenAI").consecutive_failures == 1
+
+def test_abandoned_streams_are_closed_and_stay_metered(settings, fake_llm, provider):
+    settings(RATE_LIMITS={"OpenAI": {"tpm": 600}})
+    openai = provider("OpenAI")
+
+    async def run():
+        stream = notemd_core.stream_llm_api(openai, "gpt-4o", "Add links.", CONTENT)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(run()) == CONTENT[:fake_llm.delta_size]
+    state = notemd_core.get_rate_limiter(openai, "gpt-4o").get_state()
+    assert state["available_tokens"] < 540 - 10
+    assert notemd_core.get_circuit_breaker("OpenAI").consecutive_failures == 0
+
+def test_streaming_can_be_turned_off(settings, fake_llm, provider):
+    settings(ENABLE_PROVIDER_STREAMING=False)
+    deltas = asyncio.run(collect(notemd_core.stream_llm_api(provider("OpenAI"), "gpt-4o", "Add links.", CONTENT)))
+    assert deltas == [CONTENT]
+    assert [call["stream"] for call in fake_llm.calls] == [False]
+
+def test_openrouter_streams_fall_back_to_the_reasoning(settings, fake_llm, provider):
+    def reasoning_only(call):
+        deltas = [{"reasoning": CONTENT[:40]}, {"reasoning": CONTENT[40:]}, {"content": ""}]
+        body = "".join(f"data: {json.dumps({'choices': [{'delta': delta}]})}\n\n" for delta in deltas) + "data: [DONE]\n\n"
+        return httpx.Response(200, content=body.encode("utf-8")) if call["stream"] else httpx.Response(200, json={"choices": [{"message": {"content": None, "reasoning": CONTENT}}]})
+
+    fake_llm.reply = reasoning_only
+    openrouter = provider("OpenRouter")
+    model = openrouter.get("model") or "test-model"
+
+    async def run():
+        plain = await notemd_core.call_llm_api(openrouter, model, "Add links.", CONTENT)
+        deltas = await collect(notemd_core.stream_llm_api(openrouter, model, "Add links.", CONTENT))
+        return plain, deltas
+
+    assert asyncio.run(run()) == (CONTENT, [CONTENT])
+    # Content deltas win over reasoning, which is then dropped.
+    fake_llm.reply = lambda call: httpx.Response(200, content=(
+        "data: " + json.dumps({"choices": [{"delta": {"reasoning": "Thinking."}}]}) + "\n\n"
+        "data: " + json.dumps({"choices": [{"delta": {"content": "Answer."}}]}) + "\n\ndata: [DONE]\n\n").encode("utf-8"))
+    assert asyncio.run(collect(notemd_core.stream_llm_api(openrouter, model, "Add links.", CONTENT))) == ["Answer."]
@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+import pytest
+
+import notemd_core
+from notemd_core import ProviderRateLimiter
+
+def test_provider_limits_are_shared_across_models(settings, provider):
+    settings(RATE_LIMITS={"OpenAI": {"rpm": 60, "tpm": 10000}})
+    openai = provider("OpenAI")
+    limiter = notemd_core.get_rate_limiter(openai, "gpt-4o")
+    assert notemd_core.get_rate_limiter(openai, "gpt-4o-mini") is limiter
+    assert (limiter.rpm, limiter.tpm) == (60, 10000)
+
+def test_model_limits_get_their_own_limiter(settings, provider):
+    settings(RATE_LIMITS={"OpenAI": {"rpm": 60}, "OpenAI/gpt-4o": {"rpm": 10, "tpm": 5000}})
+    openai = provider("OpenAI")
+    model_limiter = notemd_core.get_rate_limiter(openai, "gpt-4o")
+    provider_limiter = notemd_core.get_rate_limiter(openai, "gpt-4o-mini")
+    assert model_limiter is not provider_limiter
+    assert (model_limiter.rpm, model_limiter.tpm, provider_limiter.rpm) == (10, 5000, 60)
+    assert [(state["provider"], state["model"]) for state in notemd_core.get_rate_limiter_states()] == [
+        ("OpenAI", "gpt-4o"), ("OpenAI", None)]
+
+def test_unlimited_models_do_not_share_counters(settings, provider):
+    openai = provider("OpenAI")
+    assert notemd_core.get_rate_limiter(openai, "gpt-4o") is not notemd_core.get_rate_limiter(openai, "gpt-4o-mini")
+
+def test_settle_corrects_the_reservation_to_real_usage():
+    limiter = ProviderRateLimiter(None, 1000, 1.0)
+
+    async def run():
+        reserved = await limiter.acquire(400)
+        limiter.settle(reserved, {"prompt_tokens": 100, "completion_tokens": 50})
+        return reserved
+
+    assert asyncio.run(run()) == 400
+    assert limiter.get_state()["available_tokens"] == pytest.approx(850, abs=1)
+
+def test_failed_calls_refund_their_reservation():
+    limiter = ProviderRateLimiter(None, 1000, 1.0)
+
+    async def run():
+        limiter.settle(await limiter.acquire(400), {}, failed=True)
+        limiter.settle(await limiter.acquire(300), {})
+
+    asyncio.run(run())
+    state = limiter.get_state()
+    assert state["available_tokens"] == pytest.approx(700, abs=1)
+    assert state["responses_without_usage"] == 1
+
+def test_calls_wait_for_tokens_to_be_returned():
+    # Refilling the missing 400 tokens would take 40 seconds; the refund wakes the waiter at once.
+    limiter = ProviderRateLimiter(None, 600, 1.0)
+
+    async def run():
+        first = await limiter.acquire(500)
+        waiting = asyncio.create_task(limiter.acquire(500))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        limiter.settle(first, {"prompt_tokens": 50, "completion_tokens": 50})
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(run()) == 500
+    assert limiter.get_state()["throttled_requests"] == 1
+
+def test_pause_holds_back_calls():
+    limiter = ProviderRateLimiter(60, None, 1.0)
+    limiter.pause(0.2)
+    limiter.pause(0.05)
+    assert 0.1 < limiter.get_state()["blocked_for_seconds"] <= 0.2
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        await limiter.acquire(0)
+        return asyncio.get_running_loop().time() - started
+
+    assert asyncio.run(run()) >= 0.1
+
+def test_provider_calls_record_reported_usage(settings, fake_llm, provider):
+    settings(RATE_LIMITS={"OpenAI": {"tpm": 600}})
+    openai = provider("OpenAI")
+
+    async def run():
+        await notemd_core.call_provider_api(openai, "gpt-4o", "Add links.", "Some content to link.")
+        fake_llm.reply = lambda call: httpx.Response(400, json={"error": "bad request"})
+        with pytest.raises(httpx.HTTPStatusError):
+            await notemd_core.call_provider_api(openai, "gpt-4o-mini", "Add links.", "Other content.")
+
+    asyncio.run(run())
+    state = notemd_core.get_rate_limiter(openai, "gpt-4o").get_state()
+    assert state["requests"] == 2
+    assert state["prompt_tokens"] > 0 and state["completion_tokens"] > 0
+    expected_available = 540 - state["prompt_tokens"] - state["completion_tokens"]
+    assert state["available_tokens"] == pytest.approx(expected_available, abs=2)
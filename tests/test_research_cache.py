@@ -0,0 +1,97 @@
+import asyncio
+
+import httpx
+
+import notemd_core
+
+DDG_URL = "https://html.duckduckgo.com/html/"
+PAGE_URL = "https://example.com/quantum"
+
+def ddg_results(*urls):
+    results = "".join(f'<div class="result--html"><a class="result__a" href="{url}">Title {i}</a>'
+                      f'<a class="result__snippet">Snippet {i}</a></div>' for i, url in enumerate(urls))
+    return httpx.Response(200, html=f"<html><body>{results}</body></html>")
+
+def page(text, **headers):
+    return httpx.Response(200, headers={"content-type": "text/html; charset=utf-8", **headers}, text=f"<html><body><p>{text}</p></body></html>")
+
+def test_search_results_are_cached_per_normalized_query(settings, fake_web):
+    settings(SEARCH_PROVIDER="duckduckgo")
+    fake_web.pages[DDG_URL] = ddg_results(PAGE_URL)
+    fake_web.pages[PAGE_URL] = page("Quantum text.")
+
+    async def run():
+        return [await notemd_core._perform_research(topic, False) for topic in ("Quantum Physics", "  quantum   physics ", "Relativity")]
+
+    first, second, third = asyncio.run(run())
+    assert "Quantum text." in first and "Quantum text." in second
+    searches = [request for request in fake_web.requests if str(request.url).startswith(DDG_URL)]
+    assert len(searches) == 2
+    assert notemd_core.get_research_cache().get_stats()["query_hits"] == 1
+
+def test_tavily_results_are_cached(settings, fake_web):
+    settings(SEARCH_PROVIDER="tavily", TAVILY_API_KEY="key")
+    fake_web.pages[notemd_core.SETTINGS["TAVILY_SEARCH_URL"]] = httpx.Response(200, json={"results": [{"title": "T", "url": PAGE_URL, "content": "Snippet."}]})
+
+    async def run():
+        return [await notemd_core._perform_research("Topic", False) for _ in range(2)]
+
+    first, second = asyncio.run(run())
+    assert first == second and "Snippet." in first
+    assert len(fake_web.requests) == 1
+
+def test_fresh_pages_are_served_from_the_cache(settings, fake_web):
+    fake_web.pages[PAGE_URL] = page("Cached text.")
+
+    async def run():
+        return [await notemd_core.fetch_content_from_url(PAGE_URL) for _ in range(2)]
+
+    assert asyncio.run(run()) == ["Cached text.", "Cached text."]
+    assert len(fake_web.requests) == 1
+
+def test_stale_pages_are_revalidated(settings, fake_web, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(notemd_core.time, "time", lambda: now[0])
+    settings(RESEARCH_URL_CACHE_TTL=60)
+
+    def respond(request):
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return page("Original text.", etag='"v1"')
+
+    fake_web.pages[PAGE_URL] = respond
+
+    async def fetch():
+        return await notemd_core.fetch_content_from_url(PAGE_URL)
+
+    assert asyncio.run(fetch()) == "Original text."
+    now[0] += 120
+    assert asyncio.run(fetch()) == "Original text."
+    assert fake_web.requests[-1].headers["if-none-match"] == '"v1"'
+    assert notemd_core.get_research_cache().get_stats()["url_revalidated"] == 1
+
+    now[0] += 30
+    asyncio.run(fetch())
+    assert len(fake_web.requests) == 2
+
+def test_changed_pages_are_refetched(settings, fake_web, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(notemd_core.time, "time", lambda: now[0])
+    settings(RESEARCH_URL_CACHE_TTL=60)
+    versions = iter([page("Old text.", etag='"v1"'), page("New text.", etag='"v2"')])
+    fake_web.pages[PAGE_URL] = lambda request: next(versions)
+
+    async def fetch():
+        return await notemd_core.fetch_content_from_url(PAGE_URL)
+
+    assert asyncio.run(fetch()) == "Old text."
+    now[0] += 120
+    assert asyncio.run(fetch()) == "New text."
+    assert notemd_core.get_research_cache().get_stats()["url_refetched"] == 1
+
+def test_query_cache_evicts_least_recently_used():
+    cache = notemd_core.ResearchCache(2, 0, 2, 0)
+    for query in ("a", "b", "c"):
+        cache.set_search_results(query, [{"title": query}])
+    assert cache.get_search_results("a") is None
+    assert cache.get_search_results("c") == [{"title": "c"}]
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+import notemd_core
+from notemd_core import _parse_wait_seconds, get_retry_after_seconds
+
+@pytest.mark.parametrize("value,seconds", [("7", 7), ("1.5", 1.5), ("6m0s", 360), ("20ms", 0.02), ("1h2m3s", 3723), ("", None), ("soon", None)])
+def test_parse_wait_seconds_durations(value, seconds):
+    assert _parse_wait_seconds(value) == seconds
+
+def test_parse_wait_seconds_timestamps():
+    in_30s = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert _parse_wait_seconds(str(time.time() + 30)) == pytest.approx(30, abs=1)
+    assert _parse_wait_seconds(format_datetime(in_30s, usegmt=True)) == pytest.approx(30, abs=2)
+    assert _parse_wait_seconds(in_30s.isoformat().replace("+00:00", "Z")) == pytest.approx(30, abs=1)
+
+@pytest.mark.parametrize("headers,seconds", [
+    ({"retry-after-ms": "1500", "retry-after": "9"}, 1.5),
+    ({"retry-after": "4"}, 4),
+    ({"retry-after": "later", "x-ratelimit-reset-requests": "2s"}, 2),
+    ({"x-ratelimit-reset-requests": "1s", "x-ratelimit-reset-tokens": "6m0s"}, 360),
+    ({"retry-after": "-5"}, 0),
+    ({}, None),
+])
+def test_get_retry_after_seconds(headers, seconds):
+    assert get_retry_after_seconds(httpx.Response(429, headers=headers)) == seconds
+
+def test_backoff_doubles_up_to_the_cap(settings):
+    settings(API_CALL_INTERVAL=2, API_CALL_MAX_BACKOFF=10, API_CALL_BACKOFF_JITTER=0)
+    assert [notemd_core.compute_backoff_delay(attempt) for attempt in range(1, 5)] == [2, 4, 8, 10]
+    settings(API_CALL_BACKOFF_JITTER=1)
+    assert all(0 <= notemd_core.compute_backoff_delay(3) <= 8 for _ in range(50))
+
+@pytest.fixture
+def recorded_delays(monkeypatch):
+    """Replaces the retry sleeps; returns the requested delays in milliseconds."""
+    delays = []
+
+    async def no_wait(ms, cancelled):
+        delays.append(ms)
+
+    monkeypatch.setattr(notemd_core, "cancellable_delay", no_wait)
+    return delays
+
+def call_with_retry(provider):
+    return asyncio.run(notemd_core.call_api_with_retry(provider("OpenAI"), "gpt-4o", "Add links.", "Some text.", False))
+
+def test_429_waits_for_retry_after(settings, fake_llm, provider, recorded_delays):
+    settings(API_CALL_INTERVAL=0.01)
+    replies = iter([httpx.Response(429, headers={"retry-after": "3"}, json={}), "done"])
+    fake_llm.reply = lambda call: next(replies)
+    assert call_with_retry(provider) == "done"
+    assert len(recorded_delays) == 1 and recorded_delays[0] >= 3000
+    assert notemd_core.get_rate_limiter(provider("OpenAI"), "gpt-4o").get_state()["blocked_for_seconds"] > 2
+
+def test_retry_after_is_capped(settings, fake_llm, provider, recorded_delays):
+    settings(API_CALL_MAX_RETRY_AFTER=5)
+    replies = iter([httpx.Response(429, headers={"retry-after": "3600"}, json={}), "done"])
+    fake_llm.reply = lambda call: next(replies)
+    assert call_with_retry(provider) == "done"
+    assert recorded_delays[0] <= 5000
+
+def test_client_errors_are_not_retried(settings, fake_llm, provider, recorded_delays):
+    fake_llm.reply = lambda call: httpx.Response(400, json={"error": "bad request"})
+    with pytest.raises(httpx.HTTPStatusError):
+        call_with_retry(provider)
+    assert len(fake_llm.calls) == 1 and not recorded_delays
+
+def test_server_errors_are_retried_until_attempts_run_out(settings, fake_llm, provider, recorded_delays):
+    settings(API_CALL_MAX_RETRIES=2)
+    fake_llm.reply = lambda call: httpx.Response(500, json={"error": "down"})
+    with pytest.raises(Exception, match="after 3 attempts"):
+        call_with_retry(provider)
+    assert len(fake_llm.calls) == 3 and len(recorded_delays) == 2
+
+def test_retry_budget_limits_retries(settings, fake_llm, provider, recorded_delays):
+    settings(API_CALL_MAX_RETRIES=3, RETRY_BUDGET_MIN_RETRIES=1, RETRY_BUDGET_RATIO=0, CIRCUIT_BREAKER_FAILURE_THRESHOLD=100)
+    fake_llm.reply = lambda call: httpx.Response(503, json={"error": "overloaded"})
+    with pytest.raises(Exception, match="after 2 attempts"):
+        call_with_retry(provider)
+    with pytest.raises(Exception, match="after 1 attempts"):
+        call_with_retry(provider)
+    assert len(fake_llm.calls) == 3
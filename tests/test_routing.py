@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import notemd_core
+from notemd_core import CircuitBreaker, ProviderUnavailableError
+
+def fail_openai(call):
+    if call["format"] == "openai":
+        return httpx.Response(500, json={"error": "unavailable"})
+    return f"{call['format']}: {call['content']}"
+
+def route(provider, content="Some content."):
+    return asyncio.run(notemd_core.route_llm_call("addLinks", provider("OpenAI"), "gpt-4o", "Add links.", content))
+
+def test_breaker_opens_after_the_threshold_and_half_opens_after_the_timeout():
+    breaker = CircuitBreaker(3, 0.05)
+    for _ in range(2):
+        breaker.record(False, breaker.allow_request())
+    assert breaker.get_state() == {"state": "closed", "consecutive_failures": 2}
+    breaker.record(False, breaker.allow_request())
+    assert breaker.state == "open" and breaker.allow_request() is None and not breaker.is_available()
+
+    time.sleep(0.06)
+    assert breaker.is_available()
+    trial = breaker.allow_request()
+    assert trial is not None and breaker.state == "half_open"
+    breaker.record(True, trial)
+    assert breaker.get_state() == {"state": "closed", "consecutive_failures": 0}
+
+def test_failed_trial_opens_the_circuit_again():
+    breaker = CircuitBreaker(1, 0)
+    breaker.record(False, breaker.allow_request())
+    trial = breaker.allow_request()
+    assert breaker.state == "half_open"
+    breaker.record(False, trial)
+    assert breaker.state == "open"
+
+def test_half_open_circuit_lets_a_single_trial_through():
+    breaker = CircuitBreaker(1, 0)
+    breaker.record(False, breaker.allow_request())
+    trial = breaker.allow_request()
+    assert trial is not None
+    assert breaker.allow_request() is None and not breaker.is_available()
+    breaker.record(None, trial)
+    assert breaker.allow_request() is not None
+
+def test_calls_admitted_while_closed_do_not_end_the_trial():
+    breaker = CircuitBreaker(1, 0)
+    closed_admission = breaker.allow_request()
+    breaker.record(False, breaker.allow_request())
+    trial = breaker.allow_request()
+    breaker.record(None, closed_admission)
+    assert breaker.allow_request() is None
+    breaker.record(True, trial)
+    assert breaker.state == "closed"
+
+@pytest.mark.parametrize("status, counted", [(500, True), (503, True), (400, False), (429, False)])
+def test_only_server_errors_count_as_provider_failures(status, counted):
+    error = httpx.HTTPStatusError("error", request=httpx.Request("POST", "https://example.test"), response=httpx.Response(status))
+    assert notemd_core.is_provider_failure(error) is counted
+    assert notemd_core.is_provider_failure(httpx.ConnectError("refused"))
+    assert not notemd_core.is_provider_failure(ValueError("bad response"))
+
+def test_failed_provider_falls_back_along_the_route(settings, fake_llm, provider):
+    settings(TASK_FALLBACK_PROVIDERS={"addLinks": ["OpenAI/gpt-4o", "Ollama/llama3"]})
+    fake_llm.reply = fail_openai
+    assert route(provider) == "ollama: Some content."
+    assert [call["format"] for call in fake_llm.calls] == ["openai", "ollama"]
+    assert fake_llm.calls[1]["payload"]["model"] == "llama3"
+    assert notemd_core.get_routing_stats()["failovers"] == 1
+
+def test_open_circuits_are_skipped(settings, fake_llm, provider):
+    settings(TASK_FALLBACK_PROVIDERS={"addLinks": ["Ollama"]}, CIRCUIT_BREAKER_FAILURE_THRESHOLD=2, CIRCUIT_BREAKER_RESET_TIMEOUT=60)
+    fake_llm.reply = fail_openai
+    for _ in range(3):
+        assert route(provider).startswith("ollama: ")
+    assert [call["format"] for call in fake_llm.calls] == ["openai", "ollama", "openai", "ollama", "ollama"]
+    assert notemd_core.get_circuit_breaker("OpenAI").state == "open"
+    assert notemd_core.get_routing_stats()["skipped_open_circuits"] == 1
+
+def test_client_errors_neither_fail_over_nor_open_the_circuit(settings, fake_llm, provider):
+    settings(TASK_FALLBACK_PROVIDERS={"addLinks": ["Ollama"]}, CIRCUIT_BREAKER_FAILURE_THRESHOLD=1)
+    fake_llm.reply = lambda call: httpx.Response(400, json={"error": "bad request"}) if call["format"] == "openai" else "fallback"
+    # Every route entry is still tried, but a 4xx says nothing about the provider's health.
+    assert route(provider) == "fallback"
+    assert notemd_core.get_circuit_breaker("OpenAI").state == "closed"
+
+def test_every_circuit_open_raises_provider_unavailable(settings, fake_llm, provider):
+    settings(TASK_FALLBACK_PROVIDERS={"addLinks": ["Ollama"]})
+    for name in ("OpenAI", "Ollama"):
+        breaker = notemd_core.get_circuit_breaker(name)
+        for _ in range(breaker.failure_threshold):
+            breaker.record(False)
+    with pytest.raises(ProviderUnavailableError):
+        route(provider)
+    assert fake_llm.calls == []
+
+def test_last_error_is_raised_when_every_provider_fails(settings, fake_llm, provider):
+    settings(TASK_FALLBACK_PROVIDERS={"addLinks": ["Ollama"]})
+    fake_llm.reply = lambda call: httpx.Response(503, json={"error": "unavailable"})
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        route(provider)
+    assert error.value.response.status_code == 503
+    assert len(fake_llm.calls) == 2
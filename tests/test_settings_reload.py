@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+
+import config
+import main
+import notemd_core
+
+def test_bound_snapshot_survives_a_reload(settings):
+    settings(MAX_TOKENS=1000)
+
+    async def read_max_tokens():
+        await asyncio.sleep(0)
+        return notemd_core.SETTINGS["MAX_TOKENS"]
+
+    async def run():
+        with notemd_core.settings_snapshot():
+            notemd_core.reload_settings({**notemd_core._SETTINGS_SNAPSHOT, "MAX_TOKENS": 2000})
+            in_task = await asyncio.create_task(read_max_tokens())
+            in_thread = await asyncio.to_thread(lambda: notemd_core.SETTINGS["MAX_TOKENS"])
+            return notemd_core.SETTINGS["MAX_TOKENS"], in_task, in_thread
+
+    assert asyncio.run(run()) == (1000, 1000, 1000)
+    assert notemd_core.SETTINGS["MAX_TOKENS"] == 2000
+
+def test_unbound_readers_see_the_latest_snapshot(settings):
+    settings(MAX_TOKENS=1000)
+    notemd_core.reload_settings({**notemd_core.current_settings(), "MAX_TOKENS": 3000})
+    assert notemd_core.SETTINGS["MAX_TOKENS"] == 3000
+    with pytest.raises(TypeError):
+        notemd_core.SETTINGS["MAX_TOKENS"] = 1
+
+def test_reload_reports_changes_and_resets_dependents(settings, provider):
+    settings(RATE_LIMITS={"OpenAI": {"rpm": 60}})
+    openai = provider("OpenAI")
+    limiter = notemd_core.get_rate_limiter(openai, "gpt-4o")
+    breaker = notemd_core.get_circuit_breaker("OpenAI")
+
+    result = notemd_core.reload_settings({**notemd_core.current_settings(), "MAX_TOKENS": 1234, "JOB_WORKERS": 9})
+    assert result == {"changed": ["JOB_WORKERS", "MAX_TOKENS"], "restart_required": ["JOB_WORKERS"]}
+    assert notemd_core.get_rate_limiter(openai, "gpt-4o") is limiter
+    assert notemd_core.get_circuit_breaker("OpenAI") is breaker
+
+    notemd_core.reload_settings({**notemd_core.current_settings(), "RATE_LIMITS": {"OpenAI": {"rpm": 30}}, "CIRCUIT_BREAKER_RESET_TIMEOUT": 5})
+    assert notemd_core.get_rate_limiter(openai, "gpt-4o").rpm == 30
+    assert notemd_core.get_circuit_breaker("OpenAI") is not breaker
+
+def test_requests_keep_the_settings_they_started_with(settings, fake_llm):
+    settings(ENABLE_ADAPTIVE_CHUNK_SIZE=False, MAX_TOKENS=1000, CUSTOM_PROMPT_ADD_LINKS="Old prompt.")
+    fake_llm.delay = 0.05
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver") as client:
+            request = asyncio.create_task(client.post("/process_content", json={"content": "Some content."}))
+            while not fake_llm.calls:
+                await asyncio.sleep(0.005)
+            notemd_core.reload_settings({**notemd_core.current_settings(), "CUSTOM_PROMPT_ADD_LINKS": "New prompt."})
+            await request
+            await client.post("/process_content", json={"content": "More content."})
+
+    asyncio.run(run())
+    prompts = [call["payload"]["messages"][0]["content"] for call in fake_llm.calls]
+    assert prompts == ["Old prompt.", "New prompt."]
+
+async def post_reload(client_host: str, **headers) -> httpx.Response:
+    transport = httpx.ASGITransport(app=main.app, client=(client_host, 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        return await client.post("/admin/reload_settings", headers=headers)
+
+def test_reload_endpoint_is_loopback_only_without_a_token(settings, monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "")
+    assert asyncio.run(post_reload("203.0.113.5")).status_code == 403
+    response = asyncio.run(post_reload("127.0.0.1"))
+    assert response.status_code == 200 and response.json()["status"] == "reloaded"
+
+def test_reload_endpoint_requires_the_admin_token(settings, monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    missing = asyncio.run(post_reload("127.0.0.1"))
+    wrong = asyncio.run(post_reload("127.0.0.1", authorization="Bearer wrong"))
+    assert (missing.status_code, wrong.status_code) == (401, 401)
+    assert missing.headers["www-authenticate"] == "Bearer"
+    assert asyncio.run(post_reload("203.0.113.5", authorization="Bearer secret")).status_code == 200
+
+def test_multi_worker_reload_without_sighup_is_refused(settings, monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    monkeypatch.setenv("NOTEMD_SERVER_WORKERS", "2")
+    monkeypatch.delattr(main.signal, "SIGHUP", raising=False)
+    killed = []
+    monkeypatch.setattr(main.os, "kill", lambda *args: killed.append(args))
+    response = asyncio.run(post_reload("127.0.0.1", authorization="Bearer secret"))
+    assert response.status_code == 501
+    assert killed == []
+
+def test_loopback_fallback_is_refused_behind_a_proxy(settings, monkeypatch):
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "")
+    assert asyncio.run(post_reload("127.0.0.1", **{"x-forwarded-for": "203.0.113.5"})).status_code == 403
+    assert asyncio.run(post_reload("127.0.0.1", forwarded="for=203.0.113.5")).status_code == 403
+    monkeypatch.setenv("NOTEMD_SERVER_WORKERS", "1")
+    assert asyncio.run(post_reload("127.0.0.1")).status_code == 403
+    monkeypatch.setattr(config, "ADMIN_TOKEN", "secret")
+    assert asyncio.run(post_reload("127.0.0.1", authorization="Bearer secret")).status_code == 200
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import main
+
+SMALL_CHUNKS = {"ENABLE_ADAPTIVE_CHUNK_SIZE": False, "MAX_TOKENS": 1000, "CUSTOM_PROMPT_ADD_LINKS": "Add links."}
+DOCUMENT = "\n\n".join(f"Paragraph {i} with $ x_{i} $ and " + "more words " * 20 for i in range(20))
+GENERATED = "\\boxed{\n# Title with $ a + b $\n\n```mermaid\ngraph TD\n  A[\"One\"] --> B\nText after the diagram.\n}"
+
+def add_links_reply(call):
+    # Unclosed Mermaid blocks and LaTeX make the post-processor carry state across chunk boundaries.
+    return f"```mermaid\ngraph LR\n  X --> Y\n{call['content']}\n\n\n"
+
+def parse_events(body: str, stream_format: str):
+    if stream_format == "ndjson":
+        return [json.loads(line) for line in body.splitlines() if line]
+    events = []
+    for block in body.split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if line)
+        if lines:
+            event = json.loads(lines["data"])
+            assert event["event"] == lines["event"]
+            events.append(event)
+    return events
+
+async def post(path: str, body: dict) -> httpx.Response:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver") as client:
+        return await client.post(path, json=body)
+
+async def plain_and_streamed(path: str, body: dict, stream_format: str):
+    plain = await post(path, body)
+    streamed = await post(f"{path}/stream?format={stream_format}", body)
+    assert plain.status_code == 200 and streamed.status_code == 200
+    return plain.json(), parse_events(streamed.text, stream_format)
+
+@pytest.mark.parametrize("stream_format", ["sse", "ndjson"])
+@pytest.mark.parametrize("provider_name", ["OpenAI", "Anthropic", "Google", "Ollama"])
+def test_streamed_process_content_matches_the_plain_response(settings, fake_llm, provider_name, stream_format):
+    settings(**SMALL_CHUNKS, ACTIVE_PROVIDER=provider_name)
+    fake_llm.reply = add_links_reply
+    fake_llm.delta_size = 3
+    plain, events = asyncio.run(plain_and_streamed("/process_content", {"content": DOCUMENT}, stream_format))
+
+    assert events[0]["event"] == "start" and events[-1]["event"] == "done"
+    total_chunks = events[0]["total_chunks"]
+    assert total_chunks > 1
+    assert [e["completed_chunks"] for e in events if e["event"] == "progress"] == list(range(1, total_chunks + 1))
+    assert "".join(e["content"] for e in events if e["event"] == "chunk") == plain["processed_content"]
+    assert {call["stream"] for call in fake_llm.calls} == {False, True}
+
+@pytest.mark.parametrize("provider_name", ["OpenAI", "Anthropic"])
+def test_streamed_process_content_matches_with_parallel_chunks(settings, fake_llm, provider_name):
+    settings(**SMALL_CHUNKS, ACTIVE_PROVIDER=provider_name, ENABLE_PARALLEL_CHUNK_PROCESSING=True)
+    fake_llm.reply = add_links_reply
+    plain, events = asyncio.run(plain_and_streamed("/process_content", {"content": DOCUMENT}, "ndjson"))
+    assert "".join(e["content"] for e in events if e["event"] == "chunk") == plain["processed_content"]
+
+@pytest.mark.parametrize("provider_name", ["OpenAI", "Google", "Ollama"])
+def test_streamed_generate_title_matches_the_plain_response(settings, fake_llm, provider_name):
+    settings(ACTIVE_PROVIDER=provider_name, ENABLE_REQUEST_COALESCING=False)
+    fake_llm.reply = lambda call: GENERATED
+    fake_llm.delta_size = 2
+    plain, events = asyncio.run(plain_and_streamed("/generate_title", {"title": "Topic"}, "sse"))
+    assert "".join(e["content"] for e in events if e["event"] == "chunk") == plain["generated_content"]
+    assert not plain["generated_content"].startswith("\\boxed{")
+    assert events[-1] == {"event": "done", "total_chunks": 1, "tokens": events[-1]["tokens"]}
+
+def test_stream_reports_errors_as_events(settings, fake_llm):
+    settings(**SMALL_CHUNKS)
+    fake_llm.reply = lambda call: httpx.Response(401, json={"error": "bad key"})
+    response = asyncio.run(post("/process_content/stream?format=ndjson", {"content": "Some text."}))
+    events = parse_events(response.text, "ndjson")
+    assert events[0]["event"] == "start" and events[-1]["event"] == "error"
+    assert "401" in events[-1]["detail"]
+
+def test_unknown_stream_format_is_rejected(settings, fake_llm):
+    assert asyncio.run(post("/process_content/stream?format=xml", {"content": "Some text."})).status_code == 400
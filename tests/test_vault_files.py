@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+import main
+import notemd_core
+
+SMALL_CHUNKS = {"ENABLE_ADAPTIVE_CHUNK_SIZE": False, "MAX_TOKENS": 1000, "CUSTOM_PROMPT_ADD_LINKS": "Add links."}
+NOTE = "\n\n".join(f"Paragraph {i} about $ x_{i} $ and " + "more words " * 30 for i in range(20))
+
+def linked(call):
+    return f"```mermaid\ngraph LR\n  X --> Y\n{call['content']}\n\n"
+
+def write_note(vault, rel_path, content=NOTE):
+    path = vault / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding="utf-8")
+
+def test_vault_file_output_matches_process_content(settings, fake_llm, vault):
+    settings(**SMALL_CHUNKS)
+    fake_llm.reply = linked
+    write_note(vault, "folder/note.md")
+    result = asyncio.run(notemd_core.process_vault_file("folder/note.md"))
+    expected = asyncio.run(notemd_core.process_content(NOTE))
+    output = vault / "Processed" / "folder" / "note_processed.md"
+    assert result == {"path": "folder/note.md", "output_path": os.path.join("Processed", "folder", "note_processed.md"),
+                      "chunks": result["chunks"], "characters": len(expected)}
+    assert result["chunks"] > 1
+    assert output.read_text(encoding="utf-8") == expected
+
+def test_output_path_can_be_chosen_but_not_the_note_itself(settings, fake_llm, vault):
+    settings(**SMALL_CHUNKS)
+    write_note(vault, "note.md", "Short note.")
+    asyncio.run(notemd_core.process_vault_file("note.md", "out/linked.md"))
+    assert (vault / "out" / "linked.md").read_text(encoding="utf-8") == "Short note."
+    with pytest.raises(ValueError):
+        asyncio.run(notemd_core.process_vault_file("note.md", "./note.md"))
+    with pytest.raises(ValueError):
+        asyncio.run(notemd_core.process_vault_file("missing.md"))
+
+@pytest.mark.parametrize("path", ["../outside.md", "/etc/passwd", "folder/../../outside.md"])
+def test_paths_outside_the_vault_are_rejected(settings, vault, path):
+    with pytest.raises(ValueError):
+        notemd_core.resolve_vault_path(path)
+
+def test_failed_processing_leaves_no_output(settings, fake_llm, vault):
+    settings(**SMALL_CHUNKS)
+    fake_llm.reply = lambda call: httpx.Response(400, json={"error": "bad request"})
+    write_note(vault, "note.md")
+    with pytest.raises(Exception):
+        asyncio.run(notemd_core.process_vault_file("note.md"))
+    assert [path for path in vault.rglob("*") if path.is_file()] == [vault / "note.md"]
+
+def test_process_file_endpoints(settings, fake_llm, vault):
+    settings(**SMALL_CHUNKS)
+    write_note(vault, "note.md", "A note by path.")
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver") as client:
+            by_path = await client.post("/process_file", json={"path": "note.md"})
+            outside = await client.post("/process_file", json={"path": "../note.md"})
+            uploaded = await client.post("/process_file/upload", files={"file": ("upload.md", b"An uploaded note.", "text/markdown")})
+            return by_path, outside, uploaded
+
+    by_path, outside, uploaded = asyncio.run(run())
+    assert by_path.status_code == 200 and by_path.json()["output_path"] == os.path.join("Processed", "note_processed.md")
+    assert (vault / "Processed" / "note_processed.md").read_text(encoding="utf-8") == "A note by path."
+    assert outside.status_code == 400
+    assert uploaded.status_code == 200
+    assert (vault / "Processed" / "upload_processed.md").read_text(encoding="utf-8") == "An uploaded note."
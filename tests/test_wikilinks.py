@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import time
+
+import httpx
+import pytest
+
+import main
+import notemd_core
+from notemd_core import extract_wikilink_targets
+
+def write_notes(vault, notes):
+    for rel_path, content in notes.items():
+        path = vault / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+
+def read_notes(vault):
+    return {str(path.relative_to(vault)): path.read_text(encoding="utf-8") for path in vault.rglob("*.md")}
+
+NOTES = {
+    "Old.md": "# Old\n",
+    "linking.md": "See [[Old]], [[Old#Intro]] and [[Old|the old note]].\n",
+    "folder/nested.md": "- [[Old]]\n- [[Other]]\n",
+    "unrelated.md": "Only [[Other]] here, and the word Old.\n",
+}
+
+def test_extract_wikilink_targets():
+    content = "[[Note]] [[folder/Deep Note#Heading|alias]] ![[Embed.png]] [[ Spaced ]] [[#Local heading]]"
+    assert extract_wikilink_targets(content) == {"note", "deep note", "embed.png", "spaced"}
+
+def test_index_finds_only_referencing_notes(settings, vault):
+    write_notes(vault, NOTES)
+    index = notemd_core.get_wikilink_index()
+    assert index.refresh() == {"scanned": 4, "reindexed": 4, "removed": 0}
+    assert index.files_linking_to("OLD") == [str(vault / "folder" / "nested.md"), str(vault / "linking.md")]
+    assert index.files_linking_to("Missing") == []
+
+def test_index_is_persisted_and_refreshed_incrementally(settings, vault):
+    write_notes(vault, NOTES)
+    index = notemd_core.get_wikilink_index()
+    index.refresh()
+    index.save()
+    assert json.loads(open(index.index_path, encoding="utf-8").read())["files"]["linking.md"]["targets"] == ["old"]
+
+    reloaded = notemd_core.WikilinkIndex(str(vault), index.index_path)
+    assert reloaded.refresh() == {"scanned": 4, "reindexed": 0, "removed": 0}
+    (vault / "unrelated.md").write_text("Now links to [[Old]] as well, with more text.\n", encoding="utf-8")
+    os.remove(vault / "linking.md")
+    assert reloaded.refresh() == {"scanned": 3, "reindexed": 1, "removed": 1}
+    assert reloaded.files_linking_to("Old") == [str(vault / "folder" / "nested.md"), str(vault / "unrelated.md")]
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_rename_rewrites_links(settings, vault, use_index):
+    settings(ENABLE_WIKILINK_INDEX=use_index)
+    write_notes(vault, NOTES)
+    asyncio.run(notemd_core.handle_file_rename("Old.md", "New.md"))
+    notes = read_notes(vault)
+    assert notes["linking.md"] == "See [[New]], [[New#Intro]] and [[New|the old note]].\n"
+    assert notes[os.path.join("folder", "nested.md")] == "- [[New]]\n- [[Other]]\n"
+    assert notes["unrelated.md"] == NOTES["unrelated.md"]
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_delete_removes_links_and_empty_list_items(settings, vault, use_index):
+    settings(ENABLE_WIKILINK_INDEX=use_index)
+    write_notes(vault, NOTES)
+    asyncio.run(notemd_core.handle_file_delete("Old.md"))
+    notes = read_notes(vault)
+    assert notes[os.path.join("folder", "nested.md")] == "- [[Other]]"
+    assert "[[Old]]" not in notes["linking.md"]
+    if use_index:
+        # The full-vault scan strips every note, as it always did; the index only opens linking notes.
+        assert notes["unrelated.md"] == NOTES["unrelated.md"]
+
+def test_index_follows_rewrites(settings, vault):
+    write_notes(vault, NOTES)
+    asyncio.run(notemd_core.handle_file_rename("Old.md", "New.md"))
+    index = notemd_core.get_wikilink_index()
+    assert index.files_linking_to("Old") == []
+    assert index.files_linking_to("New") == [str(vault / "folder" / "nested.md"), str(vault / "linking.md")]
+    assert index.refresh()["reindexed"] == 0
+
+def test_concurrent_rename_and_delete_lose_no_edits(settings, vault, monkeypatch):
+    write_notes(vault, {f"note{i}.md": f"Links: [[Alpha]] and [[Beta]] in note {i}.\n" for i in range(20)})
+    # Widen the window between reading and writing a note, where unserialized rewrites overwrite each other.
+    for name in ("rewrite_renamed_links", "remove_deleted_links"):
+        rewrite = getattr(notemd_core, name)
+        monkeypatch.setattr(notemd_core, name, lambda *args, rewrite=rewrite: time.sleep(0.002) or rewrite(*args))
+
+    async def run():
+        await asyncio.gather(*[operation for _ in range(2) for operation in (
+            notemd_core.handle_file_rename("Alpha.md", "Gamma.md"),
+            notemd_core.handle_file_delete("Beta.md"),
+        )])
+
+    asyncio.run(run())
+    for content in read_notes(vault).values():
+        assert "[[Gamma]]" in content and "[[Alpha]]" not in content and "[[Beta]]" not in content
+
+def test_rewrite_renamed_links_applies_all_renames_at_once():
+    content = "[[A]] [[B#Intro]] [[ A |alias]] [[C]] ![[A]]"
+    assert notemd_core.rewrite_renamed_links(content, {"A": "B", "B": "C"}) == "[[B]] [[C#Intro]] [[B|alias]] [[C]] ![[B]]"
+
+def test_batch_rename_writes_each_note_once(settings, vault):
+    write_notes(vault, {
+        "A.md": "# A\n",
+        "hub.md": "[[A]], [[B|bee]] and [[C#Top]].\n",
+        "other.md": "Only [[B]].\n",
+        "unrelated.md": "Nothing here.\n",
+    })
+    written = notemd_core.METRICS_REGISTRY.get_sample_value("notemd_vault_files_written_total", {"operation": "rename"}) or 0.0
+    result = asyncio.run(notemd_core.handle_file_renames([("A.md", "folder/B.md"), ("B.md", "C.md"), ("C.md", "D.md"), ("E.md", "E.md")]))
+    assert result == {"renamed_count": 3, "updated_count": 2, "errors": []}
+    notes = read_notes(vault)
+    assert notes["hub.md"] == "[[B]], [[C|bee]] and [[D#Top]].\n"
+    assert notes["other.md"] == "Only [[C]].\n"
+    assert notemd_core.METRICS_REGISTRY.get_sample_value("notemd_vault_files_written_total", {"operation": "rename"}) == written + 2
+
+def test_conflicting_renames_are_rejected(settings, vault):
+    write_notes(vault, NOTES)
+    with pytest.raises(ValueError):
+        asyncio.run(notemd_core.handle_file_renames([("Old.md", "New.md"), ("folder/Old.md", "Newer.md")]))
+    assert read_notes(vault) == {os.path.normpath(path): content for path, content in NOTES.items()}
+
+def test_batch_rename_endpoint(settings, vault):
+    write_notes(vault, NOTES)
+
+    async def post(body):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://testserver") as client:
+            return await client.post("/handle_file_renames", json=body)
+
+    renamed = asyncio.run(post({"renames": [{"old_path": "Old.md", "new_path": "New.md"}, {"old_path": "Other.md", "new_path": "Else.md"}]}))
+    conflicting = asyncio.run(post({"renames": [{"old_path": "X.md", "new_path": "Y.md"}, {"old_path": "X.md", "new_path": "Z.md"}]}))
+    assert renamed.json() == {"status": "success", "renamed_count": 2, "updated_count": 3, "errors": []}
+    assert read_notes(vault)["unrelated.md"] == "Only [[Else]] here, and the word Old.\n"
+    assert conflicting.status_code == 400